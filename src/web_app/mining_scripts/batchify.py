@@ -1,6 +1,8 @@
 import math
 from github import Github # Import PyGithub for mining data
 from mining_scripts.config import *
+from mining_scripts.connections import github_client
+from mining_scripts.github_cache import get_github_repo
 
 
 # Global constants
@@ -9,7 +11,7 @@ BATCH_SIZE = 1000 # What size chunks we want
 NUM_OF_PREDEFINED_BATCH_SIZE = 0 # tuple index
 LAST_BATCH_SIZE = 1 # tuple index
 
-g = Github(GITHUB_TOKEN, per_page=100) # authorization for the github API 
+g = github_client() # authorization for the github API
 
 
 ''' 
@@ -50,7 +52,7 @@ and returning a list of generator objects of that given size to be
 sent off as celery tasks for mining.
 '''
 def batchify(repo_name):
-    pulls = g.get_repo(repo_name).get_pulls('all')
+    pulls = get_github_repo(repo_name).get_pulls('all')
     batched_data =  [iter(pulls[i:i+BATCH_SIZE]) for i in range(0, pulls.totalCount, BATCH_SIZE)]
     batch_length_tuple = get_batch_sizes_tuple(pulls)
 
@@ -71,18 +73,11 @@ for purposes of serialization being complex, this function will take in the
 name of a repo and an index number, and will return the batch of pull requests
 '''
 def get_batch_number(repo_name, batch_num):
-    try:
-        whole_batch = batchify(repo_name)
-        batch = whole_batch[batch_num]
-        return batch
-
-        # if batch_num == len(whole_batch) - 1:
-        #     return {"data":batch, "is_last_batch":True}
-
-        # else:
-        #     return {"data":batch, "is_last_batch":False}
-    except Exception:
-        pass 
+    # Errors are left to the caller: a rate limit reschedules the batch, anything
+    # else is recorded as a failed batch (see tasks.mine_pull_request_batch_asynchronously)
+    whole_batch = batchify(repo_name)
+    batch = whole_batch[batch_num]
+    return batch
 
 '''
 get_batch_sizes_tuple
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# connections.py
+# Purpose: Create the GitHub and MongoDB clients used by the mining scripts and
+#          the app. Every GitHub client talks to GITHUB_BASE_URL, which can point
+#          at a local stand-in of the GitHub API instead of api.github.com. Mongo
+#          clients connect on first use (so they survive a fork) and size their
+#          connection pool for a gevent mining worker, where hundreds of green
+#          threads may each be storing a pull at the same time
+
+from pymongo import MongoClient # Import pymongo for interacting with MongoDB
+from github import Github # Import PyGithub for mining data
+from mining_scripts.config import *
+import os
+
+
+GITHUB_BASE_URL = os.environ.get("GITHUB_BASE_URL", "https://api.github.com")
+GITHUB_TIMEOUT = 15 # seconds
+GITHUB_PER_PAGE = 100 # items of a list fetched with one request
+
+MONGO_HOST = os.environ.get("MONGO_HOST", "localhost")
+MONGO_PORT = int(os.environ.get("MONGO_PORT", 27017))
+
+# Connections each client may open. pymongo's default of 100 would leave most of
+# the greenlets of a gevent worker (celery -P gevent -c 200) queueing for a socket
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 250))
+
+
+def github_client():
+    return Github(GITHUB_TOKEN, base_url=GITHUB_BASE_URL, timeout=GITHUB_TIMEOUT, per_page=GITHUB_PER_PAGE)
+
+
+def mongo_client():
+    return MongoClient(MONGO_HOST, MONGO_PORT, maxPoolSize=MONGO_MAX_POOL_SIZE, connect=False)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# facet_index.py
+# Purpose: An in-memory index over the repo cards for the listing filters.
+#          Every mined repo gets an ordinal (its position in name order) and
+#          every facet value (a language, a license, has_wiki, a pull count
+#          bucket, an activity bucket) gets a bitmap of the ordinals of the
+#          repos having it, held in a plain python int. Combining filters is
+#          then a handful of bitwise AND/OR operations, and the count of any
+#          facet value is the popcount of its bitmap. Pull counts are also
+#          kept bit-sliced, so an arbitrary "more/less than N pulls" bound is
+#          answered with one AND per bit of N rather than a scan
+
+import datetime
+
+
+GITHUB_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# Facets with one bitmap per value
+FACETS = ("language", "license", "has_wiki", "pulls", "activity")
+
+# Pull count buckets: (label, lowest pull count of the bucket), in ascending order
+PULL_BUCKETS = (("0", 0), ("1-9", 1), ("10-99", 10), ("100-999", 100), ("1000+", 1000))
+
+# Activity buckets by days since the last push: (label, at most this many days)
+ACTIVITY_BUCKETS = (("month", 31), ("year", 365), ("older", None))
+
+# The card fields the index is built from
+FACET_INDEX_CARD_FIELDS = {"_id":1, "language":1, "license":1, "has_wiki":1, "num_pulls":1, "pushed_at":1,
+                           "stargazers_count":1, "completed_timestamp":1}
+
+
+def popcount(bitmap):
+    return bin(bitmap).count("1")
+
+
+# Build a bitmap from ordinals by setting bytes, rather than OR-ing one bit at a time
+# into an ever growing int (which would cost O(n) per bit)
+def bitmap_of(ordinals, size):
+    bits = bytearray((size + 7) // 8)
+    for ordinal in ordinals:
+        bits[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(bits, "little")
+
+
+def pulls_bucket(num_pulls):
+    label = PULL_BUCKETS[0][0]
+    for bucket, lowest in PULL_BUCKETS:
+        if num_pulls >= lowest:
+            label = bucket
+    return label
+
+
+def activity_bucket(pushed_at, now):
+    try:
+        days = (now - datetime.datetime.strptime(str(pushed_at), GITHUB_DATE_FORMAT)).days
+    except ValueError:
+        return None
+    for bucket, most_days in ACTIVITY_BUCKETS:
+        if most_days is None or days <= most_days:
+            return bucket
+
+
+# The value of every facet for one card (None where the card has no value)
+def card_facet_values(card, now):
+    return {
+        "language": card.get("language"),
+        "license": card.get("license"),
+        "has_wiki": "True" if card.get("has_wiki") else "False",
+        "pulls": pulls_bucket(card.get("num_pulls") or 0),
+        "activity": activity_bucket(card.get("pushed_at"), now),
+    }
+
+
+'''
+FacetIndex
+
+A read-only snapshot of the facet bitmaps of every repo card, tagged with the
+catalog version it was built under. Never modified once built: a newer catalog
+gets a new FacetIndex, so a snapshot can be shared freely between threads
+(and, built before forking, between worker processes).
+
+Filtering produces a bitmap, which page() turns into one listing page in any
+of the sort orders of the repo cards.
+'''
+class FacetIndex(object):
+    def __init__(self, cards, version=None, now=None):
+        now = now or datetime.datetime.utcnow()
+        cards = sorted(cards, key=lambda card: card["_id"])
+        self.version = version
+        self.built_at = now
+        self.names = [card["_id"] for card in cards]
+        self.ordinals = {name: ordinal for ordinal, name in enumerate(self.names)}
+        self.all = (1 << len(cards)) - 1
+
+        members = {facet: {} for facet in FACETS}
+        for ordinal, card in enumerate(cards):
+            for facet, value in card_facet_values(card, now).items():
+                if value is not None:
+                    members[facet].setdefault(value, []).append(ordinal)
+        self.bitmaps = {
+            facet: {value: bitmap_of(ordinals, len(cards)) for value, ordinals in values.items()}
+            for facet, values in members.items()
+        }
+
+        # pull_slices[i] holds the repos whose pull count has bit i set
+        pulls = [max(card.get("num_pulls") or 0, 0) for card in cards]
+        self.pull_slices = [
+            bitmap_of((ordinal for ordinal, num_pulls in enumerate(pulls) if num_pulls >> bit & 1), len(cards))
+            for bit in range(max(pulls, default=0).bit_length())
+        ]
+
+        # Ordinals in the order of each listing sort (see repo_cards.SORT_OPTIONS)
+        self.orders = {
+            "name": list(range(len(cards))),
+            "stars": sorted(range(len(cards)), key=lambda ordinal: -(cards[ordinal].get("stargazers_count") or 0)),
+            "pulls": sorted(range(len(cards)), key=lambda ordinal: -pulls[ordinal]),
+            "last_mined": sorted(range(len(cards)), key=lambda ordinal: str(cards[ordinal].get("completed_timestamp") or ""),
+                                 reverse=True),
+        }
+        # sorted() is stable and reverse=True keeps ties in their original order too,
+        # so ties are broken by name the same way the card indexes break them.
+        # positions[sort][ordinal] is where a repo appears in that order
+        self.positions = {}
+        for sort, order in self.orders.items():
+            self.positions[sort] = [0] * len(order)
+            for position, ordinal in enumerate(order):
+                self.positions[sort][ordinal] = position
+
+    def __len__(self):
+        return len(self.names)
+
+    # Bitmap of the repos having any of the given values of a facet
+    def any_of(self, facet, values):
+        bitmap = 0
+        for value in values:
+            bitmap |= self.bitmaps[facet].get(value, 0)
+        return bitmap
+
+    # Bitmap of the given repo names (names the index does not know are ignored)
+    def of_names(self, names):
+        ordinals = (self.ordinals.get(name.lower()) for name in names)
+        return bitmap_of((ordinal for ordinal in ordinals if ordinal is not None), len(self))
+
+    # Bitmaps of the repos with more than, and exactly, threshold pulls. Walks the
+    # bit slices from the highest bit down, keeping the repos equal so far
+    def compare_pulls(self, threshold):
+        greater, equal = 0, self.all
+        if threshold < 0:
+            return self.all, 0
+        if threshold.bit_length() > len(self.pull_slices):
+            return 0, 0
+        for bit in reversed(range(len(self.pull_slices))):
+            if threshold >> bit & 1:
+                equal &= self.pull_slices[bit]
+            else:
+                greater |= equal & self.pull_slices[bit]
+                equal &= ~self.pull_slices[bit]
+        return greater, equal
+
+    def pulls_greater_than(self, lower_bound):
+        return self.compare_pulls(lower_bound)[0]
+
+    def pulls_less_than(self, upper_bound):
+        greater, equal = self.compare_pulls(upper_bound)
+        return self.all & ~(greater | equal)
+
+    # Bitmap of the repos passing every given filter. Filters left as None are not applied
+    def filter(self, languages=None, licenses=None, activity=None, min_pulls=None, max_pulls=None,
+               has_wiki=None, names=None):
+        bitmap = self.all
+        if languages is not None:
+            bitmap &= self.any_of("language", languages)
+        if licenses is not None:
+            bitmap &= self.any_of("license", licenses)
+        if activity is not None:
+            bitmap &= self.any_of("activity", activity)
+        if has_wiki:
+            bitmap &= self.bitmaps["has_wiki"].get("True", 0)
+        if min_pulls is not None:
+            bitmap &= self.pulls_greater_than(min_pulls)
+        if max_pulls is not None:
+            bitmap &= self.pulls_less_than(max_pulls)
+        if names is not None:
+            bitmap &= self.of_names(names)
+        return bitmap
+
+    # Return [(value, count), ...] sorted by value for a facet, counting only the repos
+    # in bitmap (every repo by default) and leaving out values no such repo has
+    def counts(self, facet, bitmap=None):
+        bitmap = self.all if bitmap is None else bitmap
+        counts = ((value, popcount(value_bitmap & bitmap)) for value, value_bitmap in self.bitmaps[facet].items())
+        return sorted((value, count) for value, count in counts if count > 0)
+
+    def count(self, bitmap):
+        return popcount(bitmap)
+
+    # Return (names, has_more): the names of up to page_size repos of bitmap in the given
+    # sort order, starting after the repo named after (or at the top when after is None)
+    def page(self, bitmap, sort, after=None, page_size=50):
+        if sort not in self.orders:
+            sort = "name"
+        order = self.orders[sort]
+        start = 0
+        if after is not None and after in self.ordinals:
+            start = self.positions[sort][self.ordinals[after]] + 1
+
+        # Test bits in the bytes of the bitmap, each test is then O(1)
+        bits = bitmap.to_bytes((len(self) + 7) // 8, "little")
+        names = []
+        for position in range(start, len(order)):
+            ordinal = order[position]
+            if bits[ordinal >> 3] >> (ordinal & 7) & 1:
+                if len(names) == page_size:
+                    return names, True
+                names.append(self.names[ordinal])
+        return names, False
@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# github_cache.py
+# Purpose: Remember GitHub's answer to "what is repo X" (its api json, or that
+#          it does not exist) in the githubRepoCache collection, so every web
+#          and worker process shares one lookup per repo instead of calling
+#          g.get_repo on every path. Entries are keyed by lowercase repo name
+#          and removed by a TTL index once they expire. While one process asks
+#          GitHub about a repo, the others wait for its answer rather than
+#          asking too. An entry can also hold the repo's number of pulls, which
+#          validating a mining request needs. Repos built here all share this module's client, so it
+#          also holds the rate limit GitHub last reported, which the threads
+#          of a process share through rate_budget (see check_rate_limit)
+
+from pymongo import MongoClient # Import pymongo for interacting with MongoDB
+from pymongo.errors import DuplicateKeyError
+from github import Github, UnknownObjectException, RateLimitExceededException # Import PyGithub for mining data
+from github.Repository import Repository
+from mining_scripts.config import *
+from mining_scripts.connections import github_client, mongo_client
+from datetime import datetime, timedelta
+import os
+import threading
+import time
+
+
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
+
+db = client.backend_db # The specific mongo database we are working with
+github_repo_cache = db.githubRepoCache # collection caching GitHub's repo api json by lowercase repo name
+
+
+# Function to be used in tests.py to ensure that we are not accessing the production database
+def mongo_github_cache_test_init():
+    global db
+    global github_repo_cache
+    db = client.test_db
+    github_repo_cache = db.githubRepoCache
+
+
+g = github_client() # authorization for the github API
+
+# How long GitHub's answer is reused. Repos that do not exist are asked about
+# again sooner, since they may just have been created or made public
+REPO_CACHE_SECONDS = 60 * 60
+MISSING_REPO_CACHE_SECONDS = 60 * 5
+
+# How long a process may hold the lookup lock of a repo, and how long the others
+# wait for its answer before asking GitHub themselves
+LOCK_SECONDS = 30
+LOCK_WAIT_SECONDS = 10
+LOCK_POLL_SECONDS = 0.1
+
+_github_cache_indexes_created = False
+
+
+'''
+RateLimitExhausted
+
+Raised when our GitHub token has no requests left. Tasks catch it (and PyGithub's
+own RateLimitExceededException) and re-enqueue themselves for the moment the
+limit resets, instead of sleeping in a worker slot until then.
+'''
+class RateLimitExhausted(Exception):
+    def __init__(self, reset_at):
+        super(RateLimitExhausted, self).__init__(f"GitHub rate limit exhausted until {reset_at}")
+        self.reset_at = reset_at # unix time
+
+
+'''
+RateBudget
+
+The requests our token has left, shared by every thread (or, on a gevent worker,
+every greenlet) of a process. Each request is claimed from the budget before it
+is made, so hundreds of greenlets running at once cannot all pass the check on
+the same stale header and overdraw the limit together. GitHub's own count,
+read from the headers of whichever response arrived last, only ever lowers the
+budget within a rate limit window: responses of concurrent requests arrive out
+of order, and an older one must not hand back requests already claimed.
+'''
+class RateBudget(object):
+    def __init__(self, reserve=0):
+        self.reserve = reserve # requests left unclaimed, e.g. for the web app's lookups
+        self.remaining = None
+        self.reset_at = None # unix time
+        self.lock = threading.Lock() # a green lock once gevent has patched threading
+
+    def update(self, remaining, reset_at):
+        with self.lock:
+            if self.reset_at is None or reset_at > self.reset_at:
+                self.remaining, self.reset_at = remaining, reset_at
+            elif reset_at == self.reset_at:
+                self.remaining = min(self.remaining, remaining)
+
+    # Claim requests, or raise RateLimitExhausted if the budget cannot cover them. Once
+    # the window has reset the budget is unknown until the next response reports it
+    def take(self, requests=1):
+        with self.lock:
+            if self.reset_at is not None and self.reset_at <= time.time():
+                self.remaining = None
+            if self.remaining is None:
+                return
+            if self.remaining - requests < self.reserve:
+                raise RateLimitExhausted(self.reset_at)
+            self.remaining -= requests
+
+
+rate_budget = RateBudget()
+
+
+# Claim the requests we are about to make from the budget (see
+# mining.pull_requests_needed for what a pull costs). The rate limit is read from the headers
+# of the last response, so checking it costs no request
+def check_rate_limit(requests=1):
+    remaining, limit = g.rate_limiting
+    rate_budget.update(remaining, g.rate_limiting_resettime)
+    rate_budget.take(requests)
+
+
+# How long a task should wait before asking GitHub again, given the exception that stopped it
+def seconds_until_rate_limit_reset(exception=None):
+    reset_at = getattr(exception, "reset_at", None) or g.rate_limiting_resettime
+    return max(int(reset_at - time.time()), 0) + 1
+
+
+# Exceptions meaning "try again once the rate limit resets"
+RATE_LIMIT_EXCEPTIONS = (RateLimitExhausted, RateLimitExceededException)
+
+
+def ensure_github_cache_indexes():
+    global _github_cache_indexes_created
+    if not _github_cache_indexes_created:
+        github_repo_cache.create_index("expires_at", expireAfterSeconds=0)
+        _github_cache_indexes_created = True
+
+
+def lock_id(key):
+    return "lock:" + key
+
+
+# The TTL monitor only runs once a minute, so expired entries are also skipped on read
+def read_entry(key):
+    return github_repo_cache.find_one({"_id": key, "expires_at": {"$gt": datetime.utcnow()}})
+
+
+# raw_data is the repo's api json, or None if GitHub does not know the repo. num_pulls
+# is None unless the pulls were counted. Returns the stored entry
+def store_entry(key, raw_data, num_pulls=None):
+    seconds = REPO_CACHE_SECONDS if raw_data is not None else MISSING_REPO_CACHE_SECONDS
+    entry = {"_id": key, "raw_data": raw_data, "num_pulls": num_pulls,
+             "expires_at": datetime.utcnow() + timedelta(seconds=seconds)}
+    github_repo_cache.replace_one({"_id": key}, entry, upsert=True)
+    return entry
+
+
+# Whether entry answers the lookup: any entry does, unless the pulls of a repo that
+# exists are wanted and were not counted when it was stored
+def entry_answers(entry, count_pulls=False):
+    if entry is None:
+        return False
+    return not count_pulls or entry["raw_data"] is None or entry.get("num_pulls") is not None
+
+
+# Turn a cache entry back into what g.get_repo would have given (or raised)
+def entry_to_repo(entry):
+    if entry["raw_data"] is None:
+        raise UnknownObjectException(404, {"message": "Not Found"})
+    return g.create_from_raw_data(Repository, entry["raw_data"])
+
+
+# Returns True if we now hold the lookup lock of key. A lock whose holder died is
+# taken over once it is older than LOCK_SECONDS
+def acquire_lock(key):
+    now = datetime.utcnow()
+    try:
+        github_repo_cache.insert_one({"_id": lock_id(key), "expires_at": now + timedelta(seconds=LOCK_SECONDS)})
+        return True
+    except DuplicateKeyError:
+        taken_over = github_repo_cache.find_one_and_update(
+            {"_id": lock_id(key), "expires_at": {"$lt": now}},
+            {"$set": {"expires_at": now + timedelta(seconds=LOCK_SECONDS)}}
+        )
+        return taken_over is not None
+
+
+def release_lock(key):
+    github_repo_cache.delete_one({"_id": lock_id(key)})
+
+
+# Wait for the process holding the lock of key to store its answer. Returns the
+# entry, or None if the lock went away or we waited too long
+def wait_for_entry(key, count_pulls=False):
+    deadline = time.time() + LOCK_WAIT_SECONDS
+    while time.time() < deadline:
+        entry = read_entry(key)
+        if entry_answers(entry, count_pulls):
+            return entry
+        if github_repo_cache.find_one({"_id": lock_id(key)}, {"_id":1}) is None:
+            entry = read_entry(key)
+            return entry if entry_answers(entry, count_pulls) else None
+        time.sleep(LOCK_POLL_SECONDS)
+    return None
+
+
+# Ask GitHub and remember the answer, returning the stored entry. A renamed repo
+# still answers to its old name, so it is remembered under its current name as well.
+# count_pulls=True also lists the repo's pulls one per page, whose Link header gives
+# their number
+def fetch_entry(repo_name, count_pulls=False):
+    key = repo_name.lower()
+    try:
+        pygit_repo = g.get_repo(repo_name)
+    except UnknownObjectException:
+        return store_entry(key, None)
+
+    num_pulls = pygit_repo.get_pulls('all').totalCount if count_pulls else None
+    entry = store_entry(key, pygit_repo.raw_data, num_pulls)
+    if pygit_repo.full_name.lower() != key:
+        store_entry(pygit_repo.full_name.lower(), pygit_repo.raw_data, num_pulls)
+    return entry
+
+
+# Return the cache entry of a repo, asking GitHub only if no process has (or is
+# about to). fresh=True always asks GitHub and refreshes the cached answer
+def get_github_entry(repo_name, fresh=False, count_pulls=False):
+    ensure_github_cache_indexes()
+    key = repo_name.lower()
+    if fresh:
+        return fetch_entry(repo_name, count_pulls)
+
+    entry = read_entry(key)
+    if entry_answers(entry, count_pulls):
+        return entry
+
+    if not acquire_lock(key):
+        entry = wait_for_entry(key, count_pulls)
+        if entry is not None:
+            return entry
+        return fetch_entry(repo_name, count_pulls)
+
+    try:
+        return fetch_entry(repo_name, count_pulls)
+    finally:
+        release_lock(key)
+
+
+# Drop-in replacement for g.get_repo(repo_name): returns the PyGithub Repository, or
+# raises UnknownObjectException if the repo does not exist. fresh=True always asks
+# GitHub (e.g. before storing the landing page) and refreshes the cached answer
+def get_github_repo(repo_name, fresh=False):
+    return entry_to_repo(get_github_entry(repo_name, fresh))
+
+
+# Return the number of pulls of a repo on GitHub, or None if the repo does not exist.
+# The count is kept in the repo's entry, so forgetting the repo forgets it too
+def get_github_pull_count(repo_name):
+    entry = get_github_entry(repo_name, count_pulls=True)
+    return entry["num_pulls"] if entry["raw_data"] is not None else None
+
+
+# Forget what we know about a repo, under its requested and its current name.
+# Called when a repo is deleted, or found to have been renamed
+def forget_github_repo(repo_name, full_name=None):
+    keys = set([repo_name.lower()] + ([full_name.lower()] if full_name else []))
+    github_repo_cache.delete_many({"_id": {"$in": list(keys)}})
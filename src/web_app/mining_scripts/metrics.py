@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# metrics.py
+# Purpose: Keep a small per-repo state document (pull counts, monthly
+#          created/closed/merged counters and per-month contributors) in the
+#          repoMetrics collection, so that new or changed pull requests can be
+#          folded into a repo's stats without re-reading its whole history
+
+from pymongo import MongoClient # Import pymongo for interacting with MongoDB
+from mining_scripts.connections import mongo_client
+import datetime
+import os
+import re
+
+
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
+
+db = client.backend_db # The specific mongo database we are working with
+repo_metrics = db.repoMetrics # collection holding one metrics state document per repo
+
+
+# Function to be used in tests.py to ensure that we are not accessing the production database
+def mongo_metrics_test_init():
+    global db
+    global repo_metrics
+    db = client.test_db
+    repo_metrics = db.repoMetrics
+
+
+GITHUB_DATE_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# The only fields of a pull request json the metrics ever look at. Use this as
+# the projection when reading pulls back out of mongo
+METRIC_PULL_FIELDS = {"_id":0, "url":1, "state":1, "created_at":1, "closed_at":1,
+                      "merged_at":1, "updated_at":1, "user.login":1, "labels.name":1}
+
+COUNT_KEYS = ("num_pulls", "num_closed_merged_pulls", "num_closed_unmerged_pulls",
+              "num_open_pulls", "num_newcomer_labels")
+
+NEWCOMER_LABEL = re.compile("first")
+
+
+# GitHub timestamps look like 2019-03-25T17:02:11Z, so the month is the first 7 characters
+def month_of(github_timestamp):
+    return str(github_timestamp)[:7]
+
+
+def parse_github_timestamp(github_timestamp):
+    return datetime.datetime.strptime(str(github_timestamp), GITHUB_DATE_FORMAT)
+
+
+# The inverse of parse_github_timestamp, for the datetime attributes of PyGithub objects
+def format_github_timestamp(timestamp):
+    return timestamp.strftime(GITHUB_DATE_FORMAT)
+
+
+# Return every month (as YYYY-MM) from first_month to last_month inclusive
+def month_range(first_month, last_month):
+    year, month = int(first_month[:4]), int(first_month[5:7])
+    last_year, last_month_num = int(last_month[:4]), int(last_month[5:7])
+    months = []
+    while (year, month) <= (last_year, last_month_num):
+        months.append(f"{year:04d}-{month:02d}")
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+    return months
+
+
+'''
+PullRequestMetrics
+
+The counts and monthly series of a single repo. Pull requests are folded in
+with add() and taken back out with remove(), so a pull that changed on GitHub
+is applied as remove(previous json) followed by add(new json). Every series
+is kept per month, so the state stays small no matter how many pulls a repo has.
+
+applied_pulls maps the url of each pull folded in by an update to the updated_at
+it was folded in at, until that update has stored the pulls themselves. It is
+saved with the counts, so an update retried after a crash in between knows which
+changes its metrics already hold.
+'''
+class PullRequestMetrics(object):
+    def __init__(self, state=None):
+        state = state or {}
+        self.counts = {key: state.get("counts", {}).get(key, 0) for key in COUNT_KEYS}
+
+        # month -> {"created": n, "closed": n, "merged": n, "contributors": {login: n}}
+        self.months = state.get("months", {})
+        self.last_updated_at = state.get("last_updated_at")
+        self.applied_pulls = {pull["url"]: pull["updated_at"] for pull in state.get("applied_pulls", [])}
+
+    def add(self, pull):
+        self._fold(pull, 1)
+        if self.last_updated_at is None or str(pull["updated_at"]) > self.last_updated_at:
+            self.last_updated_at = str(pull["updated_at"])
+
+    def remove(self, pull):
+        self._fold(pull, -1)
+
+    def was_applied(self, url, updated_at):
+        return self.applied_pulls.get(url) == updated_at
+
+    # The oldest updated_at an update must walk back to: the last one folded in, or
+    # an earlier one whose pull was folded in but not stored yet
+    def updated_since(self):
+        return min([self.last_updated_at] + list(self.applied_pulls.values())) if self.last_updated_at else None
+
+    def _fold(self, pull, sign):
+        self.counts["num_pulls"] += sign
+
+        merged = pull.get("merged_at") is not None
+        if pull["state"] == "closed" and merged:
+            self.counts["num_closed_merged_pulls"] += sign
+        elif pull["state"] == "closed":
+            self.counts["num_closed_unmerged_pulls"] += sign
+        elif pull["state"] == "open" and not merged:
+            self.counts["num_open_pulls"] += sign
+
+        if any(NEWCOMER_LABEL.search(label["name"]) for label in pull.get("labels") or []):
+            self.counts["num_newcomer_labels"] += sign
+
+        touched_months = [month_of(pull["created_at"])]
+        created_month = self._month(touched_months[0])
+        created_month["created"] += sign
+        login = pull["user"]["login"]
+        contributors = created_month["contributors"]
+        contributors[login] = contributors.get(login, 0) + sign
+        if contributors[login] == 0:
+            del contributors[login]
+
+        if pull.get("closed_at") is not None:
+            touched_months.append(month_of(pull["closed_at"]))
+            self._month(touched_months[-1])["closed"] += sign
+
+        if merged:
+            touched_months.append(month_of(pull["merged_at"]))
+            self._month(touched_months[-1])["merged"] += sign
+
+        # Drop any month that no longer holds anything so removals leave no trace
+        for month in set(touched_months):
+            if self._is_empty(self.months[month]):
+                del self.months[month]
+
+    def _month(self, month):
+        if month not in self.months:
+            self.months[month] = {"created": 0, "closed": 0, "merged": 0, "contributors": {}}
+        return self.months[month]
+
+    @staticmethod
+    def _is_empty(data):
+        return data["created"] == 0 and data["closed"] == 0 and data["merged"] == 0 and not data["contributors"]
+
+    # Return (months, values) for one of "created", "closed", "merged" or "contributors",
+    # covering every month from the first to the last one with any activity (zero filled)
+    def monthly_series(self, key):
+        def value(data):
+            return len(data["contributors"]) if key == "contributors" else data[key]
+
+        active_months = sorted(month for month, data in self.months.items() if value(data) > 0)
+        if not active_months:
+            return [], []
+
+        months = month_range(active_months[0], active_months[-1])
+        return months, [value(self.months[month]) if month in self.months else 0 for month in months]
+
+    def pull_series(self):
+        return {key: self.monthly_series(key) for key in ("created", "closed", "merged")}
+
+    def contributors_series(self):
+        return self.monthly_series("contributors")
+
+    def to_document(self, repo_name):
+        return {
+            "_id": repo_name.lower(),
+            "counts": self.counts,
+            "months": self.months,
+            "last_updated_at": self.last_updated_at,
+            # a list, since urls are not valid field names
+            "applied_pulls": [{"url": url, "updated_at": updated_at} for url, updated_at in self.applied_pulls.items()],
+        }
+
+
+# Build a repo's metrics from scratch by folding in every pull of a cursor
+def compute_metrics_from_pulls(pulls):
+    metrics = PullRequestMetrics()
+    for pull in pulls:
+        metrics.add(pull)
+    return metrics
+
+
+# Return the stored PullRequestMetrics of a repo, or None if it has never been computed
+def load_repo_metrics(repo_name):
+    state = repo_metrics.find_one({"_id": repo_name.lower()})
+    if state is None:
+        return None
+    return PullRequestMetrics(state)
+
+
+def save_repo_metrics(repo_name, metrics):
+    repo_metrics.replace_one({"_id": repo_name.lower()}, metrics.to_document(repo_name), upsert=True)
+    return
+
+
+# Called once the pulls of applied_pulls are stored, so they are no longer told apart
+def clear_applied_pulls(repo_name):
+    repo_metrics.update_one({"_id": repo_name.lower()}, {"$set": {"applied_pulls": []}})
+    return
+
+
+def delete_repo_metrics(repo_name):
+    repo_metrics.delete_one({"_id": repo_name.lower()})
+    return
@@ -6,16 +6,23 @@
 # Purpose: This script will provide the necessary functionality to store json data
 #          from GitHub's API into the MongoDB database of our choosing 
 
-from pymongo import MongoClient # Import pymongo for interacting with MongoDB
+from pymongo import MongoClient, ReturnDocument # Import pymongo for interacting with MongoDB
 from github import Github # Import PyGithub for mining data
 from mining_scripts.send_email import * 
 from mining_scripts.config import *
+from mining_scripts.connections import github_client, mongo_client, GITHUB_PER_PAGE
 from mining_scripts.visualizationModelExtraction import *
+from mining_scripts.metrics import delete_repo_metrics
+from mining_scripts.repo_cards import delete_repo_card
+from mining_scripts.github_cache import get_github_repo, forget_github_repo, check_rate_limit, RATE_LIMIT_EXCEPTIONS, rate_budget
+from mining_scripts.progress import RATE_SAMPLES
 from django.core.exceptions import AppRegistryNotReady
+from django.conf import settings
 from celery.utils.log import get_task_logger # For the server's logger
 from celery import group
 from retrying import retry
 import os
+import re
 import time
 from datetime import datetime
 from mining_scripts.batchify import BatchedGeneratorTask
@@ -35,13 +42,7 @@ except AppRegistryNotReady:
 # Only import the models after we know django has been setup 
 from user_app.models import QueuedMiningRequest, MinedRepo
 
-# precent issues with forking 
-if os.getpid() == 0:
-    # Initial connection by parent process
-    client = MongoClient('localhost', 27017) # Where are we connecting
-else: 
-    # No need to reconnect if we are connected
-    client = MongoClient('localhost', 27017, connect=False)
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
 
 db = client.backend_db # The specific mongo database we are working with 
 
@@ -51,19 +52,45 @@ pull_requests = db.pullRequests # collection for storing all pull requests for a
 
 pull_batches = db.pullBatches
 
+repo_names = db.repoNames # lowercase repo name -> the canonical full_name GitHub uses
+
+failed_batches = db.failedBatches # batches waiting to be retried, see record_failed_batch
+
+dead_batches = db.deadBatches # batches that failed too often, until the admin requeues them
+
+# Create the indexes our lookups rely on. create_index is a no-op when the
+# index already exists, but only bother mongo once per process
+_mongo_indexes_created = False
+
+def ensure_mongo_indexes():
+    global _mongo_indexes_created
+    if not _mongo_indexes_created:
+        pull_requests.create_index("url")
+        repos.create_index("full_name")
+        pull_batches.create_index("repo")
+        failed_batches.create_index("next_attempt_at")
+        _mongo_indexes_created = True
+
+
 def mongo_mining_test_init():
     global db 
     global repos 
     global pull_requests
     global pull_batches 
+    global repo_names
+    global failed_batches
+    global dead_batches
     db = client.test_db
     repos = db.repos
     pull_requests = db.pullRequests
     pull_batches = db.pullBatches
+    repo_names = db.repoNames
+    failed_batches = db.failedBatches
+    dead_batches = db.deadBatches
 
 
 
-g = Github(GITHUB_TOKEN, per_page=100) # authorization for the github API 
+g = github_client() # authorization for the github API
 
 
 # Wrapper function that will perform all mining steps necessary when
@@ -73,7 +100,7 @@ def mine_and_store_all_repo_data(repo_name, username, email, queued_request):
     # Use pygit to eliminate any problems with users not spelling the repo name
     # exactly as it is on the actual repo 
     logger.info('Retrieving the pygit_repo from github for {0}'.format(repo_name))
-    pygit_repo = g.get_repo(repo_name)
+    pygit_repo = get_github_repo(repo_name, fresh=True)
     logger.info('Successfully retrieved pygit_repo from github for {0}'.format(repo_name))
 
     # mine and store the main page josn
@@ -103,8 +130,9 @@ def mine_and_store_all_repo_data(repo_name, username, email, queued_request):
         closed_at_list=visualization_data["closed_at_list"],
         merged_at_list=visualization_data["merged_at_list"],
         num_newcomer_labels=visualization_data["num_newcomer_labels"],
-        bar_chart_html=visualization_data["bar_chart"],
-        pull_line_chart_html=visualization_data["line_chart"],
+        bar_chart_json=visualization_data["bar_chart_json"],
+        pull_line_chart_json=visualization_data["line_chart_json"],
+        contribution_line_chart_json=visualization_data["contribution_line_chart_json"],
         accepted_timestamp=getattr(QueuedMiningRequest.objects.get(pk=queued_request), "timestamp"),
         requested_timestamp=getattr(QueuedMiningRequest.objects.get(pk=queued_request), "requested_timestamp")
     ) 
@@ -126,20 +154,62 @@ def mine_and_store_all_repo_data(repo_name, username, email, queued_request):
 # Method to download a repo's main json and place it in the 
 # db.repos collection for future parsing 
 def mine_repo_page(pygit_repo):
+    ensure_mongo_indexes()
     repos.update_one(pygit_repo.raw_data, {"$set": pygit_repo.raw_data}, upsert=True)
+    index_repo_name(pygit_repo.full_name)
     return 
 
 
+# Record the canonical spelling of a repo's name under its lowercase name, so
+# that we can resolve any capitalization of it without asking GitHub
+def index_repo_name(full_name):
+    repo_names.update_one({"_id": full_name.lower()}, {"$set": {"full_name": full_name}}, upsert=True)
+    return
+
+
+def delete_repo_name_from_index(repo_name):
+    repo_names.delete_one({"_id": repo_name.lower()})
+    return
+
+
+# Resolve a repo name in any capitalization to its canonical full_name using only
+# our own stores. Returns None if we have never mined this repo's landing page.
+def get_canonical_repo_name(repo_name):
+    entry = repo_names.find_one({"_id": repo_name.lower()})
+    if entry is not None:
+        return entry["full_name"]
+
+    # Landing pages mined before the index existed: find it once, then remember it
+    landing_page = repos.find_one({"full_name": re.compile(f"^{re.escape(repo_name)}$", re.IGNORECASE)},
+                                  {"_id":0, "full_name":1})
+    if landing_page is not None:
+        index_repo_name(landing_page["full_name"])
+        return landing_page["full_name"]
+
+    return None
+
+
+# Like get_canonical_repo_name, but falls back to asking GitHub (through the shared
+# cache, see github_cache.py) for repos we do not know
+def resolve_repo_full_name(repo_name):
+    full_name = get_canonical_repo_name(repo_name)
+    if full_name is None:
+        full_name = get_github_repo(repo_name).full_name
+    return full_name
+
+
 # Function that will delete all repos from the repos collection of the mongodb database
 def delete_all_repos_from_repo_collection():
     repos.delete_many({})
+    repo_names.delete_many({})
     return
 
 
 # Method to find a specific repo in the repos collection and delete it 
 def delete_specific_repo_from_repo_collection(repo_name):
-    pygit_repo = g.get_repo(repo_name)
-    repos.delete_one({"full_name":pygit_repo.full_name})
+    full_name = resolve_repo_full_name(repo_name)
+    repos.delete_one({"full_name":full_name})
+    delete_repo_name_from_index(full_name)
     return
 
 # Method to remove all pull requests from the pull request collection 
@@ -151,78 +221,199 @@ def delete_all_pulls_from_pull_request_collection():
 # Method to delete all pull requests belonging to a specific repo 
 # from the pullRequests collection 
 def delete_specifc_repos_pull_requests(repo_name):
-    pygit_repo = g.get_repo(repo_name)
-    pull_requests.delete_many({"url": {"$regex": pygit_repo.full_name}})
+    full_name = resolve_repo_full_name(repo_name)
+    pull_requests.delete_many({"url": {"$regex": full_name}})
     return
 
-def rate_limit_is_reached():
-    num_requests_remaining = get_number_of_remaining_requests()
-    if num_requests_remaining == 0:
-        return True 
-    else:
-        return False 
-
-def get_number_of_remaining_requests():
-    g = Github(GITHUB_TOKEN, per_page=100) # Update authorization to have up to date requests remaining 
-    return  g.rate_limiting[0] # the current number of remaining requests
-
-def get_num_seconds_until_rate_limit_reset():
-    current_time_unix = time.mktime(datetime.now().timetuple())
-    rate_limit_reset_time_unix = g.rate_limiting_resettime
-    num_seconds=rate_limit_reset_time_unix-current_time_unix
-    num_minutes=num_seconds / 60
-    logger.info('RATE LIMIT REACHED! WAITING FOR {0} minutes.'.format(num_minutes))
-    return num_seconds
-
-def wait_for_request_rate_reset():
-    time.sleep(get_num_seconds_until_rate_limit_reset())
-    time.sleep(1)  
-    logger.info('Getting a new Github Token...') 
-    g = Github(GITHUB_TOKEN, per_page=100) # Update authorization to have up to date requests remaining 
-
-    logger.info('RATE LIMIT HAS BEEN RESET! STARTING TO MINE AGAIN.')
-    return
+# Requests spent on the pull at index of a pull listing: a new page every GITHUB_PER_PAGE
+# pulls, plus the pull's own GET when it is stored, since mine_specific_pull reads its
+# raw_data and that completes the listed pull
+def pull_requests_needed(index, stored=True):
+    return (0 if index % GITHUB_PER_PAGE else 1) + (1 if stored else 0)
 
 # Method to download all pull requests of a given repo and 
-# put them within the db.pullRequests collection 
+# put them within the db.pullRequests collection. Raises RateLimitExhausted
+# when the token runs out of requests, instead of sleeping until it resets
 def mine_pulls_from_repo(pygit_repo):
     # Retrieve all pull request numbers associated with this repo 
     pulls = pygit_repo.get_pulls('all')
     
-    for pull in pulls:
-        
-        # Only mine data when we have remaining requests
-        if rate_limit_is_reached():
-            wait_for_request_rate_reset() # Dynamically wait for a given number of seconds
-        else:
-            mine_specific_pull(pygit_repo.full_name, pull) # Go mine stuff!
+    for number, pull in enumerate(pulls):
+        check_rate_limit(pull_requests_needed(number)) # Only mine data when we have remaining requests
+        mine_specific_pull(pull) # Go mine stuff!
 
     return 
 
-def increase_collected_batches_count(repo_name):
-    document = pull_batches.find_one({"repo":repo_name})
-    current_count = pull_batches.find_one({"repo":repo_name})["collected_batches"] 
-    pull_batches.update_one(document, {"$set": {"collected_batches": current_count + 1}}, upsert=False)
+# The batch counters are incremented in place, so batches finishing at the same time
+# never overwrite each other's count. A batch (job) is only ever counted as collected
+# once, even if a retry of it was dispatched while it was still running
+def increase_collected_batches_count(repo_name, job=None):
+    if job is None:
+        pull_batches.update_one({"repo":repo_name}, {"$inc": {"collected_batches": 1}})
+    else:
+        pull_batches.update_one({"repo":repo_name, "collected_jobs": {"$ne": job}},
+                                {"$inc": {"collected_batches": 1}, "$addToSet": {"collected_jobs": job}})
     return 
 
 def increase_attempted_batches_count(repo_name):
-    document = pull_batches.find_one({"repo":repo_name})
-    current_count = pull_batches.find_one({"repo":repo_name})["attempted_batches"] 
-    pull_batches.update_one(document, {"$set": {"attempted_batches": current_count + 1}}, upsert=False)
+    pull_batches.update_one({"repo":repo_name}, {"$inc": {"attempted_batches": 1}})
     return 
 
-def mine_pulls_batch(pulls_batch, repo_name):
-    increase_attempted_batches_count(repo_name)
+# How many pulls of batch number job were stored before its task was rescheduled
+def get_batch_progress(repo_name, job):
+    document = pull_batches.find_one({"repo":repo_name}, {"_id":0, f"progress.{job}":1}) or {}
+    return document.get("progress", {}).get(str(job), 0)
+
+
+# Record the pulls a batch stored since its last record: where the batch got to
+# (num_mined, to resume from), the pages and api calls it spent (one per page and one
+# per stored pull, see pull_requests_needed), a timed sample for the repo's rolling
+# rate, and the rate budget GitHub last reported to this process
+def record_batch_progress(repo_name, job, num_mined, pulls_stored, pages_fetched):
+    now = time.time()
+    update = {
+        "$set": {"updated_at": now, "rate_remaining": rate_budget.remaining, "rate_reset_at": rate_budget.reset_at},
+        "$inc": {"pulls_fetched": pulls_stored, "pages_fetched": pages_fetched,
+                 "api_calls": pages_fetched + pulls_stored},
+        "$push": {"rate_samples": {"$each": [{"at": now, "pulls": pulls_stored}], "$slice": -RATE_SAMPLES}},
+    }
+    if job is not None:
+        update["$set"][f"progress.{job}"] = num_mined
+        update["$inc"].update({f"batches.{job}.pulls": pulls_stored, f"batches.{job}.pages": pages_fetched})
+    pull_batches.update_one({"repo":repo_name}, update)
+
+
+# Failed batches wait in failedBatches until tasks.retry_failed_batches dispatches
+# them again, after a backoff doubling with every attempt. A batch failing
+# settings.MAX_BATCH_ATTEMPTS times is moved to deadBatches (and counted in its
+# repo's dead_batches), where it stays until the admin requeues it
+BATCH_RETRY_BASE_SECONDS = 60
+BATCH_RETRY_MAX_SECONDS = 6 * 60 * 60
+
+# How long a dispatched retry has before the sweeper may dispatch the batch again
+BATCH_RETRY_CLAIM_SECONDS = 2 * 60 * 60
+
+# Most batches one sweep dispatches
+BATCH_RETRY_SWEEP_LIMIT = 100
+
+
+def failed_batch_id(repo_name, job):
+    return f"{repo_name}:{job}"
+
+
+def batch_retry_delay(attempts):
+    return min(BATCH_RETRY_BASE_SECONDS * 2 ** (attempts - 1), BATCH_RETRY_MAX_SECONDS)
+
+
+# Record that batch number job of a repo failed with exception. Returns True if it
+# will be retried, False if it was given up on and moved to deadBatches
+def record_failed_batch(repo_name, job, exception):
+    now = time.time()
+    failed = failed_batches.find_one_and_update(
+        {"_id": failed_batch_id(repo_name, job)},
+        {"$set": {"repo": repo_name, "job": job, "error": type(exception).__name__,
+                  "message": str(exception)[:500], "last_failed_at": now},
+         "$setOnInsert": {"first_failed_at": now},
+         "$inc": {"attempts": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    if failed["attempts"] >= settings.MAX_BATCH_ATTEMPTS:
+        failed["died_at"] = now
+        dead_batches.replace_one({"_id": failed["_id"]}, failed, upsert=True)
+        failed_batches.delete_one({"_id": failed["_id"]})
+        pull_batches.update_one({"repo":repo_name}, {"$inc": {"dead_batches": 1}})
+        return False
+
+    failed_batches.update_one({"_id": failed["_id"]},
+                              {"$set": {"next_attempt_at": now + batch_retry_delay(failed["attempts"])}})
+    return True
+
+
+def clear_failed_batch(repo_name, job):
+    failed_batches.delete_one({"_id": failed_batch_id(repo_name, job)})
+
+
+# Claim the failed batches due for another attempt. Returns [(repo_name, job), ...]
+def claim_failed_batches(limit=BATCH_RETRY_SWEEP_LIMIT):
+    now = time.time()
+    claimed = []
+    while len(claimed) < limit:
+        failed = failed_batches.find_one_and_update(
+            {"next_attempt_at": {"$lte": now}},
+            {"$set": {"next_attempt_at": now + BATCH_RETRY_CLAIM_SECONDS}}
+        )
+        if failed is None:
+            break
+        claimed.append((failed["repo"], failed["job"]))
+    return claimed
+
+
+# The failed or dead batches of a repo. They keep the repo name the batches were
+# queued with, whose case may differ from the name the admin or a deletion has
+def failed_batches_of_repo(repo_name):
+    return {"repo": {"$regex": f"^{re.escape(repo_name)}$", "$options": "i"}}
+
+
+# Move the dead batches of a repo back to failedBatches with a fresh set of attempts,
+# due at once. Returns the number of batches requeued
+def requeue_dead_batches(repo_name):
+    requeued = 0
+    for dead in dead_batches.find(failed_batches_of_repo(repo_name)):
+        failed_batches.replace_one({"_id": dead["_id"]},
+                                   {"_id": dead["_id"], "repo": dead["repo"], "job": dead["job"], "attempts": 0,
+                                    "error": dead["error"], "message": dead["message"],
+                                    "first_failed_at": dead["first_failed_at"], "next_attempt_at": time.time()},
+                                   upsert=True)
+        dead_batches.delete_one({"_id": dead["_id"]})
+        requeued += 1
+    if requeued:
+        pull_batches.update_one({"repo":dead["repo"]}, {"$inc": {"dead_batches": -requeued}})
+    return requeued
+
+
+# Drop the failed and dead batches of a repo, when it is mined again or deleted
+def forget_failed_batches(repo_name):
+    failed_batches.delete_many(failed_batches_of_repo(repo_name))
+    dead_batches.delete_many(failed_batches_of_repo(repo_name))
+
+
+# Mine every pull of a batch, recording its progress after every page. When the
+# token runs out of requests the pulls stored so far are recorded and
+# RateLimitExhausted is raised, so the task can reschedule itself; the next attempt
+# (of the same job) skips the pulls already stored. Pass first_attempt=False on
+# those later attempts, so the batch is only counted once
+def mine_pulls_batch(pulls_batch, repo_name, job=None, first_attempt=True):
+    ensure_mongo_indexes()
+    if first_attempt:
+        increase_attempted_batches_count(repo_name)
+    already_mined = get_batch_progress(repo_name, job) if job is not None else 0
+    pull = 0
+    stored = 0 # pulls stored since the last record
     try:
         for pull in range(len(pulls_batch)):
-            if rate_limit_is_reached():
-                wait_for_request_rate_reset() # Dynamically wait for a given number of seconds
-            else:
-                mine_specific_pull(next(pulls_batch)) # Move the iterator to the next pull request & mine
-        increase_collected_batches_count(repo_name)
+            # Only mine data when we have remaining requests. Batches start on a page
+            # boundary, and pulls stored by an earlier attempt are not fetched again
+            check_rate_limit(pull_requests_needed(pull, pull >= already_mined))
+            pygit_pull = next(pulls_batch) # Move the iterator to the next pull request
+            if pull >= already_mined:
+                mine_specific_pull(pygit_pull) # & mine
+                stored += 1
+            if (pull + 1) % GITHUB_PER_PAGE == 0 or pull + 1 == len(pulls_batch):
+                record_batch_progress(repo_name, job, max(pull + 1, already_mined), stored, 1)
+                stored = 0
+        increase_collected_batches_count(repo_name, job)
+        if job is not None:
+            clear_failed_batch(repo_name, job)
         # gc.collect()
         return True
-    except Exception: 
+    except RATE_LIMIT_EXCEPTIONS:
+        # A page read only in part is counted by the attempt that reads it to the end
+        record_batch_progress(repo_name, job, max(pull, already_mined), stored, 0)
+        raise
+    except Exception as e: 
+        if job is not None:
+            record_batch_progress(repo_name, job, max(pull, already_mined), stored, 0)
+            record_failed_batch(repo_name, job, e)
         return False
 
 # Mine and store specific repo. If there are any errors (other than 503),
@@ -230,7 +421,8 @@ def mine_pulls_batch(pulls_batch, repo_name):
 # @retry(wait_exponential_multiplier=1000, wait_exponential_max=10000, stop_max_attempt_number=10)
 def mine_specific_pull(pull):
     try:
-        pull_requests.update_one(pull.raw_data, {"$set": pull.raw_data}, upsert=True)
+        # Key on the pull's url so that a pull which changed on GitHub replaces its old json
+        pull_requests.update_one({"url": pull.raw_data["url"]}, {"$set": pull.raw_data}, upsert=True)
         
     except Exception as e:
         # if this repo doesn't exist, don't mine it 
@@ -238,33 +430,69 @@ def mine_specific_pull(pull):
             pass
         # TODO: Else, send the administrator an email to alert them of an error
     
-# Helper method to find a specific repo's main api page json 
+# Helper method to find a specific repo's main api page json. Repos we know are
+# resolved locally; anything else is looked up on GitHub (returning the exception
+# if GitHub does not know it either)
 def find_repo_main_page(repo_name):
-    # Use pygit to eliminate any problems with users not spelling the repo name
-    # exactly as it is on the actual repo 
     try:
-        pygit_repo = g.get_repo(repo_name)
-        return repos.find_one({"full_name":pygit_repo.full_name})
+        return repos.find_one({"full_name":resolve_repo_full_name(repo_name)})
     except Exception as e:
         return e
 
 
+# Helper method for the read paths of the site: find a mined repo's main api page
+# json purely from our own stores. Returns None if we have not mined it.
+def find_mined_repo_main_page(repo_name):
+    full_name = get_canonical_repo_name(repo_name)
+    if full_name is None:
+        return None
+    return repos.find_one({"full_name":full_name})
+
+
+# Batched version of find_mined_repo_main_page: return {lowercase repo name: landing page}
+# for those of requested_repo_names we have mined, in one query on the name index and one on repos
+def find_mined_repo_main_pages(requested_repo_names, projection=None):
+    lowercase_names = [repo_name.lower() for repo_name in requested_repo_names]
+    full_names = {entry["_id"]: entry["full_name"] for entry in repo_names.find({"_id": {"$in": lowercase_names}})}
+
+    # Landing pages mined before the name index existed are resolved (and indexed) one by one
+    for repo_name in lowercase_names:
+        if repo_name not in full_names:
+            full_name = get_canonical_repo_name(repo_name)
+            if full_name is not None:
+                full_names[repo_name] = full_name
+
+    if projection is not None:
+        projection = dict(projection, full_name=1)
+    # Keyed by the name asked for, which differs from the full name once a repo was renamed
+    landing_pages = {landing_page["full_name"]: landing_page for landing_page in
+                     repos.find({"full_name": {"$in": list(full_names.values())}}, projection)}
+    return {repo_name: landing_pages[full_name] for repo_name, full_name in full_names.items()
+            if full_name in landing_pages}
+
+
+# Return the stored json of a single pull request (looked up by its api url),
+# or None if we have not mined it yet 
+def find_specific_pull(pull_url, projection=None):
+    return pull_requests.find_one({"url": pull_url}, projection)
+
+
 # Helper method to find and return a list of all pull request json files 
 # belonging to a specific repo 
 def find_all_pull_requests_from_a_specific_repo(repo_name):
-    # Use pygit to eliminate any problems with users not spelling the repo name
-    # exactly as it is on the actual repo 
-    pygit_repo = g.get_repo(repo_name)
+    # Use the canonical name to eliminate any problems with users not spelling 
+    # the repo name exactly as it is on the actual repo 
+    full_name = resolve_repo_full_name(repo_name)
 
     # Obtain a list of all the pull requests matching the repo's full name 
-    pulls = pull_requests.find({"url": {"$regex": pygit_repo.full_name}})
+    pulls = pull_requests.find({"url": {"$regex": full_name}})
 
     return pulls
 
 def count_all_pull_requests_from_a_specifc_repo(repo_name):
-    pygit_repo = g.get_repo(repo_name)
+    full_name = resolve_repo_full_name(repo_name)
 
-    num_pulls = pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}})
+    num_pulls = pull_requests.count_documents({"url": {"$regex": full_name}})
 
     return num_pulls
 
@@ -288,16 +516,24 @@ def delete_all_contents_from_every_collection():
 
 def delete_all_pull_requests_batches_from_batch_collection():
     pull_batches.delete_many({})
+    failed_batches.delete_many({})
+    dead_batches.delete_many({})
 
 def delete_specific_repos_pull_request_batches(repo_name):
-    pygit_repo = g.get_repo(repo_name)
-    pull_batches.delete_many({"repo": {"$regex": pygit_repo.full_name.lower()}})
+    full_name = resolve_repo_full_name(repo_name)
+    pull_batches.delete_many({"repo": {"$regex": full_name.lower()}})
+    forget_failed_batches(full_name)
 
-# Method to delete all jsons belonging to a specific repo from every collection 
+# Method to delete all jsons belonging to a specific repo from every collection.
+# The repo collection goes last, since the others find the repo's exact name through it
 def delete_all_contents_of_specific_repo_from_every_collection(repo_name):
-    delete_specific_repo_from_repo_collection(repo_name)
+    full_name = resolve_repo_full_name(repo_name)
     delete_specifc_repos_pull_requests(repo_name)
     delete_specific_repos_pull_request_batches(repo_name)
+    delete_repo_metrics(repo_name)
+    delete_repo_card(repo_name)
+    delete_specific_repo_from_repo_collection(repo_name)
+    forget_github_repo(repo_name, full_name)
     return
 
 
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# progress.py
+# Purpose: Turn the progress counters a repo's batches keep in its pullBatches
+#          document (pulls and pages fetched, api calls spent, and a short list
+#          of timed samples) into a progress report: how far along the repo is,
+#          its rolling pulls per second, whether it has stalled, and an ETA that
+#          accounts for the requests our GitHub token has left
+
+from mining_scripts.connections import mongo_client, GITHUB_PER_PAGE
+import math
+import time
+
+
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
+
+db = client.backend_db # The specific mongo database we are working with
+pull_batches = db.pullBatches # one document per repo being (or once) mined, see tasks.initialize_batch_json
+
+
+# Function to be used in tests.py to ensure that we are not accessing the production database
+def mongo_progress_test_init():
+    global db
+    global pull_batches
+    db = client.test_db
+    pull_batches = db.pullBatches
+
+
+# Timed samples kept per repo, one per page of pulls stored
+RATE_SAMPLES = 20
+
+# Requests an authenticated token gets per rate limit window, and the window's length
+GITHUB_HOURLY_LIMIT = 5000
+RATE_LIMIT_WINDOW_SECONDS = 60 * 60
+
+# A repo that stored nothing for this long (without waiting on the rate limit) has stalled
+STALLED_SECONDS = 15 * 60
+
+
+# Pulls per second over the samples [{"at": unix time, "pulls": pulls stored}, ...].
+# The pulls of the first sample were stored before the measured span starts
+def rolling_rate(samples):
+    if len(samples) < 2:
+        return None
+    seconds = samples[-1]["at"] - samples[0]["at"]
+    if seconds <= 0:
+        return None
+    return sum(sample["pulls"] for sample in samples[1:]) / seconds
+
+
+# Seconds until pulls_left more pulls are stored at rate pulls per second, given the
+# requests the token has left until reset_at. Every pull costs its own GET on top of
+# one request per page of the listing. Once the requests run out every further
+# window of the rate limit adds its wait. None when there is no rate yet
+def estimate_seconds_left(pulls_left, rate, requests_left, reset_at, per_page, now):
+    if pulls_left <= 0:
+        return 0
+    if not rate:
+        return None
+    seconds = pulls_left / rate
+    requests_needed = pulls_left + math.ceil(pulls_left / per_page)
+    if requests_left is None or reset_at is None or requests_needed <= requests_left:
+        return seconds
+    windows = math.ceil((requests_needed - requests_left) / GITHUB_HOURLY_LIMIT)
+    return max(seconds, (reset_at - now) + (windows - 1) * RATE_LIMIT_WINDOW_SECONDS)
+
+
+# The progress report of a pullBatches document
+def summarize_progress(batch_state, now=None, per_page=GITHUB_PER_PAGE):
+    now = now or time.time()
+    total_pulls = batch_state.get("total_pulls") or 0
+    pulls_fetched = batch_state.get("pulls_fetched") or 0
+    total_batches = batch_state.get("total_batches") or 0
+    collected_batches = batch_state.get("collected_batches") or 0
+    rate = rolling_rate(batch_state.get("rate_samples") or [])
+    reset_at = batch_state.get("rate_reset_at")
+    updated_at = batch_state.get("updated_at") or batch_state.get("started_at")
+
+    complete = total_batches > 0 and collected_batches >= total_batches
+    waiting_for_rate_limit = (batch_state.get("rate_remaining") == 0 and reset_at is not None and reset_at > now)
+    stalled = (not complete and not waiting_for_rate_limit and updated_at is not None
+               and now - updated_at > STALLED_SECONDS)
+    seconds_left = 0 if complete else estimate_seconds_left(total_pulls - pulls_fetched, rate,
+                                                            batch_state.get("rate_remaining"), reset_at, per_page, now)
+    return {
+        "repo_name": batch_state["repo"],
+        "total_batches": total_batches,
+        "collected_batches": collected_batches,
+        "attempted_batches": batch_state.get("attempted_batches") or 0,
+        "dead_batches": batch_state.get("dead_batches") or 0, # failed too often, see mining.record_failed_batch
+        "total_pulls": total_pulls,
+        "pulls_fetched": pulls_fetched,
+        "pages_fetched": batch_state.get("pages_fetched") or 0,
+        "api_calls": batch_state.get("api_calls") or 0,
+        "batches": batch_state.get("batches") or {}, # {job: {"pulls": n, "pages": n}}
+        "percent": 100 if complete else (round(100 * pulls_fetched / total_pulls, 1) if total_pulls else 0),
+        "pulls_per_second": round(rate, 2) if rate is not None else None,
+        "eta_seconds": int(seconds_left) if seconds_left is not None else None,
+        "complete": complete,
+        "waiting_for_rate_limit": waiting_for_rate_limit,
+        "stalled": stalled,
+        "updated_at": updated_at,
+    }
+
+
+# The progress report of a repo being mined, or None if it never was. One read on
+# the repo index of pullBatches, cheap enough to poll
+def get_mining_progress(repo_name):
+    batch_state = pull_batches.find_one({"repo":repo_name.lower()}, {"_id":0})
+    if batch_state is None:
+        return None
+    return summarize_progress(batch_state)
+
+
+# A short line for the admin, e.g. "37.0% of 10000 pulls, 12.5 pulls/s, ETA 8m"
+def describe_progress(progress):
+    if progress["complete"]:
+        return "Mined, waiting to be finalized"
+    parts = [f"{progress['percent']}% of {progress['total_pulls']} pulls"]
+    if progress["pulls_per_second"] is not None:
+        parts.append(f"{progress['pulls_per_second']} pulls/s")
+    if progress["eta_seconds"] is not None:
+        parts.append(f"ETA {format_duration(progress['eta_seconds'])}")
+    if progress["waiting_for_rate_limit"]:
+        parts.append("waiting for the rate limit")
+    if progress["dead_batches"]:
+        parts.append(f"{progress['dead_batches']} batches failed for good")
+    if progress["stalled"]:
+        parts.append("STALLED")
+    return ", ".join(parts)
+
+
+def format_duration(seconds):
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 60 * 60:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h {seconds % 3600 // 60}m"
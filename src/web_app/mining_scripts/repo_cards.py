@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# repo_cards.py
+# Purpose: Keep one small "card" document per mined repo in the repoCards
+#          collection (name, avatar, language, stars, pull count, has_wiki),
+#          so that listing pages can load every repo they show in one query
+#          instead of reading each repo's full landing page json. Cards
+#          also carry the repo's search postings (see search.py)
+
+from pymongo import MongoClient, ASCENDING, DESCENDING # Import pymongo for interacting with MongoDB
+from mining_scripts.connections import mongo_client
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from mining_scripts.search import build_search_terms, build_search_condition, score_match
+from mining_scripts.facet_index import FACET_INDEX_CARD_FIELDS
+import json
+import os
+
+
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
+
+db = client.backend_db # The specific mongo database we are working with
+repo_cards = db.repoCards # collection holding one listing card per mined repo
+
+
+# Function to be used in tests.py to ensure that we are not accessing the production database
+def mongo_repo_cards_test_init():
+    global db
+    global repo_cards
+    db = client.test_db
+    repo_cards = db.repoCards
+
+
+# The only fields of a landing page json a card needs. Use this as the
+# projection when reading landing pages back out of mongo
+CARD_LANDING_PAGE_FIELDS = {"_id":0, "full_name":1, "owner.avatar_url":1, "language":1,
+                            "stargazers_count":1, "has_wiki":1, "description":1, "topics":1,
+                            "license.spdx_id":1, "pushed_at":1}
+
+# Bumped whenever cards gain fields, so cards built by older code get rebuilt
+CARD_VERSION = 3
+
+# Cards as the pages read them: everything but the search postings
+CARD_FIELDS = {"search_terms":0}
+
+
+# Build the card of a repo from its landing page json and its stored pull count.
+# Cards are keyed by the lowercase repo name, the same way MinedRepo names are
+def build_repo_card(repo_name, landing_page, num_pulls, completed_timestamp=None):
+    return {
+        "_id": repo_name.lower(),
+        "repo_name": repo_name,
+        "full_name": landing_page["full_name"],
+        "avatar_url": landing_page["owner"]["avatar_url"],
+        "language": landing_page.get("language"),
+        "stargazers_count": landing_page.get("stargazers_count", 0),
+        "has_wiki": landing_page.get("has_wiki", False),
+        "num_pulls": num_pulls,
+        "completed_timestamp": completed_timestamp,
+        "description": landing_page.get("description"),
+        "license": (landing_page.get("license") or {}).get("spdx_id"),
+        "pushed_at": landing_page.get("pushed_at"),
+        "search_terms": build_search_terms(landing_page["full_name"], landing_page.get("description"),
+                                           landing_page.get("topics") or ()),
+        "card_version": CARD_VERSION,
+    }
+
+
+def save_repo_card(repo_name, landing_page, num_pulls, completed_timestamp=None):
+    card = build_repo_card(repo_name, landing_page, num_pulls, completed_timestamp)
+    repo_cards.replace_one({"_id": card["_id"]}, card, upsert=True)
+    return card
+
+
+# Listing sort options: option -> (card field, direction). Ties, and the name
+# sort itself, are broken by _id so every card has a unique position
+SORT_OPTIONS = {
+    "name": ("_id", ASCENDING),
+    "stars": ("stargazers_count", DESCENDING),
+    "pulls": ("num_pulls", DESCENDING),
+    "last_mined": ("completed_timestamp", DESCENDING),
+}
+DEFAULT_SORT = "name"
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+_repo_card_indexes_created = False
+
+
+# One compound index per sort option, matching the (field, _id) order the pages are read in
+def ensure_repo_card_indexes():
+    global _repo_card_indexes_created
+    if not _repo_card_indexes_created:
+        for field, direction in SORT_OPTIONS.values():
+            if field != "_id":
+                repo_cards.create_index([(field, direction), ("_id", ASCENDING)])
+        repo_cards.create_index("search_terms") # multikey index over every card's postings
+        _repo_card_indexes_created = True
+
+
+# A page cursor is the (sort value, _id) of the last card on the previous page,
+# packed into an opaque url safe token
+def encode_page_cursor(card, sort=DEFAULT_SORT):
+    field = SORT_OPTIONS[sort][0]
+    return urlsafe_b64encode(json.dumps([card.get(field), card["_id"]]).encode('utf-8')).decode('ascii')
+
+
+def decode_page_cursor(cursor):
+    try:
+        value, card_id = json.loads(urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        return value, card_id
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+# Return one page of cards as (cards, next_cursor). Pages are read with a keyset
+# condition ("after the last card we showed") on an index, never with skip(), so
+# every page costs the same no matter how deep into the listing it is. next_cursor is
+# None on the last page.
+def get_repo_cards_page(sort=DEFAULT_SORT, after=None, page_size=DEFAULT_PAGE_SIZE):
+    ensure_repo_card_indexes()
+    if sort not in SORT_OPTIONS:
+        sort = DEFAULT_SORT
+    field, direction = SORT_OPTIONS[sort]
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    conditions = []
+    position = decode_page_cursor(after) if after else None
+    if position is not None:
+        value, card_id = position
+        if field == "_id":
+            conditions.append({"_id": {"$gt": card_id}})
+        else:
+            past = "$gt" if direction == ASCENDING else "$lt"
+            conditions.append({"$or": [{field: {past: value}}, {field: value, "_id": {"$gt": card_id}}]})
+
+    query = {"$and": conditions} if len(conditions) > 1 else (conditions[0] if conditions else {})
+    sort_keys = [(field, direction)] if field == "_id" else [(field, direction), ("_id", ASCENDING)]
+
+    # Read one extra card to know whether there is a next page
+    cards = list(repo_cards.find(query, CARD_FIELDS).sort(sort_keys).limit(page_size + 1))
+    if len(cards) <= page_size:
+        return cards, None
+    cards = cards[:page_size]
+    return cards, encode_page_cursor(cards[-1], sort)
+
+
+# Every card, with only the fields the facet index is built from
+def load_facet_index_cards():
+    return list(repo_cards.find({}, FACET_INDEX_CARD_FIELDS))
+
+
+# Return the cards of every repo matching the search text, best match first (ties go
+# to the most starred repo). The query is answered from the search_terms index, so
+# its cost follows the number of matches rather than the number of repos
+def search_repo_cards(query, limit=None):
+    ensure_repo_card_indexes()
+    condition = build_search_condition(query)
+    if condition is None:
+        return []
+
+    cards = list(repo_cards.find(condition, CARD_FIELDS))
+    cards.sort(key=lambda card: (-score_match(card["full_name"], query), -(card.get("stargazers_count") or 0), card["_id"]))
+    return cards if limit is None else cards[:limit]
+
+
+# Return the cards of the given repos, sorted by name, in a single query on _id.
+# Repos that have no card yet are simply missing from the result
+def get_repo_cards(repo_names):
+    return list(repo_cards.find({"_id": {"$in": [repo_name.lower() for repo_name in repo_names]}}, CARD_FIELDS).sort("_id", 1))
+
+
+def delete_repo_card(repo_name):
+    repo_cards.delete_one({"_id": repo_name.lower()})
+    return
+
+
+def delete_all_repo_cards():
+    repo_cards.delete_many({})
+    return
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# search.py
+# Purpose: Build the search postings stored on each repo card and turn a user's
+#          search text into an indexed query over them. Names get prefix and
+#          trigram postings (so "flask", "fla" and "ask" all find pallets/flask),
+#          descriptions and topics get word prefix postings. The user's text is
+#          only ever split into words, never compiled as a regex
+
+import re
+
+
+# Postings are tagged so a prefix never collides with a trigram
+PREFIX_TAG = "p:"
+TRIGRAM_TAG = "t:"
+
+# Longest prefix we store. Longer search words are matched by their trigrams
+MAX_PREFIX_LENGTH = 20
+
+# Words of a search beyond this are ignored
+MAX_QUERY_WORDS = 8
+
+WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return WORD.findall(str(text or "").lower())
+
+
+def prefixes(word):
+    return [PREFIX_TAG + word[:length] for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1)]
+
+
+def trigrams(word):
+    return [TRIGRAM_TAG + word[index:index + 3] for index in range(len(word) - 2)]
+
+
+# All the postings of one repo. The owner and repo name are also indexed whole
+# (e.g. "scikit-learn"), on top of the words they split into
+def build_search_terms(full_name, description=None, topics=()):
+    owner, _, name = full_name.lower().partition('/')
+    name_words = set(tokenize(full_name))
+    name_words.update(word for word in (owner, name) if word)
+
+    terms = set()
+    for word in name_words:
+        terms.update(prefixes(word))
+        terms.update(trigrams(word))
+
+    for word in tokenize(description) + [word for topic in topics for word in tokenize(topic)]:
+        terms.update(prefixes(word))
+    return sorted(terms)
+
+
+# The mongo condition matching every repo that contains all words of the search:
+# each word must be a stored prefix, or (in names) have all of its trigrams present.
+# Returns None if the search holds no words at all
+def build_search_condition(query, field="search_terms"):
+    words = tokenize(query)[:MAX_QUERY_WORDS]
+    if not words:
+        return None
+
+    conditions = []
+    for word in words:
+        alternatives = []
+        if len(word) <= MAX_PREFIX_LENGTH:
+            alternatives.append({field: PREFIX_TAG + word})
+        if len(word) >= 3:
+            alternatives.append({field: {"$all": trigrams(word)}})
+        conditions.append(alternatives[0] if len(alternatives) == 1 else {"$or": alternatives})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+# Score how well a repo's full name matches the search. An exact owner or repo name
+# beats a name word starting with the search word, which beats any other match
+def score_match(full_name, query):
+    owner, _, name = full_name.lower().partition('/')
+    name_words = tokenize(full_name)
+    score = 0
+    for word in tokenize(query)[:MAX_QUERY_WORDS]:
+        if word in (owner, name):
+            score += 4
+        elif word in name_words:
+            score += 3
+        elif any(name_word.startswith(word) for name_word in name_words):
+            score += 2
+        elif word in full_name.lower():
+            score += 1
+    return score
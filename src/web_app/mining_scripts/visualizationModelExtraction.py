@@ -1,72 +1,87 @@
 from pymongo import MongoClient # Import pymongo for interacting with MongoDB
 from github import Github # Import PyGithub for mining data
+from mining_scripts.connections import mongo_client
 import datetime
+import json
 import os
 import plotly.plotly as py
 import plotly.offline as opy
 import plotly.graph_objs as go
 import plotly.tools as tls
-import pandas as pd
-import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+from mining_scripts.metrics import (PullRequestMetrics, METRIC_PULL_FIELDS, compute_metrics_from_pulls,
+                                    save_repo_metrics, parse_github_timestamp)
+from user_app.fields import TimestampSeriesBuilder
 
 
-if os.getpid() == 0:
-    # Initial connection by parent process
-    client = MongoClient('localhost', 27017) # Where are we connecting
-else: 
-    # No need to reconnect if we are connected
-    client = MongoClient('localhost', 27017, connect=False)
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
 
 db = client.backend_db # The specific mongo database we are working with 
 repos = db.repos # collection for storing all of a repo's main api json information 
 pull_requests = db.pullRequests # collection for storing all pull requests for all repos
 
 
+# Number of pull requests mongo hands us per round trip while extracting
+PULL_CURSOR_BATCH_SIZE = 1000
+
+
 # Takes in the name of a repo to query, and returns a dict containing num_pulls, 
 # num_closed_merged_pulls, num_closed_unmerged_pulls, num_open_pulls, created_at_list, 
-# closed_at_list, merged_at_list, and num_newcomer_labels.
+# closed_at_list, merged_at_list, num_newcomer_labels and the three chart jsons.
+# The repo's metrics state is saved along the way so later updates can be incremental.
+#
+# The pulls are streamed once, in chunks and with only the fields we need. Counts and 
+# monthly series live in the O(months) PullRequestMetrics state, and the timestamp lists
+# are packed into int64 arrays as they arrive, so memory no longer grows with whole pull jsons.
 def extract_pull_request_model_data(pygit_repo):
-    extracted_info = {
-        "num_pulls": pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}}),
-
-        "num_closed_merged_pulls":pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}, 
-                                                                "state":"closed", "merged_at": {"$ne":None}}),
-
-        "num_closed_unmerged_pulls":pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}, 
-                                                                "state":"closed", "merged_at":None}),
-
-        "num_open_pulls":pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}, 
-                                                                "state":"open", "merged_at":None}),
-
-        "people_list": [pull['user']['login'] for pull in pull_requests.find({"url": {"$regex": pygit_repo.full_name}})],
-        
-        "people_date_tuple":[(pull['user']['login'], datetime.datetime.strptime(str(pull["created_at"]), "%Y-%m-%dT%H:%M:%SZ")) for pull in pull_requests.find({"url": {"$regex": pygit_repo.full_name}})],
-
-        "created_at_list":[datetime.datetime.strptime(str(pull["created_at"]), "%Y-%m-%dT%H:%M:%SZ") 
-                            for pull in pull_requests.find({"url": {"$regex": pygit_repo.full_name}})],
+    metrics = PullRequestMetrics()
+    timestamp_lists = {
+        "created_at": TimestampSeriesBuilder(),
+        "closed_at": TimestampSeriesBuilder(),
+        "merged_at": TimestampSeriesBuilder(),
+    }
 
-        "closed_at_list":[datetime.datetime.strptime(str(pull["closed_at"]), "%Y-%m-%dT%H:%M:%SZ") 
-                            for pull in pull_requests.find({"url": {"$regex": pygit_repo.full_name},
-                                                                "closed_at": {"$ne":None}})],
+    pulls = pull_requests.find({"url": {"$regex": pygit_repo.full_name}}, METRIC_PULL_FIELDS,
+                               batch_size=PULL_CURSOR_BATCH_SIZE)
+    for pull in pulls:
+        metrics.add(pull)
+        for key, builder in timestamp_lists.items():
+            if pull.get(key) is not None:
+                builder.add(parse_github_timestamp(pull[key]))
+
+    save_repo_metrics(pygit_repo.full_name, metrics)
+
+    extracted_info = dict(metrics.counts)
+    extracted_info.update({
+        "created_at_list": timestamp_lists["created_at"].build(),
+        "closed_at_list": timestamp_lists["closed_at"].build(),
+        "merged_at_list": timestamp_lists["merged_at"].build(),
+    })
+    extracted_info.update(produce_metric_charts(metrics))
+    return extracted_info
 
-        "merged_at_list":[datetime.datetime.strptime(str(pull["merged_at"]), "%Y-%m-%dT%H:%M:%SZ") 
-                            for pull in pull_requests.find({"url": {"$regex": pygit_repo.full_name}, 
-                                                                "merged_at": {"$ne":None}})],
 
-        "num_newcomer_labels":pull_requests.count_documents({"url": {"$regex": pygit_repo.full_name}, 
-                                                                "labels": {"name": {"$regex": "first"}}})
-    }
+# Render the charts named in charts (by default all three) from a repo's
+# PullRequestMetrics, keyed the same way extract_pull_request_model_data returns them
+def produce_metric_charts(metrics, charts=("bar_chart_json", "line_chart_json", "contribution_line_chart_json")):
+    rendered = {}
     try:
-        extracted_info.update(
-            {
-                "bar_chart": produce_pull_type_bar_chart(extracted_info),
-                "line_chart": produce_pull_requests_per_month_line_chart(extracted_info),
-                "contribution_line_chart_html":produce_contributors_per_month_line_chart(extracted_info)
-            }
-        )
+        if "bar_chart_json" in charts:
+            rendered["bar_chart_json"] = produce_pull_type_bar_chart(metrics.counts)
+        if "line_chart_json" in charts:
+            rendered["line_chart_json"] = produce_pull_requests_per_month_line_chart(metrics.pull_series())
+        if "contribution_line_chart_json" in charts:
+            rendered["contribution_line_chart_json"] = produce_contributors_per_month_line_chart(metrics.contributors_series())
     except Exception as e:
         print("ERROR ON CHARTS:", e)
-    return extracted_info
+    return rendered
+
+
+# Serialize a plotly figure into the compact {"data": [...], "layout": {...}}
+# JSON that the plotly_chart template tag renders client side. Storing this
+# instead of opy.plot's div keeps the plotly.js bundle out of every row.
+def figure_to_json(figure):
+    return json.dumps(figure, cls=PlotlyJSONEncoder, separators=(',', ':'))
 
 
 def produce_pull_type_bar_chart(extracted_info):
@@ -110,51 +125,16 @@ def produce_pull_type_bar_chart(extracted_info):
 
 
     figure=go.Figure(data=data,layout=layout)
-    div = opy.plot(figure,  output_type='div')
-
-    return div
 
-def produce_pull_requests_per_month_line_chart(extracted_info):
-    created_dates_str = extracted_info["created_at_list"]
-    closed_dates_str = extracted_info["closed_at_list"]
-    merged_dates_str = extracted_info["merged_at_list"]
+    return figure_to_json(figure)
 
-    try:
-        created_dates = pd.to_datetime(pd.Series(created_dates_str), format="%Y-%m-%d %H:%M:%S")
-        created_dates.index = created_dates.dt.to_period('m')
-        created_dates = created_dates.groupby(level=0).size()
-        created_dates = created_dates.reindex(pd.period_range(created_dates.index.min(),
-                                            created_dates.index.max(), freq='m'), fill_value=0)
-        created_indices = np.array(created_dates.index.astype(str))
-        created_date_freq = np.array(created_dates)
-    except Exception:
-        created_indices = []
-        created_date_freq = []
-
-    try:
-        closed_dates = pd.to_datetime(pd.Series(closed_dates_str), format="%Y-%m-%d %H:%M:%S")
-        closed_dates.index = closed_dates.dt.to_period('m')
-        closed_dates = closed_dates.groupby(level=0).size()
-        closed_dates = closed_dates.reindex(pd.period_range(closed_dates.index.min(),
-                                            closed_dates.index.max(), freq='m'), fill_value=0)
-        closed_indices = np.array(closed_dates.index.astype(str))
-        closed_date_freq = np.array(closed_dates)
-    except:
-        closed_indices = []
-        closed_date_freq = []
+# Takes in a dict mapping "created", "closed" and "merged" to (months, counts)
+# tuples, as returned by PullRequestMetrics.pull_series()
+def produce_pull_requests_per_month_line_chart(pull_series):
+    created_indices, created_date_freq = pull_series["created"]
+    closed_indices, closed_date_freq = pull_series["closed"]
+    merged_indices, merged_date_freq = pull_series["merged"]
 
-    try:
-        merged_dates = pd.to_datetime(pd.Series(merged_dates_str), format="%Y-%m-%d %H:%M:%S")
-        merged_dates.index = merged_dates.dt.to_period('m')
-        merged_dates = merged_dates.groupby(level=0).size()
-        merged_dates = merged_dates.reindex(pd.period_range(merged_dates.index.min(),
-                                            merged_dates.index.max(), freq='m'), fill_value=0)
-        merged_indices = np.array(merged_dates.index.astype(str))
-        merged_date_freq = np.array(merged_dates)
-    except Exception:
-        merged_indices = []
-        merged_date_freq = []
-    
     data = [
         go.Scatter(
             x=created_indices, 
@@ -198,49 +178,12 @@ def produce_pull_requests_per_month_line_chart(extracted_info):
 
     figure=go.Figure(data=data,layout=layout)
 
-    div = opy.plot(figure,  output_type='div')
-    return div
-
-def produce_contributors_per_month_line_chart(extracted_info):
-    people = extracted_info['people_list']
-    created = extracted_info['created_at_list']
-
-    # We need this to refer back to rows 
-    raw_data = pd.DataFrame({
-        'person':people,
-        'month':pd.to_datetime(pd.Series(created), format="%Y-%m-%d %H:%M:%S")
-    })
-
-    # Create a dataframe with people and month of contribution as the columns
-    filtered_df = pd.DataFrame({
-        'person':people,
-        'month':pd.to_datetime(pd.Series(created), format="%Y-%m-%d %H:%M:%S").dt.to_period('m')
-    })
-
-    # eliminate duplicate rows (people showing up more than once each month)
-    filtered_df = filtered_df.drop_duplicates()
-
-    # Get the rows with their indexes 
-    dates = pd.Series(filtered_df['month'])
-
-    # refer back to the raw data by index
-    dates = raw_data.iloc[dates.index]['month']
-
-    # Convert this data it only look at the month 
-    dates.index = dates.dt.to_period('m')
-
-    # Group by the month and count the occurrences 
-    dates = dates.groupby(level=0).size()
-
-    # Fill in missing months with the vlaue '0'
-    dates = dates.reindex(pd.period_range(dates.index.min(),
-                                        dates.index.max(), freq='m'), fill_value=0)
-
-    # Get the months as a string for our x-axis
-    dates_indices = np.array(dates.index.astype(str))
+    return figure_to_json(figure)
 
-    # Get the frequency as a list for the y-axis 
-    dates_freq = np.array(dates)
+# Takes in the (months, number of distinct contributors) tuple
+# returned by PullRequestMetrics.contributors_series()
+def produce_contributors_per_month_line_chart(contributors_series):
+    dates_indices, dates_freq = contributors_series
 
     # Now all we need to do is plot this bad boy! 
     data = [
@@ -274,5 +217,4 @@ def produce_contributors_per_month_line_chart(extracted_info):
 
     figure=go.Figure(data=data,layout=layout)
 
-    div = opy.plot(figure,  output_type='div')
-    return div
\ No newline at end of file
+    return figure_to_json(figure)
\ No newline at end of file
@@ -12,13 +12,16 @@ from mining_scripts.mining import *
 from mining_scripts.batchify import *
 from multiprocessing import Pool
 from threading import Thread
-from user_app.tasks import mine_pull_request_batch_asynchronously, initialize_batch_json #, mine_data_asynchronously
+from user_app.tasks import mine_pull_request_batch_asynchronously, initialize_batch_json, retry_failed_batches #, mine_data_asynchronously
 from django.db import transaction
+from user_app.caching import invalidate_repo_cache
+from mining_scripts.connections import github_client
+from mining_scripts.progress import get_mining_progress, describe_progress
 
 from celery.result import AsyncResult
 from celery.task.control import revoke
 
-g = Github(GITHUB_TOKEN, per_page=100) # authorization for the github API 
+g = github_client() # authorization for the github API
 
 logger = get_task_logger(__name__)
 
@@ -159,6 +162,7 @@ def delete_selected(modeladmin, request, queryset):
             
 
             obj.delete()
+            invalidate_repo_cache(obj.repo_name, obj.completed_timestamp)
             
 
     else:
@@ -168,6 +172,17 @@ def delete_selected(modeladmin, request, queryset):
 delete_selected.short_description = "Delete selected repos from database"
 
 
+# Give the batches of the selected repos that failed too often a fresh set of attempts,
+# and sweep them up right away rather than at the next scheduled retry_failed_batches
+def requeue_failed_batches(modeladmin, request, queryset):
+    requeued = sum(requeue_dead_batches(obj.repo_name) for obj in queryset)
+    if requeued:
+        retry_failed_batches.delay()
+    modeladmin.message_user(request, f"Requeued {requeued} failed batches.")
+
+requeue_failed_batches.short_description = "Requeue failed batches of selected repos"
+
+
 # Design the admin panel for each database model 
 class MiningRequestAdmin(admin.ModelAdmin):
     list_display = ['repo_name', "requested_by", "email", "send_email", "timestamp"]
@@ -181,10 +196,15 @@ class MiningRequestAdmin(admin.ModelAdmin):
 
 
 class QueuedMiningRequestAdmin(admin.ModelAdmin):
-    list_display = ['repo_name', "requested_by", "timestamp", "requested_timestamp", "send_email"]
+    list_display = ['repo_name', "requested_by", "timestamp", "requested_timestamp", "send_email", "mining_progress"]
     ordering = ['timestamp']
 
-    actions=[delete_selected]
+    actions=[delete_selected, requeue_failed_batches]
+
+    def mining_progress(self, obj):
+        progress = get_mining_progress(obj.repo_name)
+        return describe_progress(progress) if progress is not None else "Not started"
+    mining_progress.short_description = "Progress"
 
 class BlacklistedMiningRequestAdmin(admin.ModelAdmin):
     list_display = ['repo_name', "requested_by", "timestamp"]
@@ -202,8 +222,8 @@ class MinedRepoAdmin(admin.ModelAdmin):
                                         'num_open_pulls', 'num_closed_unmerged_pulls', 
                                         'created_at_list', 'closed_at_list', 
                                         'merged_at_list', 'num_newcomer_labels',
-                                        'bar_chart_html', 'pull_line_chart_html',
-                                        'contribution_line_chart_html',))
+                                        'bar_chart_json', 'pull_line_chart_json',
+                                        'contribution_line_chart_json',))
         return fieldsets
 
 
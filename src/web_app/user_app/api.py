@@ -0,0 +1,208 @@
+# Read-only JSON API, version 1.
+#
+# Every endpoint reads only what mining has already computed: the counts on
+# MinedRepo, the repo cards and the monthly metrics state. Responses carry a
+# strong ETag and a Last-Modified taken from MinedRepo.completed_timestamp, so
+# clients polling with If-None-Match / If-Modified-Since get an empty 304 back
+# without the response body ever being built. Every endpoint accepts
+# ?fields=a,b,c to only return some of the fields of each repo.
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control, never_cache
+from django.views.decorators.http import condition, require_GET
+from mining_scripts.metrics import load_repo_metrics
+from mining_scripts.progress import get_mining_progress
+from mining_scripts.repo_cards import get_repo_cards, get_repo_cards_page, search_repo_cards, DEFAULT_SORT, DEFAULT_PAGE_SIZE
+from .models import MinedRepo
+import hashlib
+
+
+# Fields of the repo summary, in the order they are returned
+REPO_COUNT_FIELDS = ("num_pulls", "num_closed_merged_pulls", "num_closed_unmerged_pulls",
+                     "num_open_pulls", "num_newcomer_labels")
+REPO_CARD_FIELDS = ("full_name", "avatar_url", "language", "stargazers_count", "has_wiki")
+
+# Typeahead suggestions returned by default, and at most
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 25
+
+
+def get_repo_name(repo_owner, repo_name):
+    return repo_owner.lower() + "/" + repo_name.lower()
+
+
+# Parse ?repos=owner/a,owner/b into a list of unique lowercase names (at most settings.MAX_COMPARED_REPOS)
+def get_compared_repo_names(request):
+    repo_names = []
+    for repo_name in request.GET.get('repos', '').split(','):
+        repo_name = repo_name.strip().lower()
+        if repo_name and repo_name not in repo_names:
+            repo_names.append(repo_name)
+    return repo_names[:settings.MAX_COMPARED_REPOS]
+
+
+# Keep only the fields asked for with ?fields=, or everything if it is not given
+def select_fields(request, data):
+    fields = request.GET.get('fields')
+    if not fields:
+        return data
+    wanted = set(field.strip() for field in fields.split(','))
+    return {key: value for key, value in data.items() if key in wanted or key == "repo_name"}
+
+
+# Return {repo_name: completed_timestamp} for the mined repos among repo_names
+def get_completed_timestamps(repo_names):
+    return {
+        repo_name.lower(): completed_timestamp for repo_name, completed_timestamp in
+        MinedRepo.objects.filter(repo_name__in=repo_names).values_list('repo_name', 'completed_timestamp')
+    }
+
+
+# A strong ETag over everything a response depends on: the repos' completed timestamps
+# and the query string (which selects the page, sort order and fields)
+def make_etag(request, completed_timestamps):
+    state = sorted((repo_name, str(completed_timestamp)) for repo_name, completed_timestamp in completed_timestamps.items())
+    return hashlib.md5(f"{state}|{request.GET.urlencode()}".encode('utf-8')).hexdigest()
+
+
+def repo_summary(mined_repo, card=None):
+    summary = {"repo_name": mined_repo.repo_name.lower()}
+    summary.update({field: getattr(mined_repo, field) for field in REPO_COUNT_FIELDS})
+    if card is not None:
+        summary.update({field: card.get(field) for field in REPO_CARD_FIELDS})
+    summary["last_mined"] = mined_repo.completed_timestamp.isoformat()
+    return summary
+
+
+def get_repo_summaries(repo_names):
+    mined_repos = MinedRepo.objects.filter(repo_name__in=repo_names).only('repo_name', 'completed_timestamp', *REPO_COUNT_FIELDS)
+    cards = {card["_id"]: card for card in get_repo_cards(repo_names)}
+    summaries = {mined_repo.repo_name.lower(): repo_summary(mined_repo, cards.get(mined_repo.repo_name.lower()))
+                 for mined_repo in mined_repos}
+    return [summaries[repo_name] for repo_name in repo_names if repo_name in summaries]
+
+
+def not_found(message="Repo not found"):
+    return JsonResponse({"error": message}, status=404)
+
+
+# Conditional request helpers. The catalog wide ones look at the most recently mined repo
+def catalog_etag(request, *args, **kwargs):
+    catalog = MinedRepo.objects.aggregate(latest=Max('completed_timestamp'), count=Count('id'))
+    return hashlib.md5(f"{catalog['latest']}|{catalog['count']}|{request.GET.urlencode()}".encode('utf-8')).hexdigest()
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return MinedRepo.objects.aggregate(latest=Max('completed_timestamp'))['latest']
+
+
+def repo_etag(request, repo_owner, repo_name):
+    completed_timestamps = get_completed_timestamps([get_repo_name(repo_owner, repo_name)])
+    return make_etag(request, completed_timestamps) if completed_timestamps else None
+
+
+def repo_last_modified(request, repo_owner, repo_name):
+    return get_completed_timestamps([get_repo_name(repo_owner, repo_name)]).get(get_repo_name(repo_owner, repo_name))
+
+
+def compare_etag(request):
+    completed_timestamps = get_completed_timestamps(get_compared_repo_names(request))
+    return make_etag(request, completed_timestamps) if completed_timestamps else None
+
+
+def compare_last_modified(request):
+    completed_timestamps = get_completed_timestamps(get_compared_repo_names(request))
+    return max(completed_timestamps.values()) if completed_timestamps else None
+
+
+# /api/v1/repos/?sort=&after=&page_size=&fields=
+# One page of mined repos, in the same keyset pages as the /repos/ listing
+@require_GET
+@condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+def api_repo_list(request):
+    try:
+        page_size = int(request.GET.get('page_size', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+
+    cards, next_cursor = get_repo_cards_page(request.GET.get('sort', DEFAULT_SORT), request.GET.get('after'), page_size)
+    summaries = get_repo_summaries([card["_id"] for card in cards])
+    return JsonResponse({
+        "results": [select_fields(request, summary) for summary in summaries],
+        "next": next_cursor,
+    })
+
+
+# /api/v1/repos/<owner>/<name>/?fields=
+@require_GET
+@condition(etag_func=repo_etag, last_modified_func=repo_last_modified)
+def api_repo_detail(request, repo_owner, repo_name):
+    summaries = get_repo_summaries([get_repo_name(repo_owner, repo_name)])
+    if not summaries:
+        return not_found()
+    return JsonResponse(select_fields(request, summaries[0]))
+
+
+# /api/v1/repos/<owner>/<name>/series/?fields=
+# The monthly created/closed/merged pull counts and contributors, as [month, value] pairs
+@require_GET
+@condition(etag_func=repo_etag, last_modified_func=repo_last_modified)
+def api_repo_series(request, repo_owner, repo_name):
+    full_name = get_repo_name(repo_owner, repo_name)
+    metrics = load_repo_metrics(full_name)
+    if metrics is None or not get_completed_timestamps([full_name]):
+        return not_found()
+
+    series = {"repo_name": full_name}
+    for key in ("created", "closed", "merged", "contributors"):
+        months, values = metrics.monthly_series(key)
+        series[key] = [list(pair) for pair in zip(months, values)]
+    return JsonResponse(select_fields(request, series))
+
+
+# /api/v1/repos/<owner>/<name>/progress/?fields=
+# How far along the mining of a repo is, with its rate and ETA. Meant to be polled
+# while the repo is mined, so it is never cached
+@require_GET
+@never_cache
+def api_mining_progress(request, repo_owner, repo_name):
+    progress = get_mining_progress(get_repo_name(repo_owner, repo_name))
+    if progress is None:
+        return not_found("That repo has not been queued for mining")
+    progress["mined"] = bool(get_completed_timestamps([progress["repo_name"]]))
+    return JsonResponse(select_fields(request, progress))
+
+
+# /api/v1/compare/?repos=owner/a,owner/b[,...]&fields=
+@require_GET
+@condition(etag_func=compare_etag, last_modified_func=compare_last_modified)
+def api_compare_repos(request):
+    repo_names = get_compared_repo_names(request)
+    if len(repo_names) < 2:
+        return JsonResponse({"error": "Pass at least two repos as ?repos=owner/a,owner/b"}, status=400)
+
+    summaries = get_repo_summaries(repo_names)
+    if len(summaries) != len(repo_names):
+        missing = sorted(set(repo_names) - set(summary["repo_name"] for summary in summaries))
+        return not_found(f"Repos not found: {', '.join(missing)}")
+    return JsonResponse({"results": [select_fields(request, summary) for summary in summaries]})
+
+
+# /api/v1/search/?q=&limit=
+# Ranked typeahead suggestions for the repo search box
+@require_GET
+@cache_control(public=True, max_age=60)
+def api_search_repos(request):
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT))
+    except ValueError:
+        limit = SEARCH_DEFAULT_LIMIT
+
+    cards = search_repo_cards(request.GET.get('q', ''), limit)
+    return JsonResponse({"results": [
+        {"repo_name": card["_id"], "full_name": card["full_name"], "avatar_url": card["avatar_url"],
+         "stargazers_count": card.get("stargazers_count")}
+        for card in cards
+    ]})
@@ -0,0 +1,96 @@
+# Helpers around Django's cache framework for the public pages.
+#
+# Everything a page shows only changes when a repo finishes mining or is updated,
+# so cache keys are built from what identifies that state:
+#   - per-repo pages and fragments are keyed by repo name and completed_timestamp,
+#     so a freshly mined repo never hits an old entry
+#   - listing results are keyed by a catalog version number which the mining
+#     tasks bump whenever any repo is finalized, updated or removed
+#   - each process keeps one facet index (see facet_index.py), rebuilt the
+#     first time it is asked for after the catalog version moved on
+
+from django.core.cache import cache
+from mining_scripts.repo_cards import load_facet_index_cards
+from mining_scripts.facet_index import FacetIndex
+from datetime import datetime, timedelta
+import hashlib
+
+
+# How long entries live. Keys change whenever the data does, so this only bounds
+# how long unreachable entries hang around
+REPO_PAGE_CACHE_SECONDS = 60 * 60 * 24
+LISTING_CACHE_SECONDS = 60 * 60
+
+CATALOG_VERSION_KEY = 'gitossum:catalog_version'
+
+# The activity buckets of the facet index move with time, so an index is also
+# rebuilt once it is this old even if no repo changed
+FACET_INDEX_MAX_AGE = timedelta(days=1)
+
+
+# Memcached keys may not contain spaces and are length limited, so hash the parts
+def make_cache_key(kind, *parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'gitossum:{kind}:{digest}'
+
+
+# Key of a page or fragment built from one or more repos, given as (repo_name, completed_timestamp) pairs
+def repo_cache_key(kind, *repo_stamps):
+    return make_cache_key(kind, *(f'{repo_name.lower()}@{completed_timestamp}' for repo_name, completed_timestamp in repo_stamps))
+
+
+def get_catalog_version():
+    cache.add(CATALOG_VERSION_KEY, 1, None)
+    return cache.get(CATALOG_VERSION_KEY, 1)
+
+
+# Called by the mining tasks when the set of mined repos or any repo's data changes
+def bump_catalog_version():
+    cache.add(CATALOG_VERSION_KEY, 1, None)
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # The key was evicted between the add and the incr
+        cache.set(CATALOG_VERSION_KEY, 2, None)
+
+
+# Key of a listing result for a given query string under the current catalog version
+def listing_cache_key(query_dict):
+    return make_cache_key('listing', get_catalog_version(), sorted(query_dict.lists()))
+
+
+# Return the cached value under key, building (and caching) it on a miss
+def get_or_build(key, build, timeout=REPO_PAGE_CACHE_SECONDS):
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
+
+
+# This process's facet index. Only ever replaced, never modified, so requests
+# holding the previous one keep a consistent snapshot
+_facet_index = None
+
+
+def get_facet_index():
+    global _facet_index
+    version = get_catalog_version()
+    facet_index = _facet_index
+    if (facet_index is None or facet_index.version != version or
+            datetime.utcnow() - facet_index.built_at > FACET_INDEX_MAX_AGE):
+        facet_index = FacetIndex(load_facet_index_cards(), version)
+        _facet_index = facet_index
+    return facet_index
+
+
+# Drop what was cached for a repo at its previous completed_timestamp and make
+# every listing recompute. Called by the tasks once a repo's new data is saved.
+# Pass catalog_changed=False when nothing a listing shows has changed (e.g. an
+# update that found no new pulls), so the listings and facet indexes are kept
+def invalidate_repo_cache(repo_name, previous_completed_timestamp=None, catalog_changed=True):
+    if previous_completed_timestamp is not None:
+        stamp = (repo_name, previous_completed_timestamp)
+        cache.delete_many([repo_cache_key('repo_page', stamp), repo_cache_key('repo_table', stamp)])
+    if catalog_changed:
+        bump_catalog_version()
@@ -0,0 +1,176 @@
+from base64 import b64encode
+import calendar
+import datetime
+import zlib
+
+import numpy as np
+from django.db import models
+
+
+# Every encoded series starts with this header so we can tell it apart from
+# rows still holding the old comma separated ListTextField text
+TIMESTAMP_SERIES_HEADER = b'TS1'
+LEGACY_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+# Convert a datetime (naive datetimes are taken to be UTC), a legacy
+# "YYYY-MM-DD HH:MM:SS" string or a number into integer epoch seconds
+def to_epoch_seconds(value):
+    if isinstance(value, datetime.datetime):
+        return calendar.timegm(value.utctimetuple())
+    if isinstance(value, str):
+        return calendar.timegm(datetime.datetime.strptime(value, LEGACY_DATE_FORMAT).utctimetuple())
+    return int(value)
+
+
+# Sort the epochs, store the first one followed by the gaps between neighbours,
+# and compress. Pull timestamps are dense, so the gaps compress very well
+def encode_timestamps(epochs):
+    epochs = np.sort(np.asarray(epochs, dtype='<i8'))
+    deltas = np.diff(np.concatenate((np.zeros(1, dtype='<i8'), epochs)))
+    return TIMESTAMP_SERIES_HEADER + zlib.compress(deltas.astype('<i8').tobytes())
+
+
+def decode_timestamps(encoded):
+    encoded = bytes(encoded)
+    if not encoded:
+        return np.empty(0, dtype='<i8')
+
+    if not encoded.startswith(TIMESTAMP_SERIES_HEADER):
+        # Legacy ListTextField value, e.g. "2019-01-01 10:00:00,2019-01-02 11:00:00"
+        text = encoded.decode('utf-8')
+        return np.sort(np.array([to_epoch_seconds(item) for item in text.split(',') if item], dtype='<i8'))
+
+    deltas = np.frombuffer(zlib.decompress(encoded[len(TIMESTAMP_SERIES_HEADER):]), dtype='<i8')
+    return np.cumsum(deltas, dtype='<i8')
+
+
+'''
+TimestampSeries
+
+A sorted series of UTC timestamps, stored as epoch seconds. Values loaded
+from the database stay encoded until something actually reads them, so
+fetching a MinedRepo never pays for decoding its timestamp lists.
+'''
+class TimestampSeries(object):
+    def __init__(self, values=(), encoded=None):
+        self._encoded = encoded
+        self._array = None if encoded is not None else np.sort(
+            np.array([to_epoch_seconds(value) for value in values], dtype='<i8'))
+
+    @classmethod
+    def from_epochs(cls, epochs):
+        series = cls()
+        series._array = np.sort(np.asarray(epochs, dtype='<i8'))
+        return series
+
+    # The epochs as a sorted int64 NumPy array, decoded on first use
+    @property
+    def array(self):
+        if self._array is None:
+            self._array = decode_timestamps(self._encoded)
+        return self._array
+
+    def to_datetime64(self):
+        return self.array.astype('datetime64[s]')
+
+    def to_datetimes(self):
+        return [datetime.datetime.utcfromtimestamp(int(epoch)) for epoch in self.array]
+
+    def append(self, value):
+        epoch = to_epoch_seconds(value)
+        self._array = np.insert(self.array, np.searchsorted(self.array, epoch), epoch)
+        self._encoded = None
+
+    # Remove one occurrence of value, if present
+    def remove(self, value):
+        epoch = to_epoch_seconds(value)
+        index = np.searchsorted(self.array, epoch)
+        if index < len(self.array) and self.array[index] == epoch:
+            self._array = np.delete(self.array, index)
+            self._encoded = None
+
+    def encode(self):
+        if self._encoded is None:
+            self._encoded = encode_timestamps(self.array)
+        return self._encoded
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        return iter(self.to_datetimes())
+
+    def __eq__(self, other):
+        if isinstance(other, TimestampSeries):
+            return np.array_equal(self.array, other.array)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"<TimestampSeries: {len(self)} timestamps>"
+
+
+'''
+TimestampSeriesBuilder
+
+Collects epoch seconds one at a time, packing them into int64 NumPy chunks
+as it goes, so building a series of n timestamps costs 8 bytes per entry
+instead of one Python datetime object each.
+'''
+class TimestampSeriesBuilder(object):
+    def __init__(self, chunk_size=10000):
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._pending = []
+
+    def add(self, value):
+        self._pending.append(to_epoch_seconds(value))
+        if len(self._pending) >= self.chunk_size:
+            self._flush()
+
+    def _flush(self):
+        if self._pending:
+            self._chunks.append(np.array(self._pending, dtype='<i8'))
+            self._pending = []
+
+    def build(self):
+        self._flush()
+        if not self._chunks:
+            return TimestampSeries()
+        return TimestampSeries.from_epochs(np.concatenate(self._chunks))
+
+
+'''
+TimestampSeriesField
+
+A binary column holding a TimestampSeries. Accepts a TimestampSeries, or any
+iterable of datetimes / epoch seconds, and always reads back a TimestampSeries.
+'''
+class TimestampSeriesField(models.BinaryField):
+    def from_db_value(self, value, expression, connection, *args):
+        if value is None:
+            return TimestampSeries()
+        return TimestampSeries(encoded=bytes(value))
+
+    def to_python(self, value):
+        if isinstance(value, TimestampSeries):
+            return value
+        if value is None:
+            return TimestampSeries()
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return TimestampSeries(encoded=bytes(value))
+        if isinstance(value, str):
+            # Serialized (base64) form, see value_to_string
+            return TimestampSeries(encoded=bytes(super(TimestampSeriesField, self).to_python(value)))
+        return TimestampSeries(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if value is not None:
+            value = self.to_python(value).encode()
+        return super(TimestampSeriesField, self).get_db_prep_value(value, connection, prepared)
+
+    def value_to_string(self, obj):
+        return b64encode(self.to_python(self.value_from_object(obj)).encode()).decode('ascii')
+
+    def get_default(self):
+        return TimestampSeries()
@@ -8,6 +8,7 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from github import Github # Import PyGithub for mining data
 from .filters import *
+from .validation import validate_mining_request
 
 
 class FeedbackForm(forms.Form):
@@ -23,49 +24,11 @@ class MiningRequestForm(forms.Form):
     email                   = forms.BooleanField(required=False,
                                                  label="Send Me Email Notifications About This Request")
 
-    # Function used for validating the mining request form 
+    # Function used for validating the mining request form. See validation.py:
+    # one (cached) GitHub call and a few indexed lookups at most
     def clean_repo_name(self):
         repo_name = self.cleaned_data['repo_name'].lower()  # This is the repo name we will be looking at 
-        valid_repo = re.compile('^(((\w+)[-]*)\w+)+/+((\w+)([-]|[.])*)+\w+$') # Regex that defines a proper repo name 
-        mining_requests = list(MiningRequest.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
-        mined_repos = list(MinedRepo.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
-        queued_repos = list(QueuedMiningRequest.objects.values_list("repo_name", flat=True))
-        black_listed_requests = list(BlacklistedMiningRequest.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
-        mongo_repo = find_repo_main_page(repo_name)
-        errors = [] # A list for holding validation errors 
-
-        # Repo must match regex
-        if not valid_repo.fullmatch(repo_name):
-            errors.append('Repository must of the form "repo/name".')
-
-        # If it matches the regex, it must exist on github 
-        if isinstance(find_repo_main_page(repo_name), Exception) and valid_repo.fullmatch(repo_name):
-            errors.append("That repository does not exist on GitHub.")
-
-        # The repo cannot have already been mined 
-        if  repo_name in mined_repos:
-            errors.append("That repository has already been mined.")
-
-        # The repo cannot have already been requested and hasn't already been mined 
-        elif repo_name in mining_requests:
-            errors.append("This repository has already been requested.")
-
-        # The repo cannot currently be mining
-        elif repo_name in queued_repos:
-            errors.append("This repository is currently being mined.")
-
-        # The repo cannot be blacklisted
-        elif repo_name in black_listed_requests:
-            errors.append("This repository has been blacklisted by the Administrator.")
-
-        # (if it exists, and matches valid repo regex) the repo cannot have 0 pull requests 
-        if not isinstance(find_repo_main_page(repo_name), Exception) and valid_repo.fullmatch(repo_name):
-            batches = batchify(repo_name)
-            
-            # If there are no batches, thats a problem!
-            if len(batches) == 0:
-                errors.append("This repository has no pull requests!")
-
+        errors = validate_mining_request(repo_name) # A list for holding validation errors 
 
         # Raise any errors found 
         if errors != []:
@@ -73,6 +36,7 @@ class MiningRequestForm(forms.Form):
         
         return repo_name
 
+
 class SignupForm(UserCreationForm):
     email = forms.EmailField(max_length=200, help_text='Required')
     class Meta:
@@ -92,14 +56,21 @@ class LoginForm(forms.Form):
         return username
 
 
+# Labels of the activity buckets of the facet index, in the order they are shown
+ACTIVITY_LABELS = {"month": "Pushed this month", "year": "Pushed this year", "older": "Pushed over a year ago"}
+ACTIVITY_ORDER = ["month", "year", "older"]
+
+
 class Filter(forms.Form):
     search = forms.CharField(max_length=120, required=False, 
-        label="Search", widget = forms.TextInput(attrs={'placeholder':'Search For Repositories', 'class': 'filter-input'}))
+        label="Search", widget = forms.TextInput(attrs={'placeholder':'Search For Repositories', 'class': 'filter-input',
+                                                        'list': 'repo-suggestions', 'autocomplete': 'off'}))
 
+    # The choices are filled in by __init__, so importing this module touches no database
     languages = forms.MultipleChoiceField(
         required= False,
         widget  = forms.CheckboxSelectMultiple,
-        choices = [tuple((item, item)) for item in get_language_list_from_mongo()]
+        choices = []
     )
 
     min_pull_requests = forms.IntegerField(required=False,
@@ -115,14 +86,29 @@ class Filter(forms.Form):
     )
 
     # The form must be initialized by passing in the languages every time.
-    # This ensures the language checkboxes are up to date all the time 
-    def __init__(self, languages, *args, **kwargs):
+    # This ensures the language checkboxes are up to date all the time.
+    # Licenses and activity are optional, their checkboxes only show when given.
+    # Every facet is passed as a list of (value, count) tuples
+    def __init__(self, languages, *args, licenses=(), activity=(), **kwargs):
         super(Filter, self).__init__(*args, **kwargs)
         self.fields['languages'] = forms.MultipleChoiceField(
                                         required= False,
                                         widget  = forms.CheckboxSelectMultiple,
                                         choices = [tuple((language[0], f'{language[0]} ({language[1]})')) for language in languages]
                                     )
+        if licenses:
+            self.fields['licenses'] = forms.MultipleChoiceField(
+                                        required= False,
+                                        widget  = forms.CheckboxSelectMultiple,
+                                        choices = [tuple((license[0], f'{license[0]} ({license[1]})')) for license in licenses]
+                                    )
+        if activity:
+            self.fields['activity'] = forms.MultipleChoiceField(
+                                        required= False,
+                                        widget  = forms.CheckboxSelectMultiple,
+                                        choices = [tuple((bucket[0], f'{ACTIVITY_LABELS.get(bucket[0], bucket[0])} ({bucket[1]})'))
+                                                   for bucket in sorted(activity, key=lambda bucket: ACTIVITY_ORDER.index(bucket[0]))]
+                                    )
 
     def selected_languages_labels(self):
         return [label for value, label in self.fields['languages'].choices if value in self['languages'].value()]
\ No newline at end of file
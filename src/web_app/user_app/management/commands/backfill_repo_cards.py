@@ -0,0 +1,46 @@
+# Build the listing card of every mined repo that has no up to date one.
+#
+# Mining a repo saves its card (see tasks.finalize_mined_repo), so only repos
+# mined before cards existed, or before the current CARD_VERSION, need this.
+# Run it once after deploying code that bumps CARD_VERSION:
+#
+#   python manage.py backfill_repo_cards
+#
+# Cards are built from the landing pages already stored in mongo, so GitHub is
+# never asked for anything. Repos with no landing page are reported and skipped.
+
+from django.core.management.base import BaseCommand
+from mining_scripts.mining import find_mined_repo_main_page
+from mining_scripts.repo_cards import get_repo_cards, save_repo_card, CARD_VERSION
+from user_app.models import MinedRepo
+from user_app.caching import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = "Build the repo card of every mined repo whose card is missing or outdated (or of every repo with --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild every card, not only missing or outdated ones")
+
+    def handle(self, *args, **options):
+        mined_repos = MinedRepo.objects.only('repo_name', 'num_pulls', 'completed_timestamp')
+        current = set()
+        if not options['all']:
+            current = set(card["_id"] for card in get_repo_cards(mined_repos.values_list('repo_name', flat=True))
+                          if card.get("card_version") == CARD_VERSION)
+
+        built = 0
+        for mined_repo in mined_repos.iterator():
+            if mined_repo.repo_name.lower() in current:
+                continue
+            landing_page = find_mined_repo_main_page(mined_repo.repo_name)
+            if landing_page is None:
+                self.stderr.write(f"{mined_repo.repo_name} has no landing page, skipped")
+                continue
+            save_repo_card(mined_repo.repo_name, landing_page, mined_repo.num_pulls, str(mined_repo.completed_timestamp))
+            built += 1
+
+        # New cards change the listing and its facet index, which are kept per catalog version
+        if built:
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f"Built the cards of {built} repos"))
@@ -0,0 +1,54 @@
+# Re-render the stored charts of mined repos from their metrics state.
+#
+# The charts used to be stored as opy.plot divs in the *_html columns of
+# MinedRepo; they now live as plotly JSON in the *_chart_json columns. Repos
+# mined before that change have empty chart columns once the schema is
+# migrated, and show no charts until this command has run:
+#
+#   python manage.py makemigrations user_app && python manage.py migrate
+#   python manage.py rerender_charts
+#
+# Charts are built from the repo's metrics state (or, if it has none yet, from
+# the pulls already stored in mongo), so GitHub is never asked for anything.
+
+from django.core.management.base import BaseCommand
+from mining_scripts.mining import pull_requests, get_canonical_repo_name
+from mining_scripts.metrics import load_repo_metrics, save_repo_metrics, compute_metrics_from_pulls, METRIC_PULL_FIELDS
+from mining_scripts.visualizationModelExtraction import produce_metric_charts
+from user_app.models import MinedRepo
+from user_app.caching import invalidate_repo_cache
+from user_app.tasks import save_mined_repo_visualization_data
+import re
+
+
+CHART_FIELDS = ("bar_chart_json", "pull_line_chart_json", "contribution_line_chart_json")
+
+
+class Command(BaseCommand):
+    help = "Re-render the charts of mined repos whose charts are missing (or of every repo with --all)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-render every mined repo, not only those without charts")
+
+    def handle(self, *args, **options):
+        mined_repos = MinedRepo.objects.all()
+        rendered = 0
+        for mined_repo in mined_repos.iterator():
+            if not options['all'] and all(getattr(mined_repo, field) for field in CHART_FIELDS):
+                continue
+
+            full_name = get_canonical_repo_name(mined_repo.repo_name) or mined_repo.repo_name
+            metrics = load_repo_metrics(full_name)
+            if metrics is None:
+                pulls = pull_requests.find({"url": {"$regex": re.escape(f"/repos/{full_name}/pulls/"), "$options": "i"}},
+                                           METRIC_PULL_FIELDS)
+                metrics = compute_metrics_from_pulls(pulls)
+                save_repo_metrics(full_name, metrics)
+
+            previous_completed_timestamp = mined_repo.completed_timestamp
+            save_mined_repo_visualization_data(mined_repo.repo_name, produce_metric_charts(metrics), mined_repo)
+            invalidate_repo_cache(mined_repo.repo_name, previous_completed_timestamp)
+            rendered += 1
+            self.stdout.write(f"Re-rendered the charts of {mined_repo.repo_name}")
+
+        self.stdout.write(self.style.SUCCESS(f"Re-rendered the charts of {rendered} repos"))
@@ -1,9 +1,9 @@
 from django.db import models
-from django_mysql.models import ListTextField
+from .fields import TimestampSeriesField
 from django.core.validators import MinValueValidator
 
 class MiningRequest(models.Model):
-    repo_name               = models.CharField(max_length=240, null=False, blank=False)
+    repo_name               = models.CharField(max_length=240, null=False, blank=False, db_index=True)
     requested_by            = models.CharField(max_length=240, null=False, blank=False)
     email                   = models.EmailField(null=False, blank=False)
     send_email              = models.BooleanField()
@@ -16,14 +16,14 @@ class MiningRequest(models.Model):
 
 
 class QueuedMiningRequest(models.Model):
-    repo_name               = models.CharField(max_length=240, null=False, blank=False)
+    repo_name               = models.CharField(max_length=240, null=False, blank=False, db_index=True)
     requested_by            = models.CharField(max_length=240, null=False, blank=False)
     timestamp               = models.DateTimeField(auto_now_add=True)
     requested_timestamp     = models.DateTimeField(auto_now_add=False)
     send_email              = models.BooleanField()
 
 class BlacklistedMiningRequest(models.Model):
-    repo_name               = models.CharField(max_length=240, null=False, blank=False)
+    repo_name               = models.CharField(max_length=240, null=False, blank=False, db_index=True)
     requested_by            = models.CharField(max_length=240, null=False, blank=False)
     timestamp               = models.DateTimeField(auto_now_add=True)
     updated                 = models.DateTimeField(auto_now=True)
@@ -32,20 +32,20 @@ class BlacklistedMiningRequest(models.Model):
         return f"{self.repo_name}, {self.timestamp}, {self.updated}"
 
 class MinedRepo(models.Model):
-    repo_name                    = models.CharField(max_length=240, null=False, blank=False)
+    repo_name                    = models.CharField(max_length=240, null=False, blank=False, db_index=True)
     requested_by                 = models.CharField(max_length=240, null=False, blank=False)
     send_email                   = models.BooleanField()
     num_pulls                    = models.IntegerField(validators=[MinValueValidator(0)])
     num_closed_merged_pulls      = models.IntegerField(validators=[MinValueValidator(0)])
     num_closed_unmerged_pulls    = models.IntegerField(validators=[MinValueValidator(0)])
     num_open_pulls               = models.IntegerField(validators=[MinValueValidator(0)])
-    created_at_list              = ListTextField(base_field=models.CharField(max_length=240))
-    closed_at_list               = ListTextField(base_field=models.CharField(max_length=240))
-    merged_at_list               = ListTextField(base_field=models.CharField(max_length=240))
+    created_at_list              = TimestampSeriesField()
+    closed_at_list               = TimestampSeriesField()
+    merged_at_list               = TimestampSeriesField()
     num_newcomer_labels          = models.IntegerField(validators=[MinValueValidator(0)])
-    bar_chart_html               = models.TextField()
-    pull_line_chart_html         = models.TextField()
-    contribution_line_chart_html = models.TextField()
+    bar_chart_json               = models.TextField()
+    pull_line_chart_json         = models.TextField()
+    contribution_line_chart_json = models.TextField()
     completed_timestamp          = models.DateTimeField(auto_now_add=True)
     accepted_timestamp           = models.DateTimeField(auto_now_add=False)
     requested_timestamp          = models.DateTimeField(auto_now_add=False)
@@ -3,12 +3,20 @@ from __future__ import absolute_import, unicode_literals
 from web_app.celery import app
 from celery.utils.log import get_task_logger
 from celery.result import AsyncResult
+from celery.exceptions import Retry
 from celery.task.control import revoke
 from mining_scripts.mining import *
 from mining_scripts.send_email import *
 from github import GithubException
 from django.db import transaction
+from django.conf import settings
 from mining_scripts.batchify import *
+from mining_scripts.metrics import (load_repo_metrics, save_repo_metrics, clear_applied_pulls, parse_github_timestamp,
+                                    format_github_timestamp, METRIC_PULL_FIELDS)
+from mining_scripts.repo_cards import save_repo_card
+from mining_scripts.github_cache import get_github_repo, check_rate_limit, seconds_until_rate_limit_reset, RATE_LIMIT_EXCEPTIONS
+from mining_scripts.connections import github_client, mongo_client
+from user_app.caching import invalidate_repo_cache
 import time 
 from datetime import datetime
 import json
@@ -27,12 +35,7 @@ except AppRegistryNotReady:
     import django
     django.setup()
 
-if os.getpid() == 0:
-    # Initial connection by parent process
-    client = MongoClient('localhost', 27017) # Where are we connecting
-else: 
-    # No need to reconnect if we are connected
-    client = MongoClient('localhost', 27017, connect=False)
+client = mongo_client() # Where are we connecting (on first use, so it is safe to fork after this)
 
 db = client.backend_db # The specific mongo database we are working with 
 
@@ -42,23 +45,21 @@ pull_requests = db.pullRequests # collection for storing all pull requests for a
 
 pull_batches = db.pullBatches
 
-g = Github(GITHUB_TOKEN, per_page=100) # authorization for the github API 
+g = github_client() # authorization for the github API
 logger = get_task_logger(__name__)
 
 class CeleryTaskFailedError(Exception):
     pass
 
 
-def all_tasks_completed(repo_name):
-    total_batches = db.pullBatches.find_one({"repo":repo_name})["total_batches"]
-    collected_batches = db.pullBatches.find_one({"repo":repo_name})["collected_batches"]
-    attempted_batches = db.pullBatches.find_one({"repo":repo_name})["attempted_batches"]
-    
-    if collected_batches == total_batches:
-        return True
-        
-    else:
-        return False 
+# The pullBatches documents of repos with nothing left to mine: every batch collected,
+# or, with settings.FINALIZE_ON_PARTIAL_DATA, collected or given up on (dead). Repos
+# still waiting on a dead batch never match, so the beat poll does not keep visiting them
+def finished_batches_condition():
+    finished = "$collected_batches"
+    if settings.FINALIZE_ON_PARTIAL_DATA:
+        finished = {"$add": ["$collected_batches", {"$ifNull": ["$dead_batches", 0]}]}
+    return {"$expr": {"$gte": [finished, "$total_batches"]}}
 
 def initialize_batch_json(batch_list, repo_name):
     total_batches = len(batch_list)
@@ -68,15 +69,36 @@ def initialize_batch_json(batch_list, repo_name):
         "total_batches": total_batches,
         "collected_batches": 0,
         "attempted_batches": 0,
+        # Progress counters, see mining.record_batch_progress
+        "total_pulls": sum(len(batch) for batch in batch_list),
+        "pulls_fetched": 0,
+        "pages_fetched": 0,
+        "api_calls": 0,
+        "rate_samples": [],
+        "started_at": time.time(),
     }
-    db.pullBatches.update_one(batch_json_data, {"$set": batch_json_data}, upsert=True)
+    # Keyed on the repo alone, so mining a repo again starts its counters over
+    db.pullBatches.replace_one({"repo": f"{repo_name}"}, batch_json_data, upsert=True)
+    forget_failed_batches(f"{repo_name}")
+
+
 
+# Tasks that talk to GitHub never sleep through a rate limit: they re-enqueue
+# themselves for the moment it resets (max_retries=None, they wait as often as
+# needed) and free their worker slot for finalization and email in the meantime
+def retry_after_rate_limit(task, exception):
+    countdown = seconds_until_rate_limit_reset(exception)
+    logger.info('RATE LIMIT REACHED! {0} is rescheduled in {1} seconds.'.format(task.name, countdown))
+    return task.retry(exc=exception, countdown=countdown)
 
 
 # When the admin approves, go call the mining script asynchronously 
-@app.task(bind=True, name='tasks.mine_data_asynchronously')
+@app.task(bind=True, name='tasks.mine_data_asynchronously', max_retries=None)
 def mine_data_asynchronously(self, repo_name, username, user_email, queued_request):    
-    batch_data = batchify(repo_name)
+    try:
+        batch_data = batchify(repo_name)
+    except RATE_LIMIT_EXCEPTIONS as e:
+        raise retry_after_rate_limit(self, e)
     
     # Else, move on to mining the data 
     initialize_batch_json(batch_data, repo_name)
@@ -87,12 +109,28 @@ def mine_data_asynchronously(self, repo_name, username, user_email, queued_reque
     return True 
 
 
-@app.task(name='tasks.mine_pull_request_batch_asynchronously')
-def mine_pull_request_batch_asynchronously(repo_name, job):
-    pulls_batch = get_batch_number(repo_name, job)
-    
-    mine_pulls_batch(pulls_batch, repo_name)
-
+# Mine one batch of a repo. A batch that fails is recorded in failedBatches (see
+# mining.record_failed_batch) and dispatched again by retry_failed_batches, with
+# retried=True so it is not counted as attempted twice
+@app.task(bind=True, name='tasks.mine_pull_request_batch_asynchronously', max_retries=None)
+def mine_pull_request_batch_asynchronously(self, repo_name, job, retried=False):
+    try:
+        pulls_batch = get_batch_number(repo_name, job)
+        return mine_pulls_batch(pulls_batch, repo_name, job, first_attempt=not retried and self.request.retries == 0)
+    except RATE_LIMIT_EXCEPTIONS as e:
+        raise retry_after_rate_limit(self, e)
+    except Exception as e:
+        # The batch could not even be listed (mine_pulls_batch records its own failures)
+        logger.warning('Batch {0} of {1} failed: {2!r}'.format(job, repo_name, e))
+        record_failed_batch(repo_name, job, e)
+        return False
+
+
+# Periodic task: dispatch the failed batches whose backoff has passed
+@app.task(name='tasks.retry_failed_batches')
+def retry_failed_batches():
+    for repo_name, job in claim_failed_batches():
+        mine_pull_request_batch_asynchronously.delay(repo_name, job, retried=True)
     return True
 
 @app.task(name='tasks.update_all_repos')
@@ -105,88 +143,223 @@ def update_all_repos():
     return True 
 
 
-@app.task(name='tasks.update_specific_repo')
-def update_specific_repo(repo_name):
+# Every GitHub request of an update (the repo and the changed pulls) is made before
+# anything is written, so an update stopped by the rate limit simply runs again later
+@app.task(bind=True, name='tasks.update_specific_repo', max_retries=None)
+def update_specific_repo(self, repo_name):
+    try:
+        check_rate_limit()
+        pygit_repo = get_github_repo(repo_name, fresh=True)
+    except RATE_LIMIT_EXCEPTIONS as e:
+        raise retry_after_rate_limit(self, e)
+
     delete_specific_repo_from_repo_collection(repo_name)
-    pygit_repo = g.get_repo(repo_name)
     mine_repo_page(pygit_repo) # update the landing page
-    document = pull_batches.find_one({"repo":repo_name})
+    ensure_mongo_indexes()
+
+    metrics = load_repo_metrics(pygit_repo.full_name)
+
+    # Repos mined before we kept a metrics state need one pass over their stored pulls to build it
+    if metrics is None:
+        save_mined_repo_visualization_data(repo_name, extract_pull_request_model_data(pygit_repo))
+        metrics = load_repo_metrics(pygit_repo.full_name)
+
+    # Walk the pulls from most to least recently updated, and stop as soon as
+    # we reach the ones we already folded into the metrics. Only this delta is fetched:
+    # updated_at and url come with the list pages, whereas raw_data would fetch each
+    # whole pull, so it is only read for the pulls actually folded in below
+    updated_since = metrics.updated_since()
+    changed_pulls = []
+    try:
+        for pygit_pull_obj in pygit_repo.get_pulls('all', sort='updated', direction='desc'):
+            updated_at = format_github_timestamp(pygit_pull_obj.updated_at)
+            if updated_since is not None and updated_at < updated_since:
+                break
+            changed_pulls.append((updated_at, pygit_pull_obj))
+    except RATE_LIMIT_EXCEPTIONS as e:
+        raise retry_after_rate_limit(self, e)
 
-    # get a list of all the current pull requests 
-    num_current_pulls = count_all_pull_requests_from_a_specifc_repo(repo_name)
-
-    # get a paginated list of all the pull requests
-    pulls = pygit_repo.get_pulls('all')
-
-    # get the number of pulls that we can see now
-    total_pulls_as_of_now = 0
-    for item in pulls:
-        total_pulls_as_of_now += 1
-
-    # DO NOT CONTINUE IF THERE AREN'T NEW PULLS
-    if total_pulls_as_of_now == num_current_pulls:
-        mined_repo_model_obj = MinedRepo.objects.get(repo_name=repo_name)
+    mined_repo_model_obj = MinedRepo.objects.get(repo_name=repo_name)
+    previous_completed_timestamp = mined_repo_model_obj.completed_timestamp
+    old_counts = dict(metrics.counts)
+    old_pull_series = metrics.pull_series()
+    old_contributors_series = metrics.contributors_series()
+    folded_pulls = []
+
+    # Fold the oldest change in first so last_updated_at only ever moves forward. A
+    # change the metrics already hold (their update stopped before storing its
+    # pulls) is not folded in again, its pull is only stored. The timestamp lists
+    # are saved after the pulls, so they still need every change
+    applied_pulls = {}
+    resumed = False
+    try:
+        for updated_at, pygit_pull_obj in reversed(changed_pulls):
+            previous_pull = find_specific_pull(pygit_pull_obj.url, METRIC_PULL_FIELDS)
+            already_applied = metrics.was_applied(pygit_pull_obj.url, updated_at)
+            resumed = resumed or already_applied
+
+            if previous_pull is not None:
+                if previous_pull['updated_at'] == updated_at:
+                    continue
+                if not already_applied:
+                    metrics.remove(previous_pull)
+                remove_pull_from_timestamp_lists(mined_repo_model_obj, previous_pull)
+
+            pull = pygit_pull_obj.raw_data
+            if not already_applied:
+                metrics.add(pull)
+            add_pull_to_timestamp_lists(mined_repo_model_obj, pull)
+            applied_pulls[pygit_pull_obj.url] = updated_at
+            folded_pulls.append(pygit_pull_obj)
+    except RATE_LIMIT_EXCEPTIONS as e:
+        raise retry_after_rate_limit(self, e)
+
+    # DO NOT RE-RENDER ANYTHING IF THERE AREN'T NEW OR CHANGED PULLS. Nothing a
+    # listing shows has changed either, so the listings and facet indexes are kept
+    if not folded_pulls:
         mined_repo_model_obj.completed_timestamp = str(timezone.now())
         mined_repo_model_obj.save()
+        save_repo_card(repo_name, pygit_repo.raw_data, mined_repo_model_obj.num_pulls, 
+                       str(mined_repo_model_obj.completed_timestamp))
+        invalidate_repo_cache(repo_name, previous_completed_timestamp, catalog_changed=False)
         return 
 
-    # IF THERE ARE NEW PULLS, MINE THEM...
-    new_pygit_pulls_list = [pulls[item] for item in range(num_current_pulls, total_pulls_as_of_now)]
+    metrics.applied_pulls = applied_pulls
+    save_repo_metrics(pygit_repo.full_name, metrics)
 
-    for pygit_pull_obj in new_pygit_pulls_list:
+    # Store the changed pulls only once the metrics holding them are saved. A pull
+    # stored first would look already folded to an update retried after a crash,
+    # and its change would never reach the counts and charts
+    for pygit_pull_obj in folded_pulls:
         mine_specific_pull(pygit_pull_obj)
+    clear_applied_pulls(pygit_repo.full_name)
+
+    # Only re-render the charts whose underlying data actually moved. A resumed
+    # update cannot tell, since its metrics were saved before the charts were
+    stale_charts = []
+    if resumed or metrics.counts != old_counts:
+        stale_charts.append("bar_chart_json")
+    if resumed or metrics.pull_series() != old_pull_series:
+        stale_charts.append("line_chart_json")
+    if resumed or metrics.contributors_series() != old_contributors_series:
+        stale_charts.append("contribution_line_chart_json")
+
+    visualization_data = dict(metrics.counts)
+    visualization_data.update(produce_metric_charts(metrics, stale_charts))
+    save_mined_repo_visualization_data(repo_name, visualization_data, mined_repo_model_obj)
+    save_repo_card(repo_name, pygit_repo.raw_data, mined_repo_model_obj.num_pulls, 
+                   str(mined_repo_model_obj.completed_timestamp))
+    invalidate_repo_cache(repo_name, previous_completed_timestamp)
+
+    return True 
 
-    mined_repo_model_obj = MinedRepo.objects.get(repo_name=repo_name)
 
-    visualization_data = extract_pull_request_model_data(pygit_repo)
-
-    mined_repo_model_obj.num_pulls=visualization_data["num_pulls"]
-    mined_repo_model_obj.num_closed_merged_pulls=visualization_data["num_closed_merged_pulls"]
-    mined_repo_model_obj.num_closed_unmerged_pulls=visualization_data["num_closed_unmerged_pulls"]
-    mined_repo_model_obj.num_open_pulls=visualization_data["num_open_pulls"]
-    mined_repo_model_obj.created_at_list=visualization_data["created_at_list"]
-    mined_repo_model_obj.closed_at_list=visualization_data["closed_at_list"]
-    mined_repo_model_obj.merged_at_list=visualization_data["merged_at_list"]
-    mined_repo_model_obj.num_newcomer_labels=visualization_data["num_newcomer_labels"]
-    mined_repo_model_obj.bar_chart_html=visualization_data["bar_chart"]
-    mined_repo_model_obj.pull_line_chart_html=visualization_data["line_chart"]
-    mined_repo_model_obj.contribution_line_chart_html = visualization_data['contribution_line_chart_html']
+# Store whichever counts, timestamp lists and charts are in visualization_data on the
+# repo's MinedRepo object, and mark it as freshly mined
+def save_mined_repo_visualization_data(repo_name, visualization_data, mined_repo_model_obj=None):
+    if mined_repo_model_obj is None:
+        mined_repo_model_obj = MinedRepo.objects.get(repo_name=repo_name)
+
+    fields = {
+        "num_pulls": "num_pulls",
+        "num_closed_merged_pulls": "num_closed_merged_pulls",
+        "num_closed_unmerged_pulls": "num_closed_unmerged_pulls",
+        "num_open_pulls": "num_open_pulls",
+        "num_newcomer_labels": "num_newcomer_labels",
+        "created_at_list": "created_at_list",
+        "closed_at_list": "closed_at_list",
+        "merged_at_list": "merged_at_list",
+        "bar_chart_json": "bar_chart_json",
+        "line_chart_json": "pull_line_chart_json",
+        "contribution_line_chart_json": "contribution_line_chart_json",
+    }
+    for key, field in fields.items():
+        if key in visualization_data:
+            setattr(mined_repo_model_obj, field, visualization_data[key])
+
     mined_repo_model_obj.completed_timestamp = str(timezone.now())
     mined_repo_model_obj.save()
+    return mined_repo_model_obj
 
-    return True 
 
+# The MinedRepo timestamp lists are TimestampSeries, holding one entry per pull
+def add_pull_to_timestamp_lists(mined_repo_model_obj, pull):
+    for key, field in (("created_at", "created_at_list"), ("closed_at", "closed_at_list"), ("merged_at", "merged_at_list")):
+        if pull.get(key) is not None:
+            getattr(mined_repo_model_obj, field).append(parse_github_timestamp(pull[key]))
+
+
+def remove_pull_from_timestamp_lists(mined_repo_model_obj, pull):
+    for key, field in (("created_at", "created_at_list"), ("closed_at", "closed_at_list"), ("merged_at", "merged_at_list")):
+        if pull.get(key) is not None:
+            getattr(mined_repo_model_obj, field).remove(parse_github_timestamp(pull[key]))
+
+
+# How long a finalization claim is honoured before another poll may take the repo over
+FINALIZATION_CLAIM_TIMEOUT_SECONDS = 60 * 60
+
+
+# Atomically mark a fully mined repo as being finalized, so overlapping beat polls
+# never fan out the same repo twice. Returns False if someone else already claimed it.
+def claim_repo_for_finalization(repo_name):
+    now = time.time()
+    claimed = pull_batches.find_one_and_update(
+        {"repo": repo_name, "$or": [{"finalizing_since": {"$exists": False}},
+                                    {"finalizing_since": None},
+                                    {"finalizing_since": {"$lt": now - FINALIZATION_CLAIM_TIMEOUT_SECONDS}}]},
+        {"$set": {"finalizing_since": now}}
+    )
+    return claimed is not None
+
+
+def release_finalization_claim(repo_name):
+    pull_batches.update_one({"repo": repo_name}, {"$set": {"finalizing_since": None}})
+
+
+# Periodic task: find every repo whose batches have all been collected and fan each one
+# out as its own finalize_mined_repo task, so finalization runs on as many cores as we have workers
 @app.task(name='tasks.visualize_repo_data')
 def visualize_repo_data():
     mined_repos = list(MinedRepo.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
-    batched_repos = [batch['repo'] for batch in pull_batches.find({}, {"_id":0, "repo":1})]
+    batched_repos = [batch['repo'] for batch in pull_batches.find(finished_batches_condition(), {"_id":0, "repo":1})]
     repos_needing_rendering = np.setdiff1d(batched_repos,mined_repos)
-    if len(repos_needing_rendering) != 0:
-        for repo_name in repos_needing_rendering:
-            if all_tasks_completed(repo_name) == False:
-                continue
-
-            # Done allow us to continue if we hit the request rate 
-            if rate_limit_is_reached():
-                wait_for_request_rate_reset()
-
-            pygit_repo = g.get_repo(repo_name)
-
-            # mine and store the main page josn
-            mine_repo_page(pygit_repo)
-            
-            username = getattr(QueuedMiningRequest.objects.get(repo_name=repo_name), "requested_by")
-            # It is finished, time to visualize it 
-            logger.info('Extracting visualization data for {0}'.format(repo_name))
-            visualization_data = extract_pull_request_model_data(g.get_repo(repo_name))
-            logger.info('Successfully extracted visualization data for {0}'.format(repo_name))
-
-            logger.info('Creating MinedRepo database object for {0}'.format(repo_name))
+    for repo_name in repos_needing_rendering:
+        if claim_repo_for_finalization(repo_name):
+            finalize_mined_repo.delay(str(repo_name))
+
+    return True
+
+
+# Extract, render and store a single fully mined repo. The MinedRepo row and the
+# removal of its QueuedMiningRequest are written together in one transaction.
+@app.task(bind=True, name='tasks.finalize_mined_repo', max_retries=None)
+def finalize_mined_repo(self, repo_name):
+    try:
+        # Don't wait for the rate limit here, come back once it resets. The repo
+        # stays claimed meanwhile, so the beat poll does not dispatch it again
+        try:
+            check_rate_limit()
+            pygit_repo = get_github_repo(repo_name, fresh=True)
+        except RATE_LIMIT_EXCEPTIONS as e:
+            raise retry_after_rate_limit(self, e)
+
+        # mine and store the main page josn
+        mine_repo_page(pygit_repo)
+
+        # It is finished, time to visualize it 
+        logger.info('Extracting visualization data for {0}'.format(repo_name))
+        visualization_data = extract_pull_request_model_data(pygit_repo)
+        logger.info('Successfully extracted visualization data for {0}'.format(repo_name))
+
+        logger.info('Creating MinedRepo database object for {0}'.format(repo_name))
+        with transaction.atomic():
+            queued_request = QueuedMiningRequest.objects.select_for_update().get(repo_name=repo_name)
+
             # Add this repo to the mined repos table
-            mined_repo = MinedRepo(
+            mined_repo = MinedRepo.objects.create(
                 repo_name=repo_name,
-                requested_by=username,
-                send_email = getattr(QueuedMiningRequest.objects.get(repo_name=repo_name), "send_email"),
+                requested_by=queued_request.requested_by,
+                send_email=queued_request.send_email,
                 num_pulls=visualization_data["num_pulls"],
                 num_closed_merged_pulls=visualization_data["num_closed_merged_pulls"],
                 num_closed_unmerged_pulls=visualization_data["num_closed_unmerged_pulls"],
@@ -195,17 +368,36 @@ def visualize_repo_data():
                 closed_at_list=visualization_data["closed_at_list"],
                 merged_at_list=visualization_data["merged_at_list"],
                 num_newcomer_labels=visualization_data["num_newcomer_labels"],
-                bar_chart_html=visualization_data["bar_chart"],
-                pull_line_chart_html=visualization_data["line_chart"],
-                contribution_line_chart_html = visualization_data['contribution_line_chart_html'],
-                accepted_timestamp=getattr(QueuedMiningRequest.objects.get(repo_name=repo_name), "timestamp"),
-                requested_timestamp=getattr(QueuedMiningRequest.objects.get(repo_name=repo_name), "requested_timestamp")
+                bar_chart_json=visualization_data["bar_chart_json"],
+                pull_line_chart_json=visualization_data["line_chart_json"],
+                contribution_line_chart_json = visualization_data['contribution_line_chart_json'],
+                accepted_timestamp=queued_request.timestamp,
+                requested_timestamp=queued_request.requested_timestamp
             ) 
+            queued_request.delete()
+        logger.info('Successfully created MinedRepo database object for {0}'.format(repo_name))
+
+        # Denormalize what the listing pages show into the repo's card
+        save_repo_card(repo_name, pygit_repo.raw_data, mined_repo.num_pulls, str(mined_repo.completed_timestamp))
+        invalidate_repo_cache(repo_name)
 
-            mined_repo.save()
-            logger.info('Successfully created MinedRepo database object for {0}'.format(repo_name))
+    except Retry:
+        raise
 
-            QueuedMiningRequest.objects.get(repo_name=repo_name).delete()
+    except Exception:
+        # Let the next visualize_repo_data poll pick this repo up again
+        release_finalization_claim(repo_name)
+        raise
 
-            if getattr(MinedRepo.objects.get(repo_name=repo_name), "send_email") == True:
-                send_confirmation_email(repo_name, username, getattr(User.objects.get(username=username), 'email'))
+    if mined_repo.send_email == True:
+        username = mined_repo.requested_by
+        send_confirmation_email_asynchronously.delay(repo_name, username, getattr(User.objects.get(username=username), 'email'))
+
+    return True
+
+
+# Emails go out from their own queue, so they never wait behind mining or rendering
+@app.task(name='tasks.send_confirmation_email')
+def send_confirmation_email_asynchronously(repo_name, username, user_email):
+    send_confirmation_email(repo_name, username, user_email)
+    return True
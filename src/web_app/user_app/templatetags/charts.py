@@ -0,0 +1,36 @@
+# Template tags for rendering the plotly charts we store on each MinedRepo.
+# Charts are persisted as compact {"data": [...], "layout": {...}} JSON, and
+# plotly.js itself is served once (and cached) by the plotly_js view.
+
+from django import template
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+import plotly
+
+register = template.Library()
+
+
+# Emit the single <script> tag that loads plotly.js. The plotly version is part
+# of the url so browsers can cache the bundle forever and still pick up upgrades
+@register.simple_tag
+def plotly_js():
+    return format_html('<script src="{}?v={}"></script>', reverse('plotly_js'), plotly.__version__)
+
+
+# Render a stored chart into a div named div_id. The JSON is embedded in an
+# inline script, so escape anything that could close the script tag early
+@register.simple_tag
+def plotly_chart(figure_json, div_id):
+    if not figure_json:
+        return ''
+
+    figure_json = (figure_json.replace('<', '\\u003c')
+                              .replace('>', '\\u003e')
+                              .replace('&', '\\u0026'))
+    return format_html(
+        '<div id="{0}" class="plotly-graph-div"></div>'
+        '<script>(function() {{ var figure = {1}; '
+        'Plotly.newPlot("{0}", figure.data, figure.layout, {{responsive: true}}); }})();</script>',
+        div_id, mark_safe(figure_json)
+    )
@@ -11,15 +11,40 @@ A file which contains all relevant test suites that ensure the
 integrity of Git-OSS-Um's backend services. 
 '''
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from mining_scripts.send_email import * 
 from mining_scripts.mining import *
 from mining_scripts import config
 from mining_scripts.batchify import *
+from mining_scripts.metrics import *
+from mining_scripts.repo_cards import *
+from mining_scripts.search import *
+from mining_scripts.facet_index import FacetIndex, bitmap_of
+from github import UnknownObjectException
+from mining_scripts.github_cache import (mongo_github_cache_test_init, get_github_repo, get_github_pull_count,
+                                         forget_github_repo, store_entry,
+                                         read_entry, acquire_lock, release_lock, lock_id, RateLimitExhausted,
+                                         seconds_until_rate_limit_reset, RateBudget)
+from mining_scripts.progress import (mongo_progress_test_init, get_mining_progress, summarize_progress,
+                                     estimate_seconds_left, rolling_rate)
 from .filters import *
 from .models import *
+from .caching import *
+from .visualizations import COMPARISON_ROWS, build_repo_table_context
+from .views import repo_page_etag, repo_page_last_modified
+from .forms import Filter, MiningRequestForm
+from .validation import validate_mining_request, get_request_state_error, probe_github_repo
+from django.conf import settings
+from .templatetags.charts import plotly_chart
+from .fields import TimestampSeries, TimestampSeriesBuilder, encode_timestamps, decode_timestamps
 from django.utils import timezone
+from datetime import timedelta
+from django.http import QueryDict, HttpRequest
+from django.core.cache import cache
+from urllib.parse import urlencode
+from django.contrib.auth.models import User
 import re
+import time
 
 
 # Setup all variables for testing, ensure mongod is running in the background 
@@ -52,7 +77,10 @@ LANGUAGES_LIST = [PYGIT_TEST_REPO_4.language, PYGIT_TEST_REPO_5.language, PYGIT_
 
 
 mongo_mining_test_init() # Tell the mining script NOT to use the production mongo database
-mongo_filter_test_init() # Tell the filter system NOT to use the production mongo database 
+mongo_metrics_test_init() # Tell the metrics NOT to use the production mongo database
+mongo_repo_cards_test_init() # Tell the repo cards NOT to use the production mongo database
+mongo_github_cache_test_init() # Tell the GitHub repo cache NOT to use the production mongo database
+mongo_progress_test_init() # Tell the mining progress reports NOT to use the production mongo database
 
 
 # Utility function for testing 
@@ -230,6 +258,30 @@ class RepoLandingPageTestSuite(TestCase):
         test_repo_found = find_repo_main_page(TEST_REPO_3)
         self.assertEqual(test_repo_found['owner']['login'], PYGIT_TEST_REPO_3.owner.login)
 
+    def test_mining_repo_page_indexes_canonical_name(self):
+        mine_repo_page(PYGIT_TEST_REPO)
+        self.assertEqual(get_canonical_repo_name(TEST_REPO.upper()), PYGIT_TEST_REPO.full_name)
+
+    def test_canonical_name_of_unmined_repo_is_none(self):
+        self.assertIsNone(get_canonical_repo_name(TEST_REPO))
+
+    def test_find_mined_repo_main_page_any_capitalization(self):
+        mine_repo_page(PYGIT_TEST_REPO)
+        test_repo_found = find_mined_repo_main_page(TEST_REPO.swapcase())
+        self.assertEqual(test_repo_found["full_name"], PYGIT_TEST_REPO.full_name)
+
+    def test_find_mined_repo_main_page_backfills_index(self):
+        mine_repo_page(PYGIT_TEST_REPO)
+        delete_repo_name_from_index(TEST_REPO)
+        test_repo_found = find_mined_repo_main_page(TEST_REPO)
+        self.assertEqual(test_repo_found["full_name"], PYGIT_TEST_REPO.full_name)
+        self.assertEqual(DB.repoNames.count_documents({}), ONE)
+
+    def test_deleting_repo_removes_it_from_name_index(self):
+        mine_repo_page(PYGIT_TEST_REPO)
+        delete_specific_repo_from_repo_collection(TEST_REPO)
+        self.assertIsNone(find_mined_repo_main_page(TEST_REPO))
+
 
 # Test suite for pull requests 
 class PullRequestTestSuite(TestCase):
@@ -713,6 +765,17 @@ class Singleton(object):
 
         return cls._instance
 
+# Filter the stored repo cards the way the listing does: the query string goes through
+# the Filter form into filter_facet_index, on a facet index built from the cards.
+# Returns the set of matching repo names
+def filter_repo_cards(query_string):
+    query_dict = QueryDict(query_string)
+    index = FacetIndex(load_facet_index_cards())
+    filter_form = Filter(index.counts("language"), query_dict,
+                         licenses=index.counts("license"), activity=index.counts("activity"))
+    bitmap = filter_facet_index(index, filter_form, query_dict)
+    return set(index.page(bitmap, "name", None, max(index.count(bitmap), ONE))[ZERO])
+
 class FilterTestSuite(TestCase):
     def setUp(self):
         # The first call initializes singleton, every additional call
@@ -720,162 +783,124 @@ class FilterTestSuite(TestCase):
         if REPOS_COLLECTION.count_documents({}) == 0:
             print(Singleton().setUpBool)
 
+        # The filters only ever return mined repos, read from the repo cards
+        for pygit_repo in (PYGIT_TEST_REPO_4, PYGIT_TEST_REPO_5, PYGIT_TEST_REPO_6, PYGIT_TEST_REPO_7):
+            num_pulls = count_all_pull_requests_from_a_specifc_repo(pygit_repo.full_name)
+            save_repo_card(pygit_repo.full_name.lower(), find_mined_repo_main_page(pygit_repo.full_name), num_pulls)
+
     # Make sure that the language list is correct 
     def test_can_get_language_list(self):
-        obtained_languages_list = get_language_list_from_mongo()
+        obtained_languages_list = FacetIndex(load_facet_index_cards()).counts("language")
         for language in obtained_languages_list:
             self.assertTrue(language in LANGUAGES_LIST)
 
     def test_can_filter_by_language_1(self):
         language = PYGIT_TEST_REPO_4.language
-        obtained_repos_by_language = get_repos_list_by_language_filter([language])
+        obtained_repos_by_language = filter_repo_cards(urlencode({"languages": language}))
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in obtained_repos_by_language)
 
     def test_can_filter_by_language_2(self):
         language = PYGIT_TEST_REPO_5.language
-        obtained_repos_by_language = get_repos_list_by_language_filter([language])
+        obtained_repos_by_language = filter_repo_cards(urlencode({"languages": language}))
         self.assertTrue(PYGIT_TEST_REPO_5.full_name.lower() in obtained_repos_by_language)
 
     def test_can_filter_by_language_3(self):
         language = PYGIT_TEST_REPO_6.language
-        obtained_repos_by_language = get_repos_list_by_language_filter([language])
+        obtained_repos_by_language = filter_repo_cards(urlencode({"languages": language}))
         self.assertTrue(PYGIT_TEST_REPO_6.full_name.lower() in obtained_repos_by_language)
 
     def test_can_filter_by_language_4(self):
         language = PYGIT_TEST_REPO_7.language
-        obtained_repos_by_language = get_repos_list_by_language_filter([language])
+        obtained_repos_by_language = filter_repo_cards(urlencode({"languages": language}))
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in obtained_repos_by_language)
 
     def test_can_filter_by_pulls_less_than_1(self):
         num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_4.full_name) for item in batch]) 
-        filtered_repos = get_repos_list_by_pulls_less_than_filter(num_pulls + 1)
+        filtered_repos = filter_repo_cards(f"max_pull_requests={num_pulls + 1}")
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_pulls_less_than_2(self):
-        num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_5.full_name) for item in batch]) 
-        filtered_repos = get_repos_list_by_pulls_less_than_filter(num_pulls + 1)
-        self.assertTrue(PYGIT_TEST_REPO_5.full_name.lower() in filtered_repos)
-
-    def test_can_filter_by_pulls_less_than_3(self):
-        num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_6.full_name) for item in batch]) 
-        filtered_repos = get_repos_list_by_pulls_less_than_filter(num_pulls + 1)
-        self.assertTrue(PYGIT_TEST_REPO_6.full_name.lower() in filtered_repos)
-
-    def test_can_filter_by_pulls_less_than_4(self):
         num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_7.full_name) for item in batch]) 
-        filtered_repos = get_repos_list_by_pulls_less_than_filter(num_pulls + 1)
+        filtered_repos = filter_repo_cards(f"max_pull_requests={num_pulls + 1}")
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
-        
+
     def test_can_filter_by_pulls_greater_than_1(self):
         num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_4.full_name) for item in batch]) - 1 
-        filtered_repos = get_repos_list_by_pulls_greater_than_filter(num_pulls - 1)
+        filtered_repos = filter_repo_cards(f"min_pull_requests={num_pulls - 1}")
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_pulls_greater_than_2(self):
-        num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_5.full_name) for item in batch]) - 1
-        filtered_repos = get_repos_list_by_pulls_greater_than_filter(num_pulls - 1)
-        self.assertTrue(PYGIT_TEST_REPO_5.full_name.lower() in filtered_repos)
-
-    def test_can_filter_by_pulls_greater_than_3(self):
-        num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_6.full_name) for item in batch]) - 1
-        filtered_repos = get_repos_list_by_pulls_greater_than_filter(num_pulls - 1)
-        self.assertTrue(PYGIT_TEST_REPO_6.full_name.lower() in filtered_repos)
-
-    def test_can_filter_by_pulls_greater_than_4(self):
         num_pulls = len([item for batch in batchify(PYGIT_TEST_REPO_7.full_name) for item in batch]) - 1
-        filtered_repos = get_repos_list_by_pulls_greater_than_filter(num_pulls - 1)
+        filtered_repos = filter_repo_cards(f"min_pull_requests={num_pulls - 1}")
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_pulls_bounded_1(self):
-        lower_bound = 0
-        upper_bound = 1000
-        filtered_repos = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
+        filtered_repos = filter_repo_cards("min_pull_requests=0&max_pull_requests=1000")
         self.assertTrue(len(filtered_repos) == 4)
 
     def test_can_filter_by_pulls_bounded_2(self):
-        lower_bound = 0
-        upper_bound = 1
-        filtered_repos = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
+        filtered_repos = filter_repo_cards("min_pull_requests=0&max_pull_requests=1")
         self.assertTrue(len(filtered_repos) == 0)
 
     def test_can_filter_by_pulls_bounded_3(self):
-        lower_bound = 100
-        upper_bound = 100000
-        filtered_repos = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
+        filtered_repos = filter_repo_cards("min_pull_requests=100&max_pull_requests=100000")
         self.assertTrue(len(filtered_repos) == 1)
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_pulls_bounded_4(self):
-        lower_bound = 0
-        upper_bound = 10
-        filtered_repos = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
+        filtered_repos = filter_repo_cards("min_pull_requests=0&max_pull_requests=10")
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_has_wiki_1(self):
-        filtered_repos = get_repos_list_has_wiki_filter(True)
+        filtered_repos = filter_repo_cards("has_wiki=True")
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() not in filtered_repos)
 
     def test_can_filter_by_has_wiki_2(self):
-        filtered_repos = get_repos_list_has_wiki_filter(True)
+        filtered_repos = filter_repo_cards("has_wiki=True")
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_search_1(self):
-        filtered_repos = get_repos_search_query_filter(PYGIT_TEST_REPO_4.full_name.lower()[0:5])
+        filtered_repos = filter_repo_cards(urlencode({"search": PYGIT_TEST_REPO_4.full_name.lower()[0:5]}))
         self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_search_2(self):
-        filtered_repos = get_repos_search_query_filter(PYGIT_TEST_REPO_5.full_name.lower()[0:5])
+        filtered_repos = filter_repo_cards(urlencode({"search": PYGIT_TEST_REPO_5.full_name.lower()[0:5]}))
         self.assertTrue(PYGIT_TEST_REPO_5.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_search_3(self):
-        filtered_repos = get_repos_search_query_filter(PYGIT_TEST_REPO_6.full_name.lower()[0:5])
+        filtered_repos = filter_repo_cards(urlencode({"search": PYGIT_TEST_REPO_6.full_name.lower()[0:5]}))
         self.assertTrue(PYGIT_TEST_REPO_6.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_search_4(self):
-        filtered_repos = get_repos_search_query_filter(PYGIT_TEST_REPO_7.full_name.lower()[0:5])
+        filtered_repos = filter_repo_cards(urlencode({"search": PYGIT_TEST_REPO_7.full_name.lower()[0:5]}))
         self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
 
     def test_can_filter_by_search_5(self):
-        filtered_repos = get_repos_search_query_filter("ThisShould/Return-Nothing")
+        filtered_repos = filter_repo_cards(urlencode({"search": "ThisShould/Return-Nothing"}))
         self.assertTrue(len(filtered_repos) == 0)
 
     def test_can_filter_using_multiple_criteria_1(self):
-        lower_bound = 100
-        upper_bound = 1000
-        filtered_repos_bounded = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
-        filtered_repos_search = get_repos_search_query_filter(PYGIT_TEST_REPO_4.full_name.lower()[0:5])
-        filtered_repos_wiki = get_repos_list_has_wiki_filter(False)
-        filtered_repos_combined = get_filtered_repos_list([filtered_repos_bounded,
-                                                           filtered_repos_search, 
-                                                           filtered_repos_wiki]
-                                                         )
-        self.assertTrue(len(filtered_repos_combined) == 1)
-        self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos_combined)
+        search = PYGIT_TEST_REPO_4.full_name.lower()[0:5]
+        filtered_repos = filter_repo_cards(f"min_pull_requests=100&max_pull_requests=1000&search={search}")
+        self.assertTrue(len(filtered_repos) == 1)
+        self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() in filtered_repos)
 
     def test_can_filter_using_multiple_criteria_2(self):
-        lower_bound = 0
-        upper_bound = 1000
-        filtered_repos_bounded = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
-        filtered_repos_search = get_repos_search_query_filter(PYGIT_TEST_REPO_2.full_name.lower()[0:5])
-        filtered_repos_wiki = get_repos_list_has_wiki_filter(True)
-        filtered_repos_combined = get_filtered_repos_list([filtered_repos_bounded,
-                                                           filtered_repos_search, 
-                                                           filtered_repos_wiki]
-                                                         )
-        self.assertTrue(len(filtered_repos_combined) == 0)
+        search = PYGIT_TEST_REPO_2.full_name.lower()[0:5]
+        filtered_repos = filter_repo_cards(f"min_pull_requests=0&max_pull_requests=1000&search={search}&has_wiki=True")
+        self.assertTrue(len(filtered_repos) == 0)
 
     def test_can_filter_using_multiple_criteria_3(self):
-        lower_bound = 0
-        upper_bound = 1000
-        filtered_repos_bounded = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
-        filtered_repos_search = get_repos_search_query_filter(PYGIT_TEST_REPO_7.full_name.lower()[0:5])
-        filtered_repos_wiki = get_repos_list_has_wiki_filter(True)
-        filtered_repos_combined = get_filtered_repos_list([filtered_repos_bounded,
-                                                           filtered_repos_search, 
-                                                           filtered_repos_wiki]
-                                                         )
-        self.assertTrue(len(filtered_repos_combined) == 1)
-        self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos_combined)
+        search = PYGIT_TEST_REPO_7.full_name.lower()[0:5]
+        filtered_repos = filter_repo_cards(f"min_pull_requests=0&max_pull_requests=1000&search={search}&has_wiki=True")
+        self.assertTrue(len(filtered_repos) == 1)
+        self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
+
+    def test_can_filter_using_multiple_criteria_4(self):
+        language = PYGIT_TEST_REPO_7.language
+        filtered_repos = filter_repo_cards(f"languages={language}&min_pull_requests=0&max_pull_requests=10&has_wiki=True")
+        self.assertTrue(PYGIT_TEST_REPO_7.full_name.lower() in filtered_repos)
+        self.assertTrue(PYGIT_TEST_REPO_4.full_name.lower() not in filtered_repos)
 
 class ModelTestSuite(TestCase):
 
@@ -895,8 +920,8 @@ class ModelTestSuite(TestCase):
             closed_at_list=visualization_data["closed_at_list"],
             merged_at_list=visualization_data["merged_at_list"],
             num_newcomer_labels=visualization_data["num_newcomer_labels"],
-            bar_chart_html=visualization_data["bar_chart"],
-            pull_line_chart_html=visualization_data["line_chart"],
+            bar_chart_json=visualization_data["bar_chart_json"],
+            pull_line_chart_json=visualization_data["line_chart_json"],
             accepted_timestamp=timezone.now(),
             requested_timestamp=timezone.now()
         ) 
@@ -910,12 +935,12 @@ class ModelTestSuite(TestCase):
         self.assertEqual(getattr(sql_obj, "num_closed_merged_pulls"), visualization_data['num_closed_merged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_closed_unmerged_pulls"), visualization_data['num_closed_unmerged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_open_pulls"), visualization_data['num_open_pulls'])
-        self.assertEqual(getattr(sql_obj, "created_at_list"), visualization_data['created_at_list'])
-        self.assertEqual(getattr(sql_obj, "closed_at_list"), visualization_data['closed_at_list'])
-        self.assertEqual(getattr(sql_obj, "merged_at_list"), visualization_data['merged_at_list'])
+        self.assertEqual(getattr(sql_obj, "created_at_list").to_datetimes(), sorted(visualization_data['created_at_list']))
+        self.assertEqual(getattr(sql_obj, "closed_at_list").to_datetimes(), sorted(visualization_data['closed_at_list']))
+        self.assertEqual(getattr(sql_obj, "merged_at_list").to_datetimes(), sorted(visualization_data['merged_at_list']))
         self.assertEqual(getattr(sql_obj, "num_newcomer_labels"), visualization_data['num_newcomer_labels'])
-        self.assertEqual(getattr(sql_obj, "bar_chart_html"), visualization_data['bar_chart'])
-        self.assertEqual(getattr(sql_obj, "pull_line_chart_html"), visualization_data['line_chart'])
+        self.assertEqual(getattr(sql_obj, "bar_chart_json"), visualization_data['bar_chart_json'])
+        self.assertEqual(getattr(sql_obj, "pull_line_chart_json"), visualization_data['line_chart_json'])
 
     def test_visualization_extraction_2(self):
         visualization_data = extract_pull_request_model_data(PYGIT_TEST_REPO_5)
@@ -930,8 +955,8 @@ class ModelTestSuite(TestCase):
             closed_at_list=visualization_data["closed_at_list"],
             merged_at_list=visualization_data["merged_at_list"],
             num_newcomer_labels=visualization_data["num_newcomer_labels"],
-            bar_chart_html=visualization_data["bar_chart"],
-            pull_line_chart_html=visualization_data["line_chart"],
+            bar_chart_json=visualization_data["bar_chart_json"],
+            pull_line_chart_json=visualization_data["line_chart_json"],
             accepted_timestamp=timezone.now(),
             requested_timestamp=timezone.now()
         ) 
@@ -945,12 +970,12 @@ class ModelTestSuite(TestCase):
         self.assertEqual(getattr(sql_obj, "num_closed_merged_pulls"), visualization_data['num_closed_merged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_closed_unmerged_pulls"), visualization_data['num_closed_unmerged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_open_pulls"), visualization_data['num_open_pulls'])
-        self.assertEqual(getattr(sql_obj, "created_at_list"), visualization_data['created_at_list'])
-        self.assertEqual(getattr(sql_obj, "closed_at_list"), visualization_data['closed_at_list'])
-        self.assertEqual(getattr(sql_obj, "merged_at_list"), visualization_data['merged_at_list'])
+        self.assertEqual(getattr(sql_obj, "created_at_list").to_datetimes(), sorted(visualization_data['created_at_list']))
+        self.assertEqual(getattr(sql_obj, "closed_at_list").to_datetimes(), sorted(visualization_data['closed_at_list']))
+        self.assertEqual(getattr(sql_obj, "merged_at_list").to_datetimes(), sorted(visualization_data['merged_at_list']))
         self.assertEqual(getattr(sql_obj, "num_newcomer_labels"), visualization_data['num_newcomer_labels'])
-        self.assertEqual(getattr(sql_obj, "bar_chart_html"), visualization_data['bar_chart'])
-        self.assertEqual(getattr(sql_obj, "pull_line_chart_html"), visualization_data['line_chart'])
+        self.assertEqual(getattr(sql_obj, "bar_chart_json"), visualization_data['bar_chart_json'])
+        self.assertEqual(getattr(sql_obj, "pull_line_chart_json"), visualization_data['line_chart_json'])
 
     def test_visualization_extraction_3(self):
         visualization_data = extract_pull_request_model_data(PYGIT_TEST_REPO_6)
@@ -965,8 +990,8 @@ class ModelTestSuite(TestCase):
             closed_at_list=visualization_data["closed_at_list"],
             merged_at_list=visualization_data["merged_at_list"],
             num_newcomer_labels=visualization_data["num_newcomer_labels"],
-            bar_chart_html=visualization_data["bar_chart"],
-            pull_line_chart_html=visualization_data["line_chart"],
+            bar_chart_json=visualization_data["bar_chart_json"],
+            pull_line_chart_json=visualization_data["line_chart_json"],
             accepted_timestamp=timezone.now(),
             requested_timestamp=timezone.now()
         ) 
@@ -980,12 +1005,12 @@ class ModelTestSuite(TestCase):
         self.assertEqual(getattr(sql_obj, "num_closed_merged_pulls"), visualization_data['num_closed_merged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_closed_unmerged_pulls"), visualization_data['num_closed_unmerged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_open_pulls"), visualization_data['num_open_pulls'])
-        self.assertEqual(getattr(sql_obj, "created_at_list"), visualization_data['created_at_list'])
-        self.assertEqual(getattr(sql_obj, "closed_at_list"), visualization_data['closed_at_list'])
-        self.assertEqual(getattr(sql_obj, "merged_at_list"), visualization_data['merged_at_list'])
+        self.assertEqual(getattr(sql_obj, "created_at_list").to_datetimes(), sorted(visualization_data['created_at_list']))
+        self.assertEqual(getattr(sql_obj, "closed_at_list").to_datetimes(), sorted(visualization_data['closed_at_list']))
+        self.assertEqual(getattr(sql_obj, "merged_at_list").to_datetimes(), sorted(visualization_data['merged_at_list']))
         self.assertEqual(getattr(sql_obj, "num_newcomer_labels"), visualization_data['num_newcomer_labels'])
-        self.assertEqual(getattr(sql_obj, "bar_chart_html"), visualization_data['bar_chart'])
-        self.assertEqual(getattr(sql_obj, "pull_line_chart_html"), visualization_data['line_chart'])
+        self.assertEqual(getattr(sql_obj, "bar_chart_json"), visualization_data['bar_chart_json'])
+        self.assertEqual(getattr(sql_obj, "pull_line_chart_json"), visualization_data['line_chart_json'])
 
     def test_visualization_extraction_4(self):
         visualization_data = extract_pull_request_model_data(PYGIT_TEST_REPO_7)
@@ -1000,8 +1025,8 @@ class ModelTestSuite(TestCase):
             closed_at_list=visualization_data["closed_at_list"],
             merged_at_list=visualization_data["merged_at_list"],
             num_newcomer_labels=visualization_data["num_newcomer_labels"],
-            bar_chart_html=visualization_data["bar_chart"],
-            pull_line_chart_html=visualization_data["line_chart"],
+            bar_chart_json=visualization_data["bar_chart_json"],
+            pull_line_chart_json=visualization_data["line_chart_json"],
             accepted_timestamp=timezone.now(),
             requested_timestamp=timezone.now()
         ) 
@@ -1015,9 +1040,893 @@ class ModelTestSuite(TestCase):
         self.assertEqual(getattr(sql_obj, "num_closed_merged_pulls"), visualization_data['num_closed_merged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_closed_unmerged_pulls"), visualization_data['num_closed_unmerged_pulls'])
         self.assertEqual(getattr(sql_obj, "num_open_pulls"), visualization_data['num_open_pulls'])
-        self.assertEqual(getattr(sql_obj, "created_at_list"), visualization_data['created_at_list'])
-        self.assertEqual(getattr(sql_obj, "closed_at_list"), visualization_data['closed_at_list'])
-        self.assertEqual(getattr(sql_obj, "merged_at_list"), visualization_data['merged_at_list'])
+        self.assertEqual(getattr(sql_obj, "created_at_list").to_datetimes(), sorted(visualization_data['created_at_list']))
+        self.assertEqual(getattr(sql_obj, "closed_at_list").to_datetimes(), sorted(visualization_data['closed_at_list']))
+        self.assertEqual(getattr(sql_obj, "merged_at_list").to_datetimes(), sorted(visualization_data['merged_at_list']))
         self.assertEqual(getattr(sql_obj, "num_newcomer_labels"), visualization_data['num_newcomer_labels'])
-        self.assertEqual(getattr(sql_obj, "bar_chart_html"), visualization_data['bar_chart'])
-        self.assertEqual(getattr(sql_obj, "pull_line_chart_html"), visualization_data['line_chart'])
+        self.assertEqual(getattr(sql_obj, "bar_chart_json"), visualization_data['bar_chart_json'])
+        self.assertEqual(getattr(sql_obj, "pull_line_chart_json"), visualization_data['line_chart_json'])
+
+
+# Test suite for the plotly_chart template tag that renders stored chart json
+class ChartTemplateTagTestSuite(TestCase):
+    def test_empty_chart_renders_nothing(self):
+        self.assertEqual(plotly_chart('', 'bar_chart'), '')
+
+    def test_chart_renders_div_and_script(self):
+        html = plotly_chart('{"data":[],"layout":{}}', 'bar_chart')
+        self.assertTrue('<div id="bar_chart"' in html)
+        self.assertTrue('Plotly.newPlot("bar_chart"' in html)
+
+    def test_chart_json_cannot_close_script_tag(self):
+        html = plotly_chart('{"data":[{"name":"</script>"}],"layout":{}}', 'bar_chart')
+        self.assertEqual(html.count('</script>'), ONE)
+
+
+# Build a minimal pull request json for the metrics test suite
+def make_test_pull(url, login, created_at, state="open", closed_at=None, merged_at=None, 
+                   updated_at=None, labels=()):
+    return {
+        "url": url,
+        "user": {"login": login},
+        "state": state,
+        "created_at": created_at,
+        "closed_at": closed_at,
+        "merged_at": merged_at,
+        "updated_at": updated_at or closed_at or created_at,
+        "labels": [{"name": label} for label in labels],
+    }
+
+
+# Test suite for folding pull requests in and out of a repo's metrics
+class PullRequestMetricsTestSuite(TestCase):
+    def setUp(self):
+        self.open_pull = make_test_pull("pulls/1", "alice", "2019-01-05T10:00:00Z")
+        self.merged_pull = make_test_pull("pulls/2", "bob", "2019-01-20T10:00:00Z", state="closed",
+                                          closed_at="2019-03-02T10:00:00Z", merged_at="2019-03-02T10:00:00Z")
+        self.closed_pull = make_test_pull("pulls/3", "alice", "2019-03-07T10:00:00Z", state="closed",
+                                          closed_at="2019-03-08T10:00:00Z", labels=["good first issue"])
+
+    def test_github_timestamps_round_trip(self):
+        # updated_at of a listed PyGithub pull is a datetime, stored pulls keep GitHub's string
+        self.assertEqual(format_github_timestamp(parse_github_timestamp("2019-03-07T10:00:00Z")), "2019-03-07T10:00:00Z")
+
+    def test_counts(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull, self.closed_pull])
+        self.assertEqual(metrics.counts["num_pulls"], THREE)
+        self.assertEqual(metrics.counts["num_open_pulls"], ONE)
+        self.assertEqual(metrics.counts["num_closed_merged_pulls"], ONE)
+        self.assertEqual(metrics.counts["num_closed_unmerged_pulls"], ONE)
+        self.assertEqual(metrics.counts["num_newcomer_labels"], ONE)
+
+    def test_monthly_series_are_zero_filled(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull, self.closed_pull])
+        self.assertEqual(metrics.monthly_series("created"), (["2019-01", "2019-02", "2019-03"], [TWO, ZERO, ONE]))
+        self.assertEqual(metrics.monthly_series("closed"), (["2019-03"], [TWO]))
+
+    def test_contributors_are_distinct_per_month(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull, self.closed_pull])
+        self.assertEqual(metrics.contributors_series(), (["2019-01", "2019-02", "2019-03"], [TWO, ZERO, ONE]))
+
+    def test_remove_undoes_add(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull])
+        metrics.add(self.closed_pull)
+        metrics.remove(self.closed_pull)
+        expected = compute_metrics_from_pulls([self.open_pull, self.merged_pull])
+        self.assertEqual(metrics.counts, expected.counts)
+        self.assertEqual(metrics.months, expected.months)
+
+    def test_changed_pull_matches_full_recompute(self):
+        merged_open_pull = make_test_pull("pulls/1", "alice", "2019-01-05T10:00:00Z", state="closed",
+                                          closed_at="2019-04-01T10:00:00Z", merged_at="2019-04-01T10:00:00Z")
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull, self.closed_pull])
+        metrics.remove(self.open_pull)
+        metrics.add(merged_open_pull)
+        expected = compute_metrics_from_pulls([merged_open_pull, self.merged_pull, self.closed_pull])
+        self.assertEqual(metrics.counts, expected.counts)
+        self.assertEqual(metrics.pull_series(), expected.pull_series())
+        self.assertEqual(metrics.last_updated_at, "2019-04-01T10:00:00Z")
+
+    def test_can_save_and_load_metrics(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull])
+        save_repo_metrics("Test/Metrics", metrics)
+        loaded = load_repo_metrics("test/metrics")
+        delete_repo_metrics("test/metrics")
+        self.assertEqual(loaded.counts, metrics.counts)
+        self.assertEqual(loaded.months, metrics.months)
+        self.assertIsNone(load_repo_metrics("test/metrics"))
+
+    # An update retried after saving its metrics, but before storing its pulls, must
+    # see which changes are already folded in and walk back far enough to store them
+    def test_applied_pulls_survive_until_cleared(self):
+        metrics = compute_metrics_from_pulls([self.open_pull, self.merged_pull, self.closed_pull])
+        metrics.applied_pulls = {"pulls/2": self.merged_pull["updated_at"]}
+        save_repo_metrics("Test/Metrics", metrics)
+        loaded = load_repo_metrics("test/metrics")
+        self.assertTrue(loaded.was_applied("pulls/2", self.merged_pull["updated_at"]))
+        self.assertFalse(loaded.was_applied("pulls/2", "2019-05-01T10:00:00Z"))
+        self.assertEqual(loaded.updated_since(), self.merged_pull["updated_at"])
+
+        clear_applied_pulls("test/metrics")
+        loaded = load_repo_metrics("test/metrics")
+        delete_repo_metrics("test/metrics")
+        self.assertFalse(loaded.was_applied("pulls/2", self.merged_pull["updated_at"]))
+        self.assertEqual(loaded.updated_since(), self.closed_pull["updated_at"])
+
+
+# Test suite for the compact timestamp storage used by MinedRepo
+class TimestampSeriesTestSuite(TestCase):
+    def setUp(self):
+        self.timestamps = [datetime(2019, 3, 1, 12, 0, 0), datetime(2019, 1, 5, 8, 30, 0), 
+                           datetime(2019, 2, 14, 23, 59, 59)]
+
+    def test_encode_decode_round_trip(self):
+        series = TimestampSeries(self.timestamps)
+        decoded = TimestampSeries(encoded=series.encode())
+        self.assertEqual(decoded.to_datetimes(), sorted(self.timestamps))
+
+    def test_empty_series_round_trip(self):
+        self.assertEqual(len(decode_timestamps(encode_timestamps([]))), ZERO)
+
+    def test_can_read_legacy_list_text(self):
+        legacy = b"2019-03-01 12:00:00,2019-01-05 08:30:00"
+        self.assertEqual(TimestampSeries(encoded=legacy).to_datetimes(), sorted(self.timestamps[:2]))
+
+    def test_append_and_remove_keep_series_sorted(self):
+        series = TimestampSeries(self.timestamps[:2])
+        series.append(self.timestamps[2])
+        self.assertEqual(series.to_datetimes(), sorted(self.timestamps))
+        series.remove(self.timestamps[0])
+        self.assertEqual(series.to_datetimes(), sorted(self.timestamps[1:]))
+
+    def test_builder_matches_series_across_chunks(self):
+        builder = TimestampSeriesBuilder(chunk_size=TWO)
+        for timestamp in self.timestamps:
+            builder.add(timestamp)
+        self.assertEqual(builder.build(), TimestampSeries(self.timestamps))
+
+    def test_mined_repo_stores_series(self):
+        MinedRepo.objects.create(repo_name="test/series", requested_by="Admin", send_email=False,
+                                 num_pulls=THREE, num_closed_merged_pulls=ZERO, num_closed_unmerged_pulls=ZERO,
+                                 num_open_pulls=THREE, num_newcomer_labels=ZERO,
+                                 created_at_list=self.timestamps, closed_at_list=[], merged_at_list=[],
+                                 accepted_timestamp=timezone.now(), requested_timestamp=timezone.now())
+        sql_obj = MinedRepo.objects.get(repo_name="test/series")
+        self.assertEqual(sql_obj.created_at_list.to_datetimes(), sorted(self.timestamps))
+        self.assertEqual(len(sql_obj.closed_at_list), ZERO)
+
+
+# Build a minimal landing page json for the repo card test suite
+def make_test_landing_page(full_name, language="Python", stars=ZERO, has_wiki=True):
+    return {
+        "full_name": full_name,
+        "owner": {"avatar_url": f"https://avatars.example.com/{full_name.split('/')[0]}"},
+        "language": language,
+        "stargazers_count": stars,
+        "has_wiki": has_wiki,
+    }
+
+
+# Test suite for the denormalized repo cards used by the listing pages
+class RepoCardTestSuite(TestCase):
+    def tearDown(self):
+        delete_all_repo_cards()
+
+    def test_card_is_keyed_by_lowercase_name(self):
+        card = save_repo_card("Owner/Repo", make_test_landing_page("Owner/Repo"), THREE)
+        self.assertEqual(card["_id"], "owner/repo")
+        self.assertEqual(get_repo_cards(["OWNER/REPO"])[ZERO]["num_pulls"], THREE)
+
+    def test_saving_card_twice_replaces_it(self):
+        save_repo_card("owner/repo", make_test_landing_page("owner/repo", stars=ONE), ONE)
+        save_repo_card("owner/repo", make_test_landing_page("owner/repo", stars=TWO), TWO)
+        cards = get_repo_cards(["owner/repo"])
+        self.assertEqual(len(cards), ONE)
+        self.assertEqual(cards[ZERO]["stargazers_count"], TWO)
+
+    def test_get_repo_cards_returns_only_requested_sorted(self):
+        for name in ("owner/c", "owner/a", "owner/b"):
+            save_repo_card(name, make_test_landing_page(name), ONE)
+        cards = get_repo_cards(["owner/c", "owner/a"])
+        self.assertEqual([card["repo_name"] for card in cards], ["owner/a", "owner/c"])
+
+
+# Test suite for the facet index built from the stored repo cards, which follows
+# every card saved, replaced and deleted
+class FacetIndexCardsTestSuite(TestCase):
+    def setUp(self):
+        delete_all_repo_cards()
+
+    def tearDown(self):
+        delete_all_repo_cards()
+
+    def language_counts(self):
+        return FacetIndex(load_facet_index_cards()).counts("language")
+
+    def test_saving_cards_counts_languages(self):
+        save_repo_card("owner/a", make_test_landing_page("owner/a", language="Python"), ONE)
+        save_repo_card("owner/b", make_test_landing_page("owner/b", language="Python", has_wiki=False), ONE)
+        save_repo_card("owner/c", make_test_landing_page("owner/c", language="C++"), ONE)
+        self.assertEqual(self.language_counts(), [("C++", ONE), ("Python", TWO)])
+
+    def test_replacing_card_moves_its_count(self):
+        save_repo_card("owner/a", make_test_landing_page("owner/a", language="Python"), ONE)
+        save_repo_card("owner/a", make_test_landing_page("owner/a", language="Go"), ONE)
+        self.assertEqual(self.language_counts(), [("Go", ONE)])
+
+    def test_deleting_card_drops_its_count(self):
+        save_repo_card("owner/a", make_test_landing_page("owner/a", language="Python"), ONE)
+        save_repo_card("owner/b", make_test_landing_page("owner/b", language="Python"), ONE)
+        delete_repo_card("owner/a")
+        self.assertEqual(self.language_counts(), [("Python", ONE)])
+
+    def test_language_filter_only_returns_carded_repos(self):
+        save_repo_card("owner/a", make_test_landing_page("owner/a", language="Go"), ONE)
+        save_repo_card("owner/b", make_test_landing_page("owner/b", language="Python"), ONE)
+        self.assertEqual(filter_repo_cards("languages=Go"), set(["owner/a"]))
+
+
+# Test suite for keyset paging through the repo cards
+class RepoCardPageTestSuite(TestCase):
+    def setUp(self):
+        for stars, name in enumerate(("owner/a", "owner/b", "owner/c", "owner/d", "owner/e")):
+            save_repo_card(name, make_test_landing_page(name, stars=stars % THREE), stars)
+
+    def tearDown(self):
+        delete_all_repo_cards()
+
+    # Follow the cursors from the first page to the last one
+    def read_all_pages(self, sort, page_size):
+        names, after = [], None
+        while True:
+            cards, after = get_repo_cards_page(sort, after, page_size)
+            names.extend(card["_id"] for card in cards)
+            if after is None:
+                return names
+
+    def test_pages_by_name(self):
+        cards, after = get_repo_cards_page("name", None, TWO)
+        self.assertEqual([card["_id"] for card in cards], ["owner/a", "owner/b"])
+        self.assertEqual(self.read_all_pages("name", TWO), ["owner/a", "owner/b", "owner/c", "owner/d", "owner/e"])
+
+    def test_pages_by_stars_break_ties_by_name(self):
+        self.assertEqual(self.read_all_pages("stars", TWO), ["owner/c", "owner/b", "owner/e", "owner/a", "owner/d"])
+
+    def test_pages_by_pulls(self):
+        self.assertEqual(self.read_all_pages("pulls", THREE), ["owner/e", "owner/d", "owner/c", "owner/b", "owner/a"])
+
+    def test_last_page_has_no_cursor(self):
+        cards, after = get_repo_cards_page("name", None, TWO * THREE)
+        self.assertEqual(len(cards), TWO + THREE)
+        self.assertIsNone(after)
+
+    def test_unknown_sort_and_bad_cursor_fall_back(self):
+        cards, after = get_repo_cards_page("bogus", "not-a-cursor", TWO)
+        self.assertEqual([card["_id"] for card in cards], ["owner/a", "owner/b"])
+
+
+# Test suite for the page cache keys and their invalidation
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class PageCacheTestSuite(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_repo_key_changes_with_completed_timestamp(self):
+        self.assertNotEqual(repo_cache_key('repo_page', ("owner/a", "2019-01-01 00:00:00")),
+                            repo_cache_key('repo_page', ("owner/a", "2019-02-01 00:00:00")))
+
+    def test_repo_key_ignores_name_case(self):
+        self.assertEqual(repo_cache_key('repo_page', ("Owner/A", ONE)), repo_cache_key('repo_page', ("owner/a", ONE)))
+
+    def test_get_or_build_only_builds_on_miss(self):
+        calls = []
+        build = lambda: calls.append(ONE) or "page"
+        self.assertEqual(get_or_build("key", build), "page")
+        self.assertEqual(get_or_build("key", build), "page")
+        self.assertEqual(len(calls), ONE)
+
+    def test_bumping_catalog_version_changes_listing_key(self):
+        query = QueryDict("sort=stars")
+        key = listing_cache_key(query)
+        bump_catalog_version()
+        self.assertNotEqual(listing_cache_key(query), key)
+
+    def test_invalidate_repo_cache_drops_old_page(self):
+        stamp = ("owner/a", "2019-01-01 00:00:00")
+        cache.set(repo_cache_key('repo_page', stamp), "page")
+        invalidate_repo_cache("owner/a", stamp[ONE])
+        self.assertIsNone(cache.get(repo_cache_key('repo_page', stamp)))
+
+    def test_unchanged_repo_keeps_the_listings(self):
+        stamp = ("owner/a", "2019-01-01 00:00:00")
+        cache.set(repo_cache_key('repo_page', stamp), "page")
+        version = get_catalog_version()
+        invalidate_repo_cache("owner/a", stamp[ONE], catalog_changed=False)
+        self.assertIsNone(cache.get(repo_cache_key('repo_page', stamp)))
+        self.assertEqual(get_catalog_version(), version)
+
+
+# Test suite for the read-only JSON API and its conditional responses
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class JsonApiTestSuite(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ("owner/a", "owner/b"):
+            MinedRepo.objects.create(repo_name=name, requested_by="Admin", send_email=False,
+                                     num_pulls=THREE, num_closed_merged_pulls=ONE, num_closed_unmerged_pulls=ONE,
+                                     num_open_pulls=ONE, num_newcomer_labels=ZERO,
+                                     created_at_list=[], closed_at_list=[], merged_at_list=[],
+                                     accepted_timestamp=timezone.now(), requested_timestamp=timezone.now())
+            save_repo_card(name, make_test_landing_page(name), THREE)
+
+    def tearDown(self):
+        delete_all_repo_cards()
+
+    def test_repo_detail(self):
+        response = self.client.get("/api/v1/repos/owner/a/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["num_pulls"], THREE)
+        self.assertEqual(response.json()["language"], "Python")
+
+    def test_repo_detail_field_selection(self):
+        response = self.client.get("/api/v1/repos/owner/a/?fields=num_open_pulls")
+        self.assertEqual(response.json(), {"repo_name": "owner/a", "num_open_pulls": ONE})
+
+    def test_unknown_repo_is_404(self):
+        self.assertEqual(self.client.get("/api/v1/repos/owner/missing/").status_code, 404)
+
+    def test_matching_etag_gets_304(self):
+        response = self.client.get("/api/v1/repos/owner/a/")
+        self.assertTrue(response.has_header("Last-Modified"))
+        repeat = self.client.get("/api/v1/repos/owner/a/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_compare_repos(self):
+        response = self.client.get("/api/v1/compare/?repos=owner/b,owner/a&fields=num_pulls")
+        self.assertEqual([repo["repo_name"] for repo in response.json()["results"]], ["owner/b", "owner/a"])
+
+    def test_compare_needs_two_repos(self):
+        self.assertEqual(self.client.get("/api/v1/compare/?repos=owner/a").status_code, 400)
+
+    def test_repo_list(self):
+        response = self.client.get("/api/v1/repos/?page_size=1")
+        self.assertEqual(len(response.json()["results"]), ONE)
+        self.assertIsNotNone(response.json()["next"])
+
+
+# Test suite for the N-way comparison page
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CompareReposTestSuite(TestCase):
+    def test_odd_number_of_name_parts_is_404(self):
+        self.assertEqual(self.client.get("/repos/compare/owner&a&owner/").status_code, 404)
+
+    def test_too_many_repos_is_404(self):
+        pairs = "&".join(f"owner&repo{index}" for index in range(settings.MAX_COMPARED_REPOS + ONE))
+        self.assertEqual(self.client.get(f"/repos/compare/{pairs}/").status_code, 404)
+
+    def test_unmined_repos_are_404(self):
+        self.assertEqual(self.client.get("/repos/compare/owner&a&owner&b&owner&c/").status_code, 404)
+
+    def test_repo_without_landing_page_is_404(self):
+        for name in ("owner/a", "owner/b"):
+            MinedRepo.objects.create(repo_name=name, requested_by="Admin", send_email=False,
+                                     num_pulls=ONE, num_closed_merged_pulls=ZERO, num_closed_unmerged_pulls=ZERO,
+                                     num_open_pulls=ONE, num_newcomer_labels=ZERO,
+                                     created_at_list=[], closed_at_list=[], merged_at_list=[],
+                                     accepted_timestamp=timezone.now(), requested_timestamp=timezone.now())
+        self.assertEqual(self.client.get("/repos/compare/owner&a&owner&b/").status_code, 404)
+
+    def test_renamed_repo_keeps_its_requested_name(self):
+        DB.repos.insert_one(make_test_landing_page("Owner/Renamed"))
+        DB.repoNames.insert_one({"_id": "owner/old-name", "full_name": "Owner/Renamed"})
+        try:
+            landing_pages = find_mined_repo_main_pages(["owner/old-name"])
+            self.assertEqual(landing_pages["owner/old-name"]["full_name"], "Owner/Renamed")
+        finally:
+            DB.repos.delete_many({"full_name": "Owner/Renamed"})
+            DB.repoNames.delete_many({"_id": "owner/old-name"})
+
+    def test_comparison_rows_cover_every_table_field(self):
+        mined_repo = MinedRepo(repo_name="owner/a", num_pulls=THREE, num_closed_merged_pulls=ONE,
+                               num_closed_unmerged_pulls=ONE, num_open_pulls=ONE, completed_timestamp=timezone.now())
+        landing_page = make_test_landing_page("owner/a")
+        landing_page.update({"description": "", "created_at": "2019-01-01T00:00:00Z", "updated_at": "2019-02-01T00:00:00Z",
+                             "clone_url": "", "homepage": None, "license": None, "open_issues": ZERO,
+                             "network_count": ZERO, "subscribers_count": ZERO})
+        table = build_repo_table_context(mined_repo, landing_page)
+        for key, label, tooltip in COMPARISON_ROWS:
+            self.assertTrue(key in table)
+
+
+# Test suite for conditional GETs on the repo detail and comparison pages
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalRepoPageTestSuite(TestCase):
+    def setUp(self):
+        cache.clear()
+        for name in ("owner/a", "owner/b"):
+            MinedRepo.objects.create(repo_name=name, requested_by="Admin", send_email=False,
+                                     num_pulls=ONE, num_closed_merged_pulls=ZERO, num_closed_unmerged_pulls=ZERO,
+                                     num_open_pulls=ONE, num_newcomer_labels=ZERO,
+                                     created_at_list=[], closed_at_list=[], merged_at_list=[],
+                                     accepted_timestamp=timezone.now(), requested_timestamp=timezone.now())
+
+    def etag_of(self, repo_names):
+        return '"%s"' % repo_page_etag(repo_names, HttpRequest())
+
+    def test_detail_page_matching_etag_gets_304(self):
+        response = self.client.get("/repos/owner/a/", HTTP_IF_NONE_MATCH=self.etag_of(["owner/a"]))
+        self.assertEqual(response.status_code, 304)
+
+    def test_compare_page_matching_etag_gets_304(self):
+        response = self.client.get("/repos/compare/owner&a&owner&b/", HTTP_IF_NONE_MATCH=self.etag_of(["owner/a", "owner/b"]))
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_when_repo_is_saved_again(self):
+        etag = self.etag_of(["owner/a"])
+        mined_repo = MinedRepo.objects.get(repo_name="owner/a")
+        mined_repo.completed_timestamp = timezone.now() + timedelta(minutes=ONE)
+        mined_repo.save()
+        self.assertNotEqual(self.etag_of(["owner/a"]), etag)
+
+    def test_unmined_repo_has_no_etag(self):
+        self.assertIsNone(repo_page_etag(["owner/missing"], HttpRequest()))
+
+    def test_etag_differs_per_logged_in_user(self):
+        request = HttpRequest()
+        request.user = User.objects.create_user("viewer", password="password")
+        self.assertNotEqual(repo_page_etag(["owner/a"], request), repo_page_etag(["owner/a"], HttpRequest()))
+
+    def test_logged_in_user_gets_no_last_modified(self):
+        request = HttpRequest()
+        request.user = User.objects.create_user("viewer", password="password")
+        self.assertIsNone(repo_page_last_modified(["owner/a"], request))
+        self.assertIsNotNone(repo_page_last_modified(["owner/a"], HttpRequest()))
+
+    def test_pages_are_private_and_vary_on_cookie(self):
+        response = self.client.get("/repos/owner/a/", HTTP_IF_NONE_MATCH=self.etag_of(["owner/a"]))
+        self.assertIn("private", response["Cache-Control"])
+        self.assertNotIn("public", response["Cache-Control"])
+        self.assertIn("Cookie", response["Vary"])
+
+
+# Test suite for the prefix/trigram repo search
+class RepoSearchTestSuite(TestCase):
+    def setUp(self):
+        save_repo_card("pallets/flask", make_test_landing_page("pallets/flask", stars=THREE), ONE)
+        save_repo_card("scikit-learn/scikit-learn", make_test_landing_page("scikit-learn/scikit-learn", stars=TWO), ONE)
+        save_repo_card("owner/flask-extension", make_test_landing_page("owner/flask-extension", stars=ONE), ONE)
+
+    def tearDown(self):
+        delete_all_repo_cards()
+
+    def search(self, query):
+        return [card["_id"] for card in search_repo_cards(query)]
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search("scik"), ["scikit-learn/scikit-learn"])
+
+    def test_substring_match_through_trigrams(self):
+        self.assertEqual(set(self.search("lask")), set(["pallets/flask", "owner/flask-extension"]))
+
+    def test_exact_name_ranks_first(self):
+        self.assertEqual(self.search("flask"), ["pallets/flask", "owner/flask-extension"])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("flask extension"), ["owner/flask-extension"])
+
+    def test_regex_characters_are_not_special(self):
+        self.assertEqual(self.search("(a+)+$"), [])
+        self.assertEqual(self.search("fl.*k"), [])
+
+    def test_blank_search_matches_nothing(self):
+        self.assertEqual(self.search("  "), [])
+
+    def test_search_terms_are_tagged(self):
+        terms = build_search_terms("pallets/flask")
+        self.assertTrue(PREFIX_TAG + "fla" in terms)
+        self.assertTrue(TRIGRAM_TAG + "ask" in terms)
+
+
+# Build a card as the facet index reads it
+def make_test_facet_card(name, language="Python", num_pulls=ZERO, has_wiki=True, stars=ZERO, license=None,
+                         pushed_at="2019-03-01T00:00:00Z"):
+    return {"_id": name, "language": language, "num_pulls": num_pulls, "has_wiki": has_wiki,
+            "stargazers_count": stars, "license": license, "pushed_at": pushed_at, "completed_timestamp": None}
+
+
+# Test suite for the in-memory bitmap facet index
+class FacetIndexTestSuite(TestCase):
+    def setUp(self):
+        self.cards = [
+            make_test_facet_card("owner/a", "Python", num_pulls=ZERO, stars=ONE, license="MIT"),
+            make_test_facet_card("owner/b", "Go", num_pulls=THREE, stars=THREE, has_wiki=False),
+            make_test_facet_card("owner/c", "Python", num_pulls=12, stars=THREE, license="MIT",
+                                 pushed_at="2017-01-01T00:00:00Z"),
+            make_test_facet_card("owner/d", None, num_pulls=1500, stars=TWO),
+        ]
+        self.index = FacetIndex(self.cards, now=datetime(2019, 3, 15))
+
+    def names(self, bitmap):
+        return self.index.page(bitmap, "name", None, len(self.cards))[ZERO]
+
+    def test_facet_counts(self):
+        self.assertEqual(self.index.counts("language"), [("Go", ONE), ("Python", TWO)])
+        self.assertEqual(self.index.counts("license"), [("MIT", TWO)])
+        self.assertEqual(self.index.counts("pulls"), [("0", ONE), ("1-9", ONE), ("10-99", ONE), ("1000+", ONE)])
+        self.assertEqual(self.index.counts("activity"), [("month", THREE), ("older", ONE)])
+
+    def test_counts_within_a_filter(self):
+        bitmap = self.index.filter(has_wiki=True)
+        self.assertEqual(self.index.counts("language", bitmap), [("Python", TWO)])
+        self.assertEqual(self.index.count(bitmap), THREE)
+
+    def test_combined_filters(self):
+        self.assertEqual(self.names(self.index.filter(languages=["Python", "Go"], has_wiki=True)), ["owner/a", "owner/c"])
+        self.assertEqual(self.names(self.index.filter(licenses=["MIT"], activity=["month"])), ["owner/a"])
+        self.assertEqual(self.names(self.index.filter(names=["OWNER/B", "owner/unknown"])), ["owner/b"])
+
+    # Every pull bound gives the same repos as comparing the counts one by one
+    def test_pull_bounds_match_a_scan(self):
+        for bound in (-1, ZERO, ONE, THREE, 11, 12, 13, 1499, 1500, 5000):
+            expected_more = [card["_id"] for card in self.cards if card["num_pulls"] > bound]
+            expected_less = [card["_id"] for card in self.cards if card["num_pulls"] < bound]
+            self.assertEqual(self.names(self.index.filter(min_pulls=bound)), expected_more)
+            self.assertEqual(self.names(self.index.filter(max_pulls=bound)), expected_less)
+        self.assertEqual(self.names(self.index.filter(min_pulls=TWO, max_pulls=1500)), ["owner/b", "owner/c"])
+
+    # Pages follow the repo cards' sort orders, ties broken by name
+    def test_pages(self):
+        bitmap = self.index.filter()
+        self.assertEqual(self.index.page(bitmap, "stars", None, TWO), (["owner/b", "owner/c"], True))
+        self.assertEqual(self.index.page(bitmap, "stars", "owner/c", TWO), (["owner/d", "owner/a"], False))
+        self.assertEqual(self.index.page(bitmap, "pulls", None, len(self.cards))[ZERO],
+                         ["owner/d", "owner/c", "owner/b", "owner/a"])
+        self.assertEqual(self.index.page(self.index.filter(languages=["Python"]), "name", "owner/a", ONE), (["owner/c"], False))
+
+    def test_bitmap_of(self):
+        self.assertEqual(bitmap_of([ZERO, THREE, 9], 10), ONE | (ONE << THREE) | (ONE << 9))
+
+    def test_empty_index(self):
+        index = FacetIndex([])
+        self.assertEqual(index.count(index.filter(min_pulls=ONE)), ZERO)
+        self.assertEqual(index.page(index.all, "name"), ([], False))
+
+    def test_invalid_filter_form_matches_nothing(self):
+        query_dict = QueryDict("min_pull_requests=lots")
+        filter_form = Filter(self.index.counts("language"), query_dict,
+                             licenses=self.index.counts("license"), activity=self.index.counts("activity"))
+        self.assertEqual(self.names(filter_facet_index(self.index, filter_form, query_dict)), [])
+        self.assertTrue(filter_form.errors)
+
+
+# Test suite for validating mining requests. GitHub's answers are seeded in the
+# shared GitHub repo cache, which is exactly what a previous lookup of the same repo
+# would have left there
+class MiningRequestValidationTestSuite(TestCase):
+    def tearDown(self):
+        for repo_name in ["owner/repo", "owner/missing", "owner/empty"]:
+            forget_github_repo(repo_name)
+
+    def seed_probe(self, repo_name, num_pulls):
+        raw_data = {"full_name": repo_name} if num_pulls is not None else None
+        store_entry(repo_name, raw_data, num_pulls)
+
+    def test_cached_probe_is_reused(self):
+        self.seed_probe("owner/repo", THREE)
+        self.assertEqual(probe_github_repo("Owner/Repo"), THREE)
+        self.seed_probe("owner/missing", None)
+        self.assertIsNone(probe_github_repo("owner/missing"))
+
+    def test_valid_request(self):
+        self.seed_probe("owner/repo", THREE)
+        self.assertEqual(validate_mining_request("owner/repo"), [])
+        form = MiningRequestForm({"repo_name": "Owner/Repo"})
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["repo_name"], "owner/repo")
+
+    def test_missing_repo_and_repo_without_pulls(self):
+        self.seed_probe("owner/missing", None)
+        self.seed_probe("owner/empty", ZERO)
+        self.assertEqual(validate_mining_request("owner/missing"), ["That repository does not exist on GitHub."])
+        self.assertEqual(validate_mining_request("owner/empty"), ["This repository has no pull requests!"])
+
+    def test_malformed_name(self):
+        self.assertEqual(validate_mining_request("not a repo"), ['Repository must of the form "repo/name".'])
+
+    # Repos we already know about fail on their state without GitHub being asked
+    def test_known_repos(self):
+        MiningRequest.objects.create(repo_name="owner/requested", email="a@example.com", send_email=False,
+                                     requested_by="Admin")
+        BlacklistedMiningRequest.objects.create(repo_name="owner/blacklisted", requested_by="Admin")
+        self.assertEqual(get_request_state_error("owner/requested"), "This repository has already been requested.")
+        self.assertEqual(validate_mining_request("owner/blacklisted"),
+                         ["This repository has been blacklisted by the Administrator."])
+        self.assertIsNone(get_request_state_error("owner/new"))
+
+
+# Test suite for the shared GitHub repo cache. Entries are stored the way a lookup
+# would have stored them, so no GitHub call is made
+class GithubRepoCacheTestSuite(TestCase):
+    def tearDown(self):
+        forget_github_repo("owner/repo")
+        forget_github_repo("owner/missing")
+        release_lock("owner/repo")
+
+    def test_cached_repo_is_returned(self):
+        store_entry("owner/repo", {"full_name": "Owner/Repo", "url": "https://api.github.com/repos/Owner/Repo"})
+        self.assertEqual(get_github_repo("OWNER/repo").full_name, "Owner/Repo")
+
+    def test_missing_repo_is_remembered(self):
+        store_entry("owner/missing", None)
+        with self.assertRaises(UnknownObjectException):
+            get_github_repo("owner/missing")
+
+    def test_forget_removes_entry(self):
+        store_entry("owner/repo", {"full_name": "Owner/Repo"})
+        forget_github_repo("Owner/Repo")
+        self.assertIsNone(read_entry("owner/repo"))
+
+    # The pull count lives in the repo's entry, so forgetting the repo forgets it too
+    def test_pull_count_is_kept_with_the_repo(self):
+        store_entry("owner/repo", {"full_name": "Owner/Repo"}, THREE)
+        self.assertEqual(get_github_pull_count("OWNER/repo"), THREE)
+        self.assertEqual(get_github_repo("owner/repo").full_name, "Owner/Repo")
+        store_entry("owner/missing", None)
+        self.assertIsNone(get_github_pull_count("owner/missing"))
+        forget_github_repo("owner/repo")
+        self.assertIsNone(read_entry("owner/repo"))
+
+    def test_expired_entry_is_not_read(self):
+        store_entry("owner/repo", {"full_name": "Owner/Repo"})
+        DB.githubRepoCache.update_one({"_id": "owner/repo"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=ONE)}})
+        self.assertIsNone(read_entry("owner/repo"))
+
+    # Only one process at a time may look a repo up, until its lock expires
+    def test_lookup_lock(self):
+        self.assertTrue(acquire_lock("owner/repo"))
+        self.assertFalse(acquire_lock("owner/repo"))
+        DB.githubRepoCache.update_one({"_id": lock_id("owner/repo")}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=ONE)}})
+        self.assertTrue(acquire_lock("owner/repo"))
+
+
+# A stand in for a PyGithub PullRequest, only its json is ever stored
+class StoredPull(object):
+    def __init__(self, number):
+        self.raw_data = {"url": f"https://api.github.com/repos/owner/limited/pulls/{number}", "number": number}
+
+
+# Hand out the given pulls, then fail the way PyGithub does when the rate limit runs out
+def pulls_until_rate_limit(pulls, limit_after):
+    for number, pull in enumerate(pulls):
+        if number == limit_after:
+            raise RateLimitExhausted(time.time() + 60)
+        yield pull
+
+
+# Test suite for stopping a batch at the rate limit and resuming it later
+class RateLimitRescheduleTestSuite(TestCase):
+    def setUp(self):
+        PULL_REQUEST_BATCHES_COLLECTION.insert_one({"repo": "owner/limited", "BATCH_SIZE": BATCH_SIZE, "total_batches": ONE,
+                                                    "collected_batches": ZERO, "attempted_batches": ZERO})
+        self.pulls = [StoredPull(number) for number in range(TWO + TWO)]
+
+    def tearDown(self):
+        PULL_REQUEST_BATCHES_COLLECTION.delete_many({"repo": "owner/limited"})
+        PULL_REQUESTS_COLLECTION.delete_many({"url": {"$regex": "owner/limited"}})
+
+    def batch_state(self):
+        return PULL_REQUEST_BATCHES_COLLECTION.find_one({"repo": "owner/limited"})
+
+    def test_batch_is_resumed_where_it_stopped(self):
+        with self.assertRaises(RateLimitExhausted):
+            mine_pulls_batch(BatchedGeneratorTask(pulls_until_rate_limit(self.pulls, TWO), len(self.pulls)), "owner/limited", ZERO)
+        self.assertEqual(get_batch_progress("owner/limited", ZERO), TWO)
+        self.assertEqual(PULL_REQUESTS_COLLECTION.count_documents({"url": {"$regex": "owner/limited"}}), TWO)
+
+        # The rescheduled attempt gets the whole batch again and only stores the rest
+        self.assertTrue(mine_pulls_batch(BatchedGeneratorTask(iter(self.pulls), len(self.pulls)), "owner/limited", ZERO,
+                                         first_attempt=False))
+        self.assertEqual(PULL_REQUESTS_COLLECTION.count_documents({"url": {"$regex": "owner/limited"}}), TWO + TWO)
+        self.assertEqual(self.batch_state()["attempted_batches"], ONE)
+        self.assertEqual(self.batch_state()["collected_batches"], ONE)
+
+    def test_reschedule_waits_until_reset(self):
+        countdown = seconds_until_rate_limit_reset(RateLimitExhausted(time.time() + 60))
+        self.assertTrue(60 <= countdown <= 62)
+        self.assertEqual(seconds_until_rate_limit_reset(RateLimitExhausted(time.time() - 60)), ONE)
+
+
+# Test suite for the rate budget shared by the greenlets of a mining worker
+class RateBudgetTestSuite(TestCase):
+    def setUp(self):
+        self.reset_at = time.time() + 600
+        self.budget = RateBudget()
+
+    def test_unknown_budget_lets_requests_through(self):
+        self.budget.take()
+        self.assertIsNone(self.budget.remaining)
+
+    def test_claims_are_counted_before_github_reports_them(self):
+        self.budget.update(THREE, self.reset_at)
+        self.budget.take(pull_requests_needed(ZERO)) # the first page and the first pull's own GET
+        self.budget.take(pull_requests_needed(ONE)) # the next pull of that page still needs its GET
+        with self.assertRaises(RateLimitExhausted) as raised:
+            self.budget.take(pull_requests_needed(TWO))
+        self.assertEqual(raised.exception.reset_at, self.reset_at)
+
+    def test_stale_headers_do_not_refill_the_budget(self):
+        self.budget.update(THREE, self.reset_at)
+        self.budget.take()
+        self.budget.take()
+        self.budget.update(THREE, self.reset_at) # an older response arriving late
+        self.assertEqual(self.budget.remaining, ONE)
+        self.budget.update(ZERO, self.reset_at) # other processes spent the rest
+        self.assertEqual(self.budget.remaining, ZERO)
+
+    def test_new_window_refills_the_budget(self):
+        self.budget.update(ZERO, self.reset_at)
+        self.budget.update(THREE, self.reset_at + 3600)
+        self.budget.take()
+        self.assertEqual(self.budget.remaining, TWO)
+
+    def test_budget_is_unknown_once_the_window_resets(self):
+        self.budget.update(ZERO, time.time() - 1)
+        self.budget.take()
+        self.assertIsNone(self.budget.remaining)
+
+    def test_pull_costs(self):
+        self.assertEqual(pull_requests_needed(ZERO), TWO)
+        self.assertEqual(pull_requests_needed(ONE), ONE)
+        self.assertEqual(pull_requests_needed(GITHUB_PER_PAGE), TWO)
+        self.assertEqual(pull_requests_needed(ZERO, stored=False), ONE)
+        self.assertEqual(pull_requests_needed(ONE, stored=False), ZERO)
+
+    def test_reserve_is_never_claimed(self):
+        budget = RateBudget(reserve=TWO)
+        budget.update(THREE, self.reset_at)
+        budget.take()
+        with self.assertRaises(RateLimitExhausted):
+            budget.take()
+
+
+# Test suite for the progress reports of repos being mined
+class MiningProgressTestSuite(TestCase):
+    def setUp(self):
+        self.now = time.time()
+        PULL_REQUEST_BATCHES_COLLECTION.insert_one({"repo": "owner/limited", "BATCH_SIZE": BATCH_SIZE, "total_batches": ONE,
+                                                    "collected_batches": ZERO, "attempted_batches": ZERO,
+                                                    "total_pulls": TWO + TWO, "pulls_fetched": ZERO, "rate_samples": [],
+                                                    "started_at": self.now})
+        self.pulls = [StoredPull(number) for number in range(TWO + TWO)]
+
+    def tearDown(self):
+        PULL_REQUEST_BATCHES_COLLECTION.delete_many({"repo": "owner/limited"})
+        PULL_REQUESTS_COLLECTION.delete_many({"url": {"$regex": "owner/limited"}})
+
+    def test_batch_records_its_progress(self):
+        self.assertEqual(get_mining_progress("Owner/Limited")["percent"], ZERO)
+        mine_pulls_batch(BatchedGeneratorTask(iter(self.pulls), len(self.pulls)), "owner/limited", ZERO)
+
+        progress = get_mining_progress("owner/limited")
+        self.assertEqual(progress["pulls_fetched"], TWO + TWO)
+        self.assertEqual(progress["pages_fetched"], ONE)
+        self.assertEqual(progress["api_calls"], TWO + THREE) # the page and each pull's own GET
+        self.assertEqual(progress["batches"]["0"], {"pulls": TWO + TWO, "pages": ONE})
+        self.assertTrue(progress["complete"])
+        self.assertEqual(progress["percent"], 100)
+        self.assertEqual(progress["eta_seconds"], ZERO)
+
+    def test_unknown_repo_has_no_progress(self):
+        self.assertIsNone(get_mining_progress("owner/never-queued"))
+
+    def test_rolling_rate(self):
+        self.assertIsNone(rolling_rate([{"at": self.now, "pulls": 100}]))
+        self.assertEqual(rolling_rate([{"at": self.now, "pulls": 100}, {"at": self.now + 10, "pulls": 100},
+                                       {"at": self.now + 20, "pulls": 100}]), 10)
+
+    def test_eta_within_the_rate_budget(self):
+        self.assertEqual(estimate_seconds_left(1000, 10, 5000, self.now + 600, 100, self.now), 100)
+        self.assertIsNone(estimate_seconds_left(1000, None, 5000, self.now + 600, 100, self.now))
+
+    def test_eta_waits_for_the_rate_limit(self):
+        # 1010 more requests are needed but only 2 are left, so the next window has to be waited for
+        self.assertEqual(estimate_seconds_left(1000, 10, TWO, self.now + 600, 100, self.now), 600)
+
+    def test_eta_counts_each_pulls_own_request(self):
+        # 10100 requests for 10000 pulls: the 5000 left, the next window and part of the one after
+        self.assertEqual(estimate_seconds_left(10000, 100, 5000, self.now + 600, 100, self.now), 600 + 3600)
+
+    def test_stalled_repo(self):
+        batch_state = {"repo": "owner/stuck", "total_batches": TWO, "collected_batches": ONE, "total_pulls": 2000,
+                       "pulls_fetched": 1500, "updated_at": self.now - 60 * 60}
+        progress = summarize_progress(batch_state, self.now)
+        self.assertTrue(progress["stalled"])
+        self.assertEqual(progress["percent"], 75)
+
+        # Waiting for the rate limit to reset is not stalling
+        batch_state.update({"rate_remaining": ZERO, "rate_reset_at": self.now + 600})
+        progress = summarize_progress(batch_state, self.now)
+        self.assertFalse(progress["stalled"])
+        self.assertTrue(progress["waiting_for_rate_limit"])
+
+
+# Hand out the given pulls, then fail the way a broken GitHub response would
+def pulls_until_error(pulls, fail_after):
+    for number, pull in enumerate(pulls):
+        if number == fail_after:
+            raise ValueError("GitHub sent something we cannot read")
+        yield pull
+
+
+# Test suite for retrying failed batches and setting aside the ones that keep failing
+class FailedBatchTestSuite(TestCase):
+    def setUp(self):
+        PULL_REQUEST_BATCHES_COLLECTION.insert_one({"repo": "owner/failing", "BATCH_SIZE": BATCH_SIZE, "total_batches": TWO,
+                                                    "collected_batches": ZERO, "attempted_batches": ZERO})
+        self.pulls = [StoredPull(number) for number in range(TWO + TWO)]
+
+    def tearDown(self):
+        PULL_REQUEST_BATCHES_COLLECTION.delete_many({"repo": "owner/failing"})
+        PULL_REQUESTS_COLLECTION.delete_many({"url": {"$regex": "owner/limited"}})
+        DB.failedBatches.delete_many({})
+        DB.deadBatches.delete_many({})
+
+    def batch_state(self):
+        return PULL_REQUEST_BATCHES_COLLECTION.find_one({"repo": "owner/failing"})
+
+    def test_failed_batch_is_recorded_with_its_error(self):
+        self.assertFalse(mine_pulls_batch(BatchedGeneratorTask(pulls_until_error(self.pulls, TWO), len(self.pulls)),
+                                          "owner/failing", ONE))
+        failed = DB.failedBatches.find_one({"_id": "owner/failing:1"})
+        self.assertEqual(failed["error"], "ValueError")
+        self.assertEqual(failed["attempts"], ONE)
+        self.assertAlmostEqual(failed["next_attempt_at"] - failed["last_failed_at"], BATCH_RETRY_BASE_SECONDS, delta=ONE)
+        self.assertEqual(get_batch_progress("owner/failing", ONE), TWO)
+
+        # The retry stores the rest and clears the failure
+        self.assertTrue(mine_pulls_batch(BatchedGeneratorTask(iter(self.pulls), len(self.pulls)), "owner/failing", ONE,
+                                         first_attempt=False))
+        self.assertIsNone(DB.failedBatches.find_one({"_id": "owner/failing:1"}))
+        self.assertEqual(self.batch_state()["collected_batches"], ONE)
+
+    def test_backoff_doubles(self):
+        self.assertEqual(batch_retry_delay(ONE), BATCH_RETRY_BASE_SECONDS)
+        self.assertEqual(batch_retry_delay(THREE), BATCH_RETRY_BASE_SECONDS * 4)
+        self.assertEqual(batch_retry_delay(100), BATCH_RETRY_MAX_SECONDS)
+
+    def test_only_due_batches_are_claimed_once(self):
+        record_failed_batch("owner/failing", ZERO, ValueError())
+        record_failed_batch("owner/failing", ONE, ValueError())
+        DB.failedBatches.update_one({"_id": "owner/failing:0"}, {"$set": {"next_attempt_at": time.time() - ONE}})
+
+        self.assertEqual(claim_failed_batches(), [("owner/failing", ZERO)])
+        self.assertEqual(claim_failed_batches(), [])
+
+    def test_batch_failing_too_often_is_dead(self):
+        for attempt in range(settings.MAX_BATCH_ATTEMPTS - 1):
+            self.assertTrue(record_failed_batch("owner/failing", ONE, ValueError()))
+        self.assertFalse(record_failed_batch("owner/failing", ONE, ValueError()))
+
+        self.assertIsNone(DB.failedBatches.find_one({"_id": "owner/failing:1"}))
+        self.assertEqual(DB.deadBatches.find_one({"_id": "owner/failing:1"})["attempts"], settings.MAX_BATCH_ATTEMPTS)
+        self.assertEqual(self.batch_state()["dead_batches"], ONE)
+
+        # The admin requeues it with a fresh set of attempts, due at once
+        self.assertEqual(requeue_dead_batches("owner/failing"), ONE)
+        self.assertIsNone(DB.deadBatches.find_one({"_id": "owner/failing:1"}))
+        self.assertEqual(DB.failedBatches.find_one({"_id": "owner/failing:1"})["attempts"], ZERO)
+        self.assertEqual(self.batch_state()["dead_batches"], ZERO)
+        self.assertEqual(claim_failed_batches(), [("owner/failing", ONE)])
+
+    def test_failed_batches_are_forgotten_whatever_the_case(self):
+        record_failed_batch("Owner/Failing", ZERO, ValueError())
+        DB.deadBatches.insert_one({"_id": "Owner/Failing:1", "repo": "Owner/Failing", "job": ONE})
+        forget_failed_batches("owner/failing")
+        self.assertEqual(DB.failedBatches.count_documents({}), ZERO)
+        self.assertEqual(DB.deadBatches.count_documents({}), ZERO)
+
+    def test_batch_is_collected_once(self):
+        increase_collected_batches_count("owner/failing", ONE)
+        increase_collected_batches_count("owner/failing", ONE)
+        self.assertEqual(self.batch_state()["collected_batches"], ONE)
+
@@ -0,0 +1,65 @@
+# Validation of mining requests.
+#
+# A request is checked with a few indexed exists() queries and GitHub's answer
+# about the repo: whether it exists, and how many pulls it has. That answer comes
+# from the shared GitHub repo cache (see mining_scripts/github_cache.py), so
+# resubmitting a form, two users asking for the same repo, or the mining that
+# follows does not ask GitHub again.
+
+from github import GithubException
+from mining_scripts.github_cache import get_github_pull_count
+from .models import MiningRequest, QueuedMiningRequest, BlacklistedMiningRequest, MinedRepo
+import re
+
+
+# Regex that defines a proper repo name
+VALID_REPO_NAME = re.compile(r'^(((\w+)[-]*)\w+)+/+((\w+)([-]|[.])*)+\w+$')
+
+# Return the number of pulls of a repo on GitHub, or None if the repo does not exist.
+# GithubExceptions other than a 404 (rate limits, outages) are raised and not cached
+def probe_github_repo(repo_name):
+    return get_github_pull_count(repo_name)
+
+
+# Return the reason a repo cannot be requested because of what we already know
+# about it (mined, requested, mining or blacklisted), or None
+def get_request_state_error(repo_name):
+    if MinedRepo.objects.filter(repo_name=repo_name).exists():
+        return "That repository has already been mined."
+    if MiningRequest.objects.filter(repo_name=repo_name).exists():
+        return "This repository has already been requested."
+    if QueuedMiningRequest.objects.filter(repo_name=repo_name).exists():
+        return "This repository is currently being mined."
+    if BlacklistedMiningRequest.objects.filter(repo_name=repo_name).exists():
+        return "This repository has been blacklisted by the Administrator."
+    return None
+
+
+# Return the list of validation errors of a mining request for repo_name (lowercase)
+def validate_mining_request(repo_name):
+    errors = []
+    well_formed = VALID_REPO_NAME.fullmatch(repo_name) is not None
+
+    # Repo must match regex
+    if not well_formed:
+        errors.append('Repository must of the form "repo/name".')
+
+    state_error = get_request_state_error(repo_name)
+
+    # If it matches the regex, it must exist on github and have pull requests. Repos
+    # we already know about fail on their state, so GitHub is not asked about them
+    if well_formed and state_error is None:
+        try:
+            num_pulls = probe_github_repo(repo_name)
+        except GithubException:
+            errors.append("GitHub could not be reached, please try again later.")
+        else:
+            if num_pulls is None:
+                errors.append("That repository does not exist on GitHub.")
+            elif num_pulls == 0:
+                errors.append("This repository has no pull requests!")
+
+    if state_error is not None:
+        errors.append(state_error)
+
+    return errors
@@ -14,13 +14,20 @@ from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes, force_text
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.forms import ValidationError
+from django.views.decorators.cache import cache_control
+from django.views.decorators.vary import vary_on_cookie
+from django.views.decorators.http import require_GET, condition
+from django.conf import settings
 
 
 # Import all handwritten libraries
 from permissions.permissions import login_forbidden
 from .forms import MiningRequestForm, LoginForm, FeedbackForm, Filter, SignupForm
 from mining_scripts.mining import *
+from mining_scripts.repo_cards import (get_repo_cards, encode_page_cursor, decode_page_cursor,
+                                       SORT_OPTIONS, DEFAULT_SORT, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
 from .models import *
+from .caching import repo_cache_key, listing_cache_key, get_or_build, get_facet_index, LISTING_CACHE_SECONDS
 from .tokens import account_activation_token
 from .visualizations import *
 from .filters import *
@@ -30,8 +37,10 @@ from .filters import *
 from nvd3 import multiBarHorizontalChart
 import random 
 import json
+import hashlib
 from io import BytesIO
 from PIL import Image
+import plotly.offline as opy
 
 
 
@@ -40,6 +49,18 @@ from PIL import Image
 class HomeView(TemplateView):
     template_name = 'home.html'
 
+# Serve the plotly.js bundle once, with far-future caching. Chart templates
+# reference it through the plotly_js template tag instead of inlining it.
+_PLOTLY_JS = None
+
+@require_GET
+@cache_control(public=True, max_age=60 * 60 * 24 * 365)
+def plotly_js(request):
+    global _PLOTLY_JS
+    if _PLOTLY_JS is None:
+        _PLOTLY_JS = opy.get_plotlyjs()
+    return HttpResponse(_PLOTLY_JS, content_type='application/javascript')
+
 def about_us(request):
     template_name = 'about_us.html'
     return render(request, template_name, {})
@@ -117,17 +138,22 @@ def mining_request_form_view(request):
         form = MiningRequestForm()
         return render(request, template, {'form': form}) 
 
-# A page accessible by anyone to see all mined repos (with hyperlinks)
+# Read the page size out of the query string, falling back to the default on junk
+def get_page_size(query_dict):
+    try:
+        return max(1, min(int(query_dict.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        return DEFAULT_PAGE_SIZE
+
+
+# A page accessible by anyone to see all mined repos (with hyperlinks).
+# Filters, the sort order and the page cursor all travel in the query string,
+# so every page of a filtered listing is a plain, linkable GET
 def mined_repos(request):
 
     template_name = 'repos.html'
-
-    # Obtain all the mining requests 
-    mined_repos = sorted(list(MinedRepo.objects.values_list('repo_name', flat=True)))          
-    num_repos = len(mined_repos)
     context = dict()
     message = ''
-    filter_form = Filter(get_language_list_from_mongo())
 
     if request.method == 'POST':
 
@@ -135,164 +161,211 @@ def mined_repos(request):
             if "repo_checkbox" in request.POST:
                 checked_repos = request.POST.getlist("repo_checkbox")
                 
-                if len(checked_repos) < 2 or len(checked_repos) > 3:
-                    message = "You can only compare 2-3 repos"
-
-                elif len(checked_repos) == 2:
-                    repo_owner1 = checked_repos[0].split('/')[0]
-                    repo_owner2 = checked_repos[1].split('/')[0]
-
-                    repo_name1 = checked_repos[0].split('/')[1]
-                    repo_name2 = checked_repos[1].split('/')[1]
-
-                    url = f"/repos/compare/{repo_owner1}&{repo_name1}&{repo_owner2}&{repo_name2}/"
-
-                    return HttpResponseRedirect(url)
-
+                if len(checked_repos) < 2 or len(checked_repos) > settings.MAX_COMPARED_REPOS:
+                    message = f"You can only compare 2-{settings.MAX_COMPARED_REPOS} repos"
 
                 else:
-                    repo_owner1 = checked_repos[0].split('/')[0]
-                    repo_owner2 = checked_repos[1].split('/')[0]
-                    repo_owner3 = checked_repos[2].split('/')[0]
-
-                    repo_name1 = checked_repos[0].split('/')[1]
-                    repo_name2 = checked_repos[1].split('/')[1]
-                    repo_name3 = checked_repos[2].split('/')[1]
-                    
-
-                    url = f"/repos/compare/{repo_owner1}&{repo_name1}&{repo_owner2}&{repo_name2}&{repo_owner3}&{repo_name3}/"
+                    url = "/repos/compare/" + "&".join(repo.replace('/', '&') for repo in checked_repos) + "/"
 
                     return HttpResponseRedirect(url)
 
             else:
                 message = "You must choose at least two pages to compare!"
 
-        else:
-            filters = list()
-            filter_form = Filter(get_language_list_from_mongo(), request.POST)
-            
-            if filter_form.is_valid():
-                if 'search' in request.POST:
-                    search_query = filter_form.cleaned_data.get('search')
-                    if search_query.strip() != '':
-                        repos_filtered_by_search = get_repos_search_query_filter(search_query)
-                        filters.append(repos_filtered_by_search)
-
-                if 'languages' in request.POST:
-                    languages = filter_form.cleaned_data.get('languages')
-                    repos_filtered_by_language = get_repos_list_by_language_filter(languages)
-                    filters.append(repos_filtered_by_language)
-
-                lower_bound = filter_form.cleaned_data.get('min_pull_requests')
-                upper_bound = filter_form.cleaned_data.get('max_pull_requests')
-
-                if lower_bound != None and upper_bound == None:
-                    repos_filtered_by_pulls = get_repos_list_by_pulls_greater_than_filter(lower_bound)
-                    filters.append(repos_filtered_by_pulls)
-
-                elif upper_bound != None and lower_bound == None:
-                    repos_filtered_by_pulls = get_repos_list_by_pulls_less_than_filter(upper_bound)
-                    filters.append(repos_filtered_by_pulls)
-
-                elif lower_bound != None and upper_bound != None:
-                    repos_filtered_by_pulls = get_repos_list_by_pulls_bounded_filter(lower_bound, upper_bound)
-                    filters.append(repos_filtered_by_pulls)
-
-                if 'has_wiki' in request.POST:
-                    repos_that_have_a_wiki = get_repos_list_has_wiki_filter(True)
-                    filters.append(repos_that_have_a_wiki)
-
-                if len(filters) != 0:
-                    repos_list = get_filtered_repos_list(filters)
-                    num_repos = len(repos_list)
-                    for item in range(0, len(repos_list)):
-                        context.update({
-                            f"repo{item}": [repos_list[item], find_repo_main_page(repos_list[item])["owner"]["avatar_url"]]
-                        })
-
-                    return render(request, template_name, {"context":context, "filter":filter_form, "num_repos":num_repos})
+    facet_index = get_facet_index()
+    filter_form = Filter(facet_index.counts("language"), request.GET,
+                         licenses=facet_index.counts("license"), activity=facet_index.counts("activity"))
+    sort = request.GET.get('sort', DEFAULT_SORT)
+    if sort not in SORT_OPTIONS:
+        sort = DEFAULT_SORT
+    page_size = get_page_size(request.GET)
 
-        
     try:
-        for item in range(0, len(mined_repos)):
+        # The listing result only changes with the catalog version, so it is cached per query
+        # string. The page itself is not cached since it carries the compare form's csrf token
+        def build_listing():
+            # The facet index answers the filters and picks the repos of the page, so
+            # only the cards actually shown are read. Cursors keep the repo cards' format
+            bitmap = filter_facet_index(facet_index, filter_form, request.GET)
+            position = decode_page_cursor(request.GET['after']) if request.GET.get('after') else None
+            names, has_more = facet_index.page(bitmap, sort, position[1] if position else None, page_size)
+            cards_by_name = {card["_id"]: card for card in get_repo_cards(names)}
+            cards = [cards_by_name[name] for name in names if name in cards_by_name]
+            next_cursor = encode_page_cursor(cards[-1], sort) if has_more and cards else None
+            return cards, next_cursor, facet_index.count(bitmap)
+
+        cards, next_cursor, num_repos = get_or_build(listing_cache_key(request.GET), build_listing, LISTING_CACHE_SECONDS)
+
+        for item, card in enumerate(cards):
             context.update({
-                f"repo{item}": [mined_repos[item], find_repo_main_page(mined_repos[item])["owner"]["avatar_url"]]
+                f"repo{item}": [card["repo_name"], card["avatar_url"]]
             })
+
+        # Links to the other sort orders and the next page keep the current filters
+        query = request.GET.copy()
+        query.pop('after', None)
+        query.pop('sort', None)
+        next_query = None
+        if next_cursor is not None:
+            next_query = query.copy()
+            next_query['sort'] = sort
+            next_query['after'] = next_cursor
+
+        page = {
+            "sort": sort,
+            "sort_options": list(SORT_OPTIONS),
+            "filter_query": query.urlencode(),
+            "next_query": next_query.urlencode() if next_query is not None else None,
+            "is_first_page": not request.GET.get('after'),
+        }
         
         if message == '':
-            return render(request, template_name, {"context":context, "filter":filter_form, "num_repos":num_repos})
+            return render(request, template_name, {"context":context, "filter":filter_form, "num_repos":num_repos,
+                                                   "page":page})
         else:
             return render(request, template_name, {"context":context, "message":message, 
-                                                   "filter":filter_form, "num_repos":num_repos})
+                                                   "filter":filter_form, "num_repos":num_repos, "page":page})
 
     except Exception as e:
         return render(request, template_name, {"error":e})
 
-    
+
+# How long browsers and shared caches may reuse a repo page before revalidating it
+REPO_PAGE_MAX_AGE_SECONDS = 60 * 5
+
+
+# Return {repo_name: (completed_timestamp, updated)} for those of repo_names that have been mined.
+# The result is remembered on the request, so the conditional GET validators and the
+# view itself share a single small query
+def get_repo_validators(request, repo_names):
+    key = tuple(repo_names)
+    remembered = getattr(request, '_repo_validators', {})
+    if key not in remembered:
+        remembered[key] = {
+            repo_name.lower(): (completed_timestamp, updated) for repo_name, completed_timestamp, updated in
+            MinedRepo.objects.filter(repo_name__in=repo_names).values_list('repo_name', 'completed_timestamp', 'updated')
+        }
+        request._repo_validators = remembered
+    return remembered[key]
+
+
+def get_completed_timestamps(request, repo_names):
+    return {repo_name: validators[0] for repo_name, validators in get_repo_validators(request, repo_names).items()}
+
+
+# The repos compared by a /repos/compare/ url, or None if it does not name a valid set of
+# repos. repo_pairs is the part of the url after /repos/compare/, e.g. owner1&name1&owner2&name2
+def get_compared_repo_names(repo_pairs):
+    parts = repo_pairs.lower().split('&')
+    repo_names = [parts[index] + "/" + parts[index + 1] for index in range(0, len(parts) - 1, 2)]
+    if len(parts) % 2 != 0 or len(repo_names) < 2 or len(repo_names) > settings.MAX_COMPARED_REPOS:
+        return None
+    return repo_names
+
+
+# Who a repo page is rendered for. The nav differs per logged-in user, so their pages
+# must not validate against each other
+def get_page_viewer(request):
+    user = getattr(request, 'user', None)
+    return f"user:{user.pk}" if user is not None and user.is_authenticated else "anonymous"
+
+
+# Conditional GET validators for the repo pages. A page only changes when one of its
+# repos is saved again or its viewer changes, so the validators come from the repos'
+# completed_timestamp and updated columns and the viewer. Returning None (unknown repo)
+# lets the view answer with its 404
+def repo_page_etag(repo_names, request):
+    validators = get_repo_validators(request, repo_names) if repo_names else {}
+    if not repo_names or len(validators) != len(repo_names):
+        return None
+    state = "|".join(f"{repo_name}@{validators[repo_name][0]}@{validators[repo_name][1]}" for repo_name in repo_names)
+    state += "|" + get_page_viewer(request)
+    return hashlib.md5(state.encode('utf-8')).hexdigest()
+
+
+# Last-Modified says nothing about the viewer, so logged-in users only get the ETag
+def repo_page_last_modified(repo_names, request):
+    if get_page_viewer(request) != "anonymous":
+        return None
+    validators = get_repo_validators(request, repo_names) if repo_names else {}
+    if not repo_names or len(validators) != len(repo_names):
+        return None
+    return max(updated for completed_timestamp, updated in validators.values())
+
+
+def repo_detail_etag(request, repo_owner, repo_name):
+    return repo_page_etag([repo_owner.lower() + "/" + repo_name.lower()], request)
+
+
+def repo_detail_last_modified(request, repo_owner, repo_name):
+    return repo_page_last_modified([repo_owner.lower() + "/" + repo_name.lower()], request)
+
+
+def compare_repos_etag(request, repo_pairs):
+    return repo_page_etag(get_compared_repo_names(repo_pairs), request)
+
+
+def compare_repos_last_modified(request, repo_pairs):
+    return repo_page_last_modified(get_compared_repo_names(repo_pairs), request)
+
+
+# Render a page built from the repos in repo_stamps. Only the context is cached (it is
+# the same for every user), the page itself is rendered per request so the nav shows
+# who is logged in
+def render_cached_repo_page(request, kind, repo_stamps, template_name, build_context):
+    context = get_or_build(repo_cache_key(kind, *repo_stamps), build_context)
+    return render(request, template_name, context)
 
 
 # A function that will be used to generate interactive visualizations of 
 # mined JSON data for any repo.
+@cache_control(private=True, max_age=REPO_PAGE_MAX_AGE_SECONDS)
+@vary_on_cookie
+@condition(etag_func=repo_detail_etag, last_modified_func=repo_detail_last_modified)
 def get_repo_data(request, repo_owner, repo_name):
     template_name = 'mined_repo_display.html'
     original_repo = repo_owner.lower() + "/" + repo_name.lower()
-    mined_repos = list(MinedRepo.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
+    completed_timestamps = get_completed_timestamps(request, [original_repo])
     
-    if original_repo in mined_repos:
-        repo = mined_repo_sql_obj = MinedRepo.objects.get(repo_name=original_repo)
-        context = get_repo_table_context(original_repo)
-        context.update({
-            "repo_name":original_repo,
-            "repo_img":find_repo_main_page(original_repo)['owner']['avatar_url'],
-            "bar_chart_html":getattr(repo, "bar_chart_html"),
-            "pull_line_chart_html":getattr(repo, "pull_line_chart_html"), 
-            "contribution_line_chart_html": getattr(repo, "contribution_line_chart_html")
-        })
-        return render(request, template_name, context) 
+    if original_repo in completed_timestamps:
+        repo_stamp = (original_repo, completed_timestamps[original_repo])
 
-    else:
-        return HttpResponseNotFound('<h1>404 Repo Not Found</h1>')
+        def build_context():
+            repo = MinedRepo.objects.get(repo_name=original_repo)
+            context = dict(get_or_build(repo_cache_key('repo_table', repo_stamp),
+                                        lambda: get_repo_table_context(original_repo)))
+            context.update({
+                "repo_name":original_repo,
+                "repo_img":find_mined_repo_main_page(original_repo)['owner']['avatar_url'],
+                "bar_chart_json":getattr(repo, "bar_chart_json"),
+                "pull_line_chart_json":getattr(repo, "pull_line_chart_json"), 
+                "contribution_line_chart_json": getattr(repo, "contribution_line_chart_json")
+            })
+            return context
 
+        return render_cached_repo_page(request, 'repo_page', [repo_stamp], template_name, build_context)
 
-def compare_two_repos(request, repo_owner1, repo_name1, repo_owner2, repo_name2):
-    template_name = 'mined_repo_display_2.html'
-    repo_one_full_name = repo_owner1.lower() + "/" + repo_name1.lower()
-    repo_two_full_name = repo_owner2.lower() + "/" + repo_name2.lower()
+    else:
+        return HttpResponseNotFound('<h1>404 Repo Not Found</h1>')
 
-    mined_repos = list(MinedRepo.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
 
-    if repo_one_full_name in mined_repos and repo_two_full_name in mined_repos:
-        context = get_dual_repo_table_context(repo_one_full_name, repo_two_full_name)
-        context.update({
-            "repo_one_name":repo_one_full_name,
-            "repo_one_img":find_repo_main_page(repo_one_full_name)['owner']['avatar_url'],
-            "repo_two_name":repo_two_full_name,
-            "repo_two_img":find_repo_main_page(repo_two_full_name)['owner']['avatar_url'],
-        })
-        return render(request, template_name, context) 
+# Compare any number of mined repos (from 2 up to settings.MAX_COMPARED_REPOS).
+@cache_control(private=True, max_age=REPO_PAGE_MAX_AGE_SECONDS)
+@vary_on_cookie
+@condition(etag_func=compare_repos_etag, last_modified_func=compare_repos_last_modified)
+def compare_repos(request, repo_pairs):
+    template_name = 'mined_repo_compare.html'
+    repo_names = get_compared_repo_names(repo_pairs)
 
-    else:
+    if repo_names is None:
         return HttpResponseNotFound('<h1>404 Repo Not Found</h1>')
 
-def compare_three_repos(request, repo_owner1, repo_name1, repo_owner2, repo_name2, repo_owner3, repo_name3):
-    template_name = 'mined_repo_display_3.html'
-    repo_one_full_name = repo_owner1.lower() + "/" + repo_name1.lower()
-    repo_two_full_name = repo_owner2.lower() + "/" + repo_name2.lower()
-    repo_three_full_name = repo_owner3.lower() + "/" + repo_name3.lower()
-
-    mined_repos = list(MinedRepo.objects.values_list('repo_name', flat=True)) # Obtain all the mining requests
-
-    if repo_one_full_name in mined_repos and repo_two_full_name in mined_repos and repo_three_full_name in mined_repos:
-        context = get_three_repo_table_context(repo_one_full_name, repo_two_full_name, repo_three_full_name)
-        context.update({
-            "repo_one_name":repo_one_full_name,
-            "repo_one_img":find_repo_main_page(repo_one_full_name)['owner']['avatar_url'],
-            "repo_two_name":repo_two_full_name,
-            "repo_two_img":find_repo_main_page(repo_two_full_name)['owner']['avatar_url'],
-            "repo_three_name":repo_three_full_name,
-            "repo_three_img":find_repo_main_page(repo_three_full_name)['owner']['avatar_url'],
-        })
-        return render(request, template_name, context)
+    completed_timestamps = get_completed_timestamps(request, repo_names)
+
+    if all(repo_name in completed_timestamps for repo_name in repo_names):
+        repo_stamps = [(repo_name, completed_timestamps[repo_name]) for repo_name in repo_names]
+        return render_cached_repo_page(request, 'compare_page', repo_stamps, template_name,
+                                       lambda: get_comparison_context(repo_names))
 
     else:
         return HttpResponseNotFound('<h1>404 Repo Not Found</h1>')
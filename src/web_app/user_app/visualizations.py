@@ -3,6 +3,7 @@
 
 from mining_scripts.mining import *
 from user_app.models import MinedRepo
+from django.http import Http404
 from nvd3 import multiBarHorizontalChart, discreteBarChart
 import random 
 import datetime
@@ -33,7 +34,12 @@ def multi_bar_chart():
 
 def get_repo_table_context(repo_name):
     mined_repo_sql_obj = MinedRepo.objects.get(repo_name=repo_name)
-    landing_page = find_repo_main_page(repo_name)
+    landing_page = find_mined_repo_main_page(repo_name)
+    return build_repo_table_context(mined_repo_sql_obj, landing_page)
+
+
+# Build the overview table of one repo from its MinedRepo row and landing page json
+def build_repo_table_context(mined_repo_sql_obj, landing_page):
     num_pulls = getattr(mined_repo_sql_obj, 'num_pulls')
     num_closed_merged_pulls = getattr(mined_repo_sql_obj, 'num_closed_merged_pulls')
     num_closed_unmerged_pulls = getattr(mined_repo_sql_obj, 'num_closed_unmerged_pulls')
@@ -92,377 +98,58 @@ def get_repo_table_context(repo_name):
     }
 
 
-
-def get_dual_repo_table_context(repo_one_full_name, repo_two_full_name):
-    context = dict()
-    
-    mined_repo_one_sql_obj = MinedRepo.objects.get(repo_name=repo_one_full_name)
-    mined_repo_two_sql_obj = MinedRepo.objects.get(repo_name=repo_two_full_name)
-
-    landing_page_repo_one = find_repo_main_page(repo_one_full_name)
-    landing_page_repo_two = find_repo_main_page(repo_two_full_name)
-
-    num_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_pulls')
-    num_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_pulls')
-    context.update({
-        'num_pulls_repo_one':num_pulls_repo_one,
-        'num_pulls_repo_two':num_pulls_repo_two
-    })
-
-    num_closed_merged_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_closed_merged_pulls')
-    num_closed_merged_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_closed_merged_pulls')
-    context.update({
-        'num_closed_merged_pulls_repo_one':num_closed_merged_pulls_repo_one,
-        'num_closed_merged_pulls_repo_two':num_closed_merged_pulls_repo_two
-    })
-
-    num_closed_unmerged_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_closed_unmerged_pulls')
-    num_closed_unmerged_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_closed_unmerged_pulls')
-    context.update({
-        'num_closed_unmerged_pulls_repo_one':num_closed_unmerged_pulls_repo_one,
-        'num_closed_unmerged_pulls_repo_two':num_closed_unmerged_pulls_repo_two
-    })
-
-    num_open_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_open_pulls')
-    num_open_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_open_pulls')
-    context.update({
-        'num_open_pulls_repo_one':num_open_pulls_repo_one,
-        'num_open_pulls_repo_two':num_open_pulls_repo_two
-    })
-
-    description_repo_one = landing_page_repo_one['description']
-    description_repo_two = landing_page_repo_two['description']
-    context.update({
-        'description_repo_one':description_repo_one,
-        'description_repo_two':description_repo_two
-    })
-    
-    # adjust the timezone of this landing page to be America/Phoenix
-    time_zone = pytz.timezone('America/Phoenix')
-    date_format = "%Y-%m-%dT%H:%M:%SZ"
-
-    unaware_created_date_one = datetime.datetime.strptime(str(landing_page_repo_one['created_at']), date_format)
-    unaware_updated_date_one = datetime.datetime.strptime(str(landing_page_repo_one['updated_at']), date_format)
-    unaware_created_date_two = datetime.datetime.strptime(str(landing_page_repo_two['created_at']), date_format)
-    unaware_updated_date_two = datetime.datetime.strptime(str(landing_page_repo_two['updated_at']), date_format)
-    
-    adjusted_created_date_one =  pytz.utc.localize(unaware_created_date_one).astimezone(time_zone)
-    adjusted_updated_date_one =  pytz.utc.localize(unaware_updated_date_one).astimezone(time_zone)
-    adjusted_created_date_two =  pytz.utc.localize(unaware_created_date_two).astimezone(time_zone)
-    adjusted_updated_date_two =  pytz.utc.localize(unaware_updated_date_two).astimezone(time_zone)
-
-    context.update({
-        'created_at_repo_one':adjusted_created_date_one,
-        'created_at_repo_two':adjusted_created_date_two
-    })
-
-    context.update({
-        'updated_at_repo_one':adjusted_updated_date_one,
-        'updated_at_repo_two':adjusted_updated_date_two
-    })
-
-    last_mined_date_repo_one = getattr(MinedRepo.objects.get(repo_name=repo_one_full_name), "completed_timestamp")
-    last_mined_date_repo_two = getattr(MinedRepo.objects.get(repo_name=repo_two_full_name), "completed_timestamp")
-    context.update({
-        'last_mined_date_repo_one':last_mined_date_repo_one,
-        'last_mined_date_repo_two':last_mined_date_repo_two
-    })
-
-    clone_url_repo_one = landing_page_repo_one['clone_url']
-    clone_url_repo_two = landing_page_repo_two['clone_url']
-    context.update({
-        'clone_url_repo_one':clone_url_repo_one,
-        'clone_url_repo_two':clone_url_repo_two
-    })
-
-    homepage_repo_one = str(landing_page_repo_one['homepage'])
-    homepage_repo_two = str(landing_page_repo_two['homepage'])
-
-    if homepage_repo_one.strip() == "" or homepage_repo_one.strip() == "None" or homepage_repo_one.strip == "null":
-        homepage_repo_one = "None"
-
-    if homepage_repo_two.strip() == "" or homepage_repo_two.strip() == "None" or homepage_repo_two.strip == "null":
-        homepage_repo_two = "None"
-
-    context.update({
-        'homepage_repo_one':homepage_repo_one,
-        'homepage_repo_two':homepage_repo_two
-    })
-
-    stargazers_count_repo_one = landing_page_repo_one['stargazers_count']
-    stargazers_count_repo_two = landing_page_repo_two['stargazers_count']
-    context.update({
-        'stargazers_count_repo_one':stargazers_count_repo_one,
-        'stargazers_count_repo_two':stargazers_count_repo_two
-    })
-
-    language_repo_one = landing_page_repo_one['language']
-    language_repo_two = landing_page_repo_two['language']
-    context.update({
-        'language_repo_one':language_repo_one,
-        'language_repo_two':language_repo_two
-    })
-
-    has_wiki_repo_one = landing_page_repo_one['has_wiki']
-    has_wiki_repo_two = landing_page_repo_two['has_wiki']
-    context.update({
-        'has_wiki_repo_one':has_wiki_repo_one,
-        'has_wiki_repo_two':has_wiki_repo_two
-    })
-
-    try:
-        license_key_repo_one = landing_page_repo_one['license']["key"]
-        license_name_repo_one = landing_page_repo_one['license']['name']
-    except Exception:
-        license_key_repo_one = "None"
-        license_name_repo_one = "None" 
-
-    try:
-        license_key_repo_two = landing_page_repo_two['license']["key"]
-        license_name_repo_two = landing_page_repo_two['license']['name']
-    except Exception:
-        license_key_repo_two = "None"
-        license_name_repo_two = "None" 
-
-    context.update({
-        'license_key_repo_one':license_key_repo_one,
-        'license_name_repo_one':license_name_repo_one,
-        'license_key_repo_two':license_key_repo_two,
-        'license_name_repo_two':license_name_repo_two
-    })
-
-
-    
-    open_issues_repo_one = landing_page_repo_one['open_issues']
-    open_issues_repo_two = landing_page_repo_two['open_issues']
-    context.update({
-        'open_issues_repo_one':open_issues_repo_one,
-        'open_issues_repo_two':open_issues_repo_two
-    })
-
-    network_count_repo_one = landing_page_repo_one['network_count']
-    network_count_repo_two =landing_page_repo_two['network_count']
-    context.update({
-        'network_count_repo_one':network_count_repo_one,
-        'network_count_repo_two':network_count_repo_two
-    })
-
-    subscribers_count_repo_one = landing_page_repo_one['subscribers_count']
-    subscribers_count_repo_two = landing_page_repo_two['subscribers_count']
-    context.update({
-        'subscribers_count_repo_one':subscribers_count_repo_one,
-        'subscribers_count_repo_two':subscribers_count_repo_two
-    })
-
-    return context
-
-def get_three_repo_table_context(repo_one_full_name, repo_two_full_name, repo_three_full_name):
-    context = dict()
-    
-    mined_repo_one_sql_obj = MinedRepo.objects.get(repo_name=repo_one_full_name)
-    mined_repo_two_sql_obj = MinedRepo.objects.get(repo_name=repo_two_full_name)
-    mined_repo_three_sql_obj = MinedRepo.objects.get(repo_name=repo_three_full_name)
-
-    landing_page_repo_one = find_repo_main_page(repo_one_full_name)
-    landing_page_repo_two = find_repo_main_page(repo_two_full_name)
-    landing_page_repo_three = find_repo_main_page(repo_three_full_name)
-
-    num_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_pulls')
-    num_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_pulls')
-    num_pulls_repo_three = getattr(mined_repo_three_sql_obj, 'num_pulls')
-    context.update({
-        'num_pulls_repo_one':num_pulls_repo_one,
-        'num_pulls_repo_two':num_pulls_repo_two,
-        'num_pulls_repo_three':num_pulls_repo_three
-    })
-
-    num_closed_merged_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_closed_merged_pulls')
-    num_closed_merged_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_closed_merged_pulls')
-    num_closed_merged_pulls_repo_three = getattr(mined_repo_three_sql_obj, 'num_closed_merged_pulls')
-    context.update({
-        'num_closed_merged_pulls_repo_one':num_closed_merged_pulls_repo_one,
-        'num_closed_merged_pulls_repo_two':num_closed_merged_pulls_repo_two,
-        'num_closed_merged_pulls_repo_three':num_closed_merged_pulls_repo_three
-    })
-
-    num_closed_unmerged_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_closed_unmerged_pulls')
-    num_closed_unmerged_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_closed_unmerged_pulls')
-    num_closed_unmerged_pulls_repo_three = getattr(mined_repo_three_sql_obj, 'num_closed_unmerged_pulls')
-    context.update({
-        'num_closed_unmerged_pulls_repo_one':num_closed_unmerged_pulls_repo_one,
-        'num_closed_unmerged_pulls_repo_two':num_closed_unmerged_pulls_repo_two,
-        'num_closed_unmerged_pulls_repo_three':num_closed_unmerged_pulls_repo_three
-    })
-
-    num_open_pulls_repo_one = getattr(mined_repo_one_sql_obj, 'num_open_pulls')
-    num_open_pulls_repo_two = getattr(mined_repo_two_sql_obj, 'num_open_pulls')
-    num_open_pulls_repo_three = getattr(mined_repo_three_sql_obj, 'num_open_pulls')
-    context.update({
-        'num_open_pulls_repo_one':num_open_pulls_repo_one,
-        'num_open_pulls_repo_two':num_open_pulls_repo_two,
-        'num_open_pulls_repo_three':num_open_pulls_repo_three
-    })
-
-    description_repo_one = landing_page_repo_one['description']
-    description_repo_two = landing_page_repo_two['description']
-    description_repo_three = landing_page_repo_three['description']
-    context.update({
-        'description_repo_one':description_repo_one,
-        'description_repo_two':description_repo_two,
-        'description_repo_three':description_repo_three
-    })
-
-    # adjust the timezone of this landing page to be America/Phoenix
-    time_zone = pytz.timezone('America/Phoenix')
-    date_format = "%Y-%m-%dT%H:%M:%SZ"
-
-    unaware_created_date_one = datetime.datetime.strptime(str(landing_page_repo_one['created_at']), date_format)
-    unaware_updated_date_one = datetime.datetime.strptime(str(landing_page_repo_one['updated_at']), date_format)
-    unaware_created_date_two = datetime.datetime.strptime(str(landing_page_repo_two['created_at']), date_format)
-    unaware_updated_date_two = datetime.datetime.strptime(str(landing_page_repo_two['updated_at']), date_format)
-    unaware_created_date_three = datetime.datetime.strptime(str(landing_page_repo_three['created_at']), date_format)
-    unaware_updated_date_three = datetime.datetime.strptime(str(landing_page_repo_three['updated_at']), date_format)
-    
-    adjusted_created_date_one =  pytz.utc.localize(unaware_created_date_one).astimezone(time_zone)
-    adjusted_updated_date_one =  pytz.utc.localize(unaware_updated_date_one).astimezone(time_zone)
-    adjusted_created_date_two =  pytz.utc.localize(unaware_created_date_two).astimezone(time_zone)
-    adjusted_updated_date_two =  pytz.utc.localize(unaware_updated_date_two).astimezone(time_zone)
-    adjusted_created_date_three =  pytz.utc.localize(unaware_created_date_three).astimezone(time_zone)
-    adjusted_updated_date_three =  pytz.utc.localize(unaware_updated_date_three).astimezone(time_zone)
-
-    context.update({
-        'created_at_repo_one':adjusted_created_date_one,
-        'created_at_repo_two':adjusted_created_date_two,
-        'created_at_repo_three':adjusted_created_date_three
-    })
-
-    context.update({
-        'updated_at_repo_one':adjusted_updated_date_one,
-        'updated_at_repo_two':adjusted_updated_date_two,
-        'updated_at_repo_three':adjusted_updated_date_three
-    })
-
-    last_mined_date_repo_one = getattr(MinedRepo.objects.get(repo_name=repo_one_full_name), "completed_timestamp")
-    last_mined_date_repo_two = getattr(MinedRepo.objects.get(repo_name=repo_two_full_name), "completed_timestamp")
-    last_mined_date_repo_three = getattr(MinedRepo.objects.get(repo_name=repo_three_full_name), "completed_timestamp")
-    context.update({
-        'last_mined_date_repo_one':last_mined_date_repo_one,
-        'last_mined_date_repo_two':last_mined_date_repo_two,
-        'last_mined_date_repo_three':last_mined_date_repo_three
-    })
-
-    clone_url_repo_one = landing_page_repo_one['clone_url']
-    clone_url_repo_two = landing_page_repo_two['clone_url']
-    clone_url_repo_three = landing_page_repo_three['clone_url']
-    context.update({
-        'clone_url_repo_one':clone_url_repo_one,
-        'clone_url_repo_two':clone_url_repo_two,
-        'clone_url_repo_three':clone_url_repo_three
-    })
-
-    homepage_repo_one = str(landing_page_repo_one['homepage'])
-    homepage_repo_two = str(landing_page_repo_two['homepage'])
-    homepage_repo_three = str(landing_page_repo_three['homepage'])
-
-    if str(homepage_repo_one).strip() == "" or str(homepage_repo_one) == "None" or str(homepage_repo_one) == "null":
-        homepage_repo_one = "None"
-
-    if str(homepage_repo_two).strip() == "" or str(homepage_repo_two) == "None" or str(homepage_repo_two) == "null":
-        homepage_repo_two = "None"
-
-    if str(homepage_repo_three).strip() == "" or str(homepage_repo_three) == "None" or str(homepage_repo_three) == "null":
-        homepage_repo_three = "None"
-
-    context.update({
-        'homepage_repo_one':homepage_repo_one,
-        'homepage_repo_two':homepage_repo_two,
-        'homepage_repo_three':homepage_repo_three
-    })
-
-    stargazers_count_repo_one = landing_page_repo_one['stargazers_count']
-    stargazers_count_repo_two = landing_page_repo_two['stargazers_count']
-    stargazers_count_repo_three = landing_page_repo_three['stargazers_count']
-    context.update({
-        'stargazers_count_repo_one':stargazers_count_repo_one,
-        'stargazers_count_repo_two':stargazers_count_repo_two,
-        'stargazers_count_repo_three':stargazers_count_repo_three
-    })
-
-    language_repo_one = landing_page_repo_one['language']
-    language_repo_two = landing_page_repo_two['language']
-    language_repo_three = landing_page_repo_three['language']
-    context.update({
-        'language_repo_one':language_repo_one,
-        'language_repo_two':language_repo_two,
-        'language_repo_three':language_repo_three
-    })
-
-    has_wiki_repo_one = landing_page_repo_one['has_wiki']
-    has_wiki_repo_two = landing_page_repo_two['has_wiki']
-    has_wiki_repo_three = landing_page_repo_three['has_wiki']
-    context.update({
-        'has_wiki_repo_one':has_wiki_repo_one,
-        'has_wiki_repo_two':has_wiki_repo_two,
-        'has_wiki_repo_three':has_wiki_repo_three
-    })
-
-    try:
-        license_key_repo_one = landing_page_repo_one['license']["key"]
-        license_name_repo_one = landing_page_repo_one['license']['name']
-    except Exception:
-        license_key_repo_one = None
-        license_name_repo_one = None 
-
-    try:
-        license_key_repo_two = landing_page_repo_two['license']["key"]
-        license_name_repo_two = landing_page_repo_two['license']['name']
-    except Exception:
-        license_key_repo_two = None
-        license_name_repo_two = None
-
-    try:
-        license_key_repo_three = landing_page_repo_three['license']["key"]
-        license_name_repo_three = landing_page_repo_three['license']['name']
-    except Exception:
-        license_key_repo_three = None
-        license_name_repo_three = None
-
-    context.update({
-        'license_key_repo_one':license_key_repo_one,
-        'license_name_repo_one':license_name_repo_one,
-        'license_key_repo_two':license_key_repo_two,
-        'license_name_repo_two':license_name_repo_two,
-        'license_key_repo_three':license_key_repo_three,
-        'license_name_repo_three':license_name_repo_three
-    })
-
-
-
-    open_issues_repo_one = landing_page_repo_one['open_issues']
-    open_issues_repo_two = landing_page_repo_two['open_issues']
-    open_issues_repo_three = landing_page_repo_three['open_issues']
-    context.update({
-        'open_issues_repo_one':open_issues_repo_one,
-        'open_issues_repo_two':open_issues_repo_two,
-        'open_issues_repo_three':open_issues_repo_three
-    })
-
-    network_count_repo_one = landing_page_repo_one['network_count']
-    network_count_repo_two =landing_page_repo_two['network_count']
-    network_count_repo_three =landing_page_repo_three['network_count']
-    context.update({
-        'network_count_repo_one':network_count_repo_one,
-        'network_count_repo_two':network_count_repo_two,
-        'network_count_repo_three':network_count_repo_three
-    })
-
-    subscribers_count_repo_one = landing_page_repo_one['subscribers_count']
-    subscribers_count_repo_two = landing_page_repo_two['subscribers_count']
-    subscribers_count_repo_three = landing_page_repo_three['subscribers_count']
-    context.update({
-        'subscribers_count_repo_one':subscribers_count_repo_one,
-        'subscribers_count_repo_two':subscribers_count_repo_two,
-        'subscribers_count_repo_three':subscribers_count_repo_three
-    })
-
-    return context
\ No newline at end of file
+# The rows of the comparison table, in order: (table context key, label, tooltip)
+COMPARISON_ROWS = [
+    ("created_at", "Date Created", "This is when the repository was created on GitHub"),
+    ("updated_at", "Date Last Updated", "This is when the repository was last changed in any way on GitHub"),
+    ("last_mined_date", "Date Last Mined", "This is when Git-OSS-um last obtained information about this repository"),
+    ("clone_url", "Clone URL", "This is the url you would use to clone this repository"),
+    ("homepage", "Repository Homepage", "This is the personal website for this repository. Click on it to visit their page"),
+    ("stargazers_count", "Number of Stargazers", "This is the number of people who showed interest in this repository & starred it"),
+    ("language", "Programming Language", "This is the main programming language of this repository"),
+    ("has_wiki", "Has a Wiki Page", "Does this repository have a listed wiki page to help you out?"),
+    ("license_name", "Development License", "This is the license this repository uses for development. Click on it to find out more"),
+    ("open_issues", "Number of Open Issues", "This is the number of problems this repository has that need to be solved. Give it a shot"),
+    ("network_count", "Number of Forks", "This is the number of people who have made a copy of this repository to help contribute"),
+    ("subscribers_count", "Number of Watchers", "This is the number of people who want updates on this repository"),
+    ("num_pulls", "Total Pull Requests", "This is the number pull requests that comprise this repository"),
+    ("num_open_pulls", "Number of Open Pull Requests", "This is the number pull requests that still need to be decided upon"),
+    ("num_closed_merged_pulls", "Number of Accepted Pull Requests", "This is the number pull requests that have been accepted and merged within this repository"),
+    ("num_closed_unmerged_pulls", "Number of Denied Pull Requests", "This is the number pull requests that have been denied & have not been merged within this repository"),
+]
+
+# Only the MinedRepo columns the overview table needs, so comparing never loads the charts or timestamp lists
+COMPARISON_SQL_FIELDS = ('repo_name', 'num_pulls', 'num_closed_merged_pulls', 'num_closed_unmerged_pulls',
+                         'num_open_pulls', 'completed_timestamp')
+
+
+# Build the context of the comparison page for any number of mined repos. All MinedRepo rows
+# are read with one query and all landing pages with one more, however many repos are compared.
+# "repos" holds one column per repo and "rows" the metrics matrix, one row per COMPARISON_ROWS entry.
+# Landing pages are found through the repos' canonical names. A repo with no MinedRepo row or
+# landing page (deleted since the comparison was asked for, or never fully mined) raises Http404
+def get_comparison_context(repo_names):
+    mined_repos = {
+        mined_repo.repo_name.lower(): mined_repo for mined_repo in
+        MinedRepo.objects.filter(repo_name__in=repo_names).only(*COMPARISON_SQL_FIELDS)
+    }
+    landing_pages = find_mined_repo_main_pages(repo_names)
+
+    missing = [repo_name for repo_name in repo_names if repo_name not in mined_repos or repo_name not in landing_pages]
+    if missing:
+        raise Http404(f"Repo not found: {', '.join(missing)}")
+
+    columns = []
+    for repo_name in repo_names:
+        column = build_repo_table_context(mined_repos[repo_name], landing_pages[repo_name])
+        column.update({
+            "name": repo_name,
+            "img": landing_pages[repo_name]['owner']['avatar_url'],
+        })
+        columns.append(column)
+
+    rows = [
+        {"key": key, "label": label, "tooltip": tooltip, "values": [column[key] for column in columns]}
+        for key, label, tooltip in COMPARISON_ROWS
+    ]
+    return {"repos": columns, "rows": rows, "card_width": 100 // len(columns)}
@@ -1,6 +1,9 @@
 from __future__ import absolute_import
+import gc
+import importlib
 import os
 from celery import Celery
+from celery.signals import worker_init
 
 # set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'web_app.settings')
@@ -16,6 +19,43 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+# Mining runs on gevent workers (see CELERY_TASK_QUEUES in settings). gevent has to
+# patch socket, ssl and threading before django, PyGithub or pymongo import them,
+# which the celery command only does when the pool is given on its command line
+# (-P gevent). A gevent pool chosen any other way would block on every request,
+# so refuse to start it
+@worker_init.connect
+def check_green_worker(sender=None, **kwargs):
+    if 'gevent' not in str(getattr(sender, 'pool_cls', '')):
+        return
+    from gevent import monkey
+    if not monkey.is_module_patched('socket'):
+        raise RuntimeError("Start gevent workers with the pool on the command line: "
+                           "celery -A web_app worker -P gevent ...")
+
+
+# The task modules and the heavy libraries they pull in (django models, PyGithub,
+# pymongo, numpy, pandas, plotly, nvd3). The worker's parent process imports them
+# once before forking its pool, so a recycled child starts with them already loaded
+# rather than importing them all again. Their clients connect on first use (see
+# mining_scripts/connections.py), so each child opens its own connections
+PRELOADED_MODULES = (
+    'user_app.tasks',
+    'user_app.visualizations',
+)
+
+
+@worker_init.connect
+def preload_worker_modules(**kwargs):
+    for module in PRELOADED_MODULES:
+        importlib.import_module(module)
+    # Keep the collector from touching the preloaded objects in the children, which
+    # would copy the pages they share with the parent into every child (python 3.7+)
+    if hasattr(gc, 'freeze'):
+        gc.collect()
+        gc.freeze()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
\ No newline at end of file
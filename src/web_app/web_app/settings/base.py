@@ -156,6 +156,73 @@ CELERY_ACCEPT_CONTENT=['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'MST'
-CELERYD_MAX_TASKS_PER_CHILD = 2
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers.DatabaseScheduler'
-CELERY_BEAT_SCHEDULE = {}
+CELERY_BEAT_SCHEDULE = {
+    # Failed mining batches are retried with a backoff, see mining.record_failed_batch
+    'retry-failed-batches': {'task': 'tasks.retry_failed_batches', 'schedule': 5 * 60.0},
+}
+
+# Tasks are split over queues by the kind of work they do, so each tier of workers
+# can be sized on its own and a wave of mining never delays finalizations or emails:
+#   mining    - network bound GitHub fetching, run on a gevent pool with many greenlets.
+#               Pass the pool on the command line (-P gevent), so celery patches the
+#               standard library before anything else is imported. The greenlets of a
+#               worker share one GitHub rate budget (github_cache.rate_budget), and each
+#               Mongo client pools MONGO_MAX_POOL_SIZE connections (connections.py).
+#               Set GITHUB_BASE_URL to run a worker against a local stand-in of the API
+#   rendering - CPU bound pandas/plotly finalization, run on a prefork pool, one per core
+#   email     - confirmation emails, a couple of slots are plenty
+# e.g.
+#   celery -A web_app worker -Q mining -P gevent -c 200 -n mining@%h
+#   celery -A web_app worker -Q rendering -P prefork -c 4 -n rendering@%h
+#   celery -A web_app worker -Q email,default -c 2 -n email@%h
+# Within a queue, higher priority tasks go first (RabbitMQ priorities, 0-9)
+CELERY_TASK_QUEUE_MAX_PRIORITY = 9
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_TASK_DEFAULT_QUEUE = 'default'
+CELERY_TASK_QUEUES = (
+    Queue('default', Exchange('default'), routing_key='default'),
+    Queue('mining', Exchange('mining'), routing_key='mining'),
+    Queue('rendering', Exchange('rendering'), routing_key='rendering'),
+    Queue('email', Exchange('email'), routing_key='email'),
+)
+CELERY_TASK_ROUTES = {
+    # Repos a user asked for come before the periodic refresh of every mined repo
+    'tasks.mine_data_asynchronously': {'queue': 'mining', 'routing_key': 'mining', 'priority': 7},
+    'tasks.mine_pull_request_batch_asynchronously': {'queue': 'mining', 'routing_key': 'mining', 'priority': 6},
+    'tasks.update_all_repos': {'queue': 'mining', 'routing_key': 'mining', 'priority': 3},
+    'tasks.update_specific_repo': {'queue': 'mining', 'routing_key': 'mining', 'priority': 2},
+    'tasks.retry_failed_batches': {'queue': 'mining', 'routing_key': 'mining', 'priority': 5},
+    'tasks.finalize_mined_repo': {'queue': 'rendering', 'routing_key': 'rendering', 'priority': 6},
+    'tasks.visualize_repo_data': {'queue': 'rendering', 'routing_key': 'rendering', 'priority': 3},
+    'tasks.send_confirmation_email': {'queue': 'email', 'routing_key': 'email'},
+}
+# Reserve one task at a time, so priorities apply and a worker busy rendering
+# does not sit on tasks another worker could run
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Replace a pool process once it has grown past this resident size (in KiB), after
+# the task it is running. Children fork from a parent that has already imported
+# the task modules (web_app/celery.py), so replacing one is cheap and is only
+# needed when rendering or mining has left it holding too much memory
+CELERY_WORKER_MAX_MEMORY_PER_CHILD = 400 * 1024
+
+# A mining batch failing this many times (other than on the rate limit) is set aside
+# in the deadBatches collection until an admin requeues it
+MAX_BATCH_ATTEMPTS = 5
+
+# Finalize a repo once each of its batches was collected or set aside, instead of
+# waiting on its dead batches. Its pages are then built from the pulls we did mine
+FINALIZE_ON_PARTIAL_DATA = False
+
+# The most repos that can be compared side by side (web pages and the JSON API)
+MAX_COMPARED_REPOS = 6
+
+# Cache for rendered repo pages, per-repo fragments and listing results.
+# Entries are keyed by each repo's completed_timestamp and a catalog version
+# that the mining tasks bump, see user_app/caching.py
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': '127.0.0.1:11211',
+    }
+}
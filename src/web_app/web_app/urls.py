@@ -19,14 +19,16 @@ from django.contrib import admin
 from django.views.generic import TemplateView
 from user_app.views import ( HomeView, about_us, mining_request_form_view, 
                             get_repo_data, mined_repos, signup, activate,
-                            compare_two_repos, compare_three_repos
+                            compare_repos, plotly_js
                              )
+from user_app.api import api_repo_list, api_repo_detail, api_repo_series, api_compare_repos, api_search_repos, api_mining_progress
 
 urlpatterns = [
     url(r'^admin/', admin.site.urls), # allow access to the admin portal
     url(r'^admin/statuscheck/', include('celerybeat_status.urls')),
     url(r'^$', HomeView.as_view()),   # The home page 
     url(r'^about_us/$', about_us, name="about_us"),
+    url(r'^plotly\.js$', plotly_js, name="plotly_js"), # The plotly.js bundle used by every chart
     url(r'^accounts/', include('django.contrib.auth.urls')), # Login/Logout controls
     url(r'^signup/$', signup, name='signup'), # The signup page 
     url(r'^activate/(?P<uidb64>[0-9A-Za-z_\-]+)/(?P<token>[0-9A-Za-z]{1,13}-[0-9A-Za-z]{1,20})/$',
@@ -34,6 +36,11 @@ urlpatterns = [
     url(r'^mining_requests_form/$', mining_request_form_view, name="mining_form"), # The mining request form 
     url(r'^repos/$', mined_repos, name="repos"), # The list of all mined repos 
     url(r'^repos/(?P<repo_owner>((\w+)[-]*)\w+)+/+(?P<repo_name>((\w+)([-]|[.])*)+\w+)/$', get_repo_data, name="visualization"), # Visualizations
-    url(r'^repos/compare/(?P<repo_owner1>((\w+)[-]*)\w+)&(?P<repo_name1>((\w+)([-]|[.])*)+\w+)&(?P<repo_owner2>((\w+)[-]*)\w+)&(?P<repo_name2>((\w+)([-]|[.])*)+\w+)/$', compare_two_repos, name="compare_two"),
-    url(r'^repos/compare/(?P<repo_owner1>((\w+)[-]*)\w+)&(?P<repo_name1>((\w+)([-]|[.])*)+\w+)&(?P<repo_owner2>((\w+)[-]*)\w+)&(?P<repo_name2>((\w+)([-]|[.])*)+\w+)&(?P<repo_owner3>((\w+)[-]*)\w+)&(?P<repo_name3>((\w+)([-]|[.])*)+\w+)/$', compare_three_repos, name="compare_three"),
+    url(r'^repos/compare/(?P<repo_pairs>[\w.-]+(&[\w.-]+)+)/$', compare_repos, name="compare_repos"), # Compare 2 or more repos
+    url(r'^api/v1/repos/$', api_repo_list, name="api_repo_list"), # Read-only JSON API
+    url(r'^api/v1/repos/(?P<repo_owner>((\w+)[-]*)\w+)+/+(?P<repo_name>((\w+)([-]|[.])*)+\w+)/$', api_repo_detail, name="api_repo_detail"),
+    url(r'^api/v1/repos/(?P<repo_owner>((\w+)[-]*)\w+)+/+(?P<repo_name>((\w+)([-]|[.])*)+\w+)/series/$', api_repo_series, name="api_repo_series"),
+    url(r'^api/v1/repos/(?P<repo_owner>((\w+)[-]*)\w+)+/+(?P<repo_name>((\w+)([-]|[.])*)+\w+)/progress/$', api_mining_progress, name="api_mining_progress"),
+    url(r'^api/v1/compare/$', api_compare_repos, name="api_compare_repos"),
+    url(r'^api/v1/search/$', api_search_repos, name="api_search_repos"), # Typeahead for the repo search
 ]